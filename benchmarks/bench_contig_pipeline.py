@@ -0,0 +1,123 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+PATH_REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.extend(
+    [
+        os.path.join(PATH_REPO, "scripts"),
+        os.path.join(PATH_REPO, "scripts", "preprocessing"),
+        os.path.join(PATH_REPO, "scripts", "metrics"),
+    ]
+)
+
+from bench_pipeline import (  # noqa: E402
+    TAXON_ID,
+    prepare_workspace,
+    write_synthetic_genome,
+)
+from filter_diamond_results import filter_diamond_results  # noqa: E402
+from parse_gff import parse_contigs, parse_gff  # noqa: E402
+from pipeline import predict_from_tables  # noqa: E402
+from server import load_resources  # noqa: E402
+from string_links import read_string_links  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        usage="bench_contig_pipeline.py [--genes 200000] [--contigs 5000] [--links 5000000] [--workers 1 2 4 8]",
+        description="""Compares scoring of a fragmented synthetic genome as one ring and by contigs in a process pool.""",
+    )
+    parser.add_argument(
+        "--genes", type=int, default=200_000, help="genes in synthetic genome"
+    )
+    parser.add_argument(
+        "--contigs", type=int, default=5000, help="contigs in synthetic genome"
+    )
+    parser.add_argument(
+        "--links", type=int, default=5_000_000, help="STRING links of the taxon"
+    )
+    parser.add_argument(
+        "--workers",
+        nargs="+",
+        type=int,
+        default=[1, 2, 4, 8],
+        help="numbers of processes scoring contigs",
+    )
+    parser.add_argument(
+        "--emission-matrix",
+        nargs="?",
+        default="data/matrix_emission_15.npy",
+        help="path to emission matrix.npy",
+    )
+    parser.add_argument(
+        "--model",
+        nargs="?",
+        default="models/model.pkl",
+        help="model for predictions.pkl or compiled model",
+    )
+    parser.add_argument(
+        "--ko-index",
+        nargs="?",
+        default="data/ko_index",
+        help="KEGG index directory (built in temporary folder if absent)",
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    path_repo = os.getcwd()
+    with tempfile.TemporaryDirectory() as workspace:
+        prepare_workspace(workspace, os.path.abspath(args.ko_index))
+        os.chdir(workspace)
+
+        warnings.simplefilter("ignore")
+        load_resources(args.emission_matrix, args.model)
+
+        genome = f"fragmented_{args.genes}_{args.contigs}"
+        write_synthetic_genome(genome, args.genes, args.links, args.contigs)
+        prefix = f"results/{TAXON_ID}"
+        parsed_gff = parse_gff(f"{prefix}/bakta/{genome}.gff3")
+        contigs = parse_contigs(f"{prefix}/bakta/{genome}.gff3")
+        diamond_result_filtered = filter_diamond_results(
+            f"{prefix}/diamond/{TAXON_ID}_{genome}.tsv"
+        )
+        protein_links = read_string_links(
+            f"{prefix}/string/{TAXON_ID}_{genome}.protein.links.v12.0.txt",
+            diamond_result_filtered.target_accession,
+        )
+        tables = (
+            parsed_gff,
+            diamond_result_filtered,
+            protein_links,
+            f"{prefix}/hmm/{TAXON_ID}_{genome}_hmm.txt",
+            args.emission_matrix,
+            args.model,
+        )
+
+        print("mode\tworkers\tseconds\tspeedup")
+        start = time.perf_counter()
+        predict_from_tables(*tables)
+        print(f"genome\t1\t{time.perf_counter() - start:.3f}\t")
+
+        reference, reference_seconds = None, None
+        for workers in args.workers:
+            start = time.perf_counter()
+            final_table = predict_from_tables(*tables, contigs, workers).final_table
+            seconds = time.perf_counter() - start
+
+            # Results must not depend on the number of processes
+            if reference is None:
+                reference, reference_seconds = final_table, seconds
+            elif not final_table.equals(reference):
+                raise AssertionError(f"Results with {workers} workers differ")
+            print(
+                f"contigs\t{workers}\t{seconds:.3f}\t{reference_seconds / seconds:.2f}"
+            )
+        os.chdir(path_repo)
@@ -0,0 +1,110 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "..", "scripts", "preprocessing"
+    )
+)
+
+from filter_diamond_results import filter_diamond_results  # noqa: E402
+from synthetic import get_string_proteins, write_diamond_result  # noqa: E402
+
+COLUMN_NAMES = [
+    "query_accession",
+    "target_accession",
+    "sequence_identity",
+    "length",
+    "mismatches",
+    "gap_openings",
+    "query_start",
+    "query_end",
+    "target_start",
+    "target_end",
+    "e_value",
+    "bit_score",
+]
+
+
+def filter_diamond_results_pandas(path: str) -> pd.DataFrame:
+    """
+    Previous implementation: reads the whole table and selects hits with idxmax.
+    """
+    diamond_result = pd.read_csv(path, sep="\t", header=None, names=COLUMN_NAMES)
+    return diamond_result.loc[
+        diamond_result.groupby("query_accession")["sequence_identity"].idxmax()
+    ]
+
+
+def measure(function, path: str) -> tuple:
+    """
+    Measures time and memory in separate runs, as tracing slows down Python code.
+
+    :return: result, wall time in seconds, peak of Python allocations in megabytes
+    """
+    start = time.perf_counter()
+    result = function(path)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    function(path)
+    peak = tracemalloc.get_traced_memory()[1] / 1024**2
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        usage="bench_filter_diamond_results.py [--queries 5000 50000] [--max-hits 25]",
+        description="""Checks parity of streaming Diamond filtering with pandas idxmax and compares their speed and memory.""",
+    )
+    parser.add_argument(
+        "--queries",
+        nargs="*",
+        type=int,
+        default=[5000, 50000],
+        help="numbers of queries in synthetic Diamond results",
+    )
+    parser.add_argument(
+        "--max-hits", type=int, default=25, help="maximum number of hits per query"
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    print("queries\thits\tpandas_s\tstreaming_s\tpandas_mb\tstreaming_mb")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for n_queries in args.queries:
+            path = f"{temp_dir}/diamond_{n_queries}.tsv"
+            proteins = get_string_proteins(n_queries, 511145)
+            n_hits = write_diamond_result(
+                path,
+                np.array([f"G_{query:06d}" for query in range(n_queries)]),
+                proteins,
+                proteins,
+                args.max_hits,
+            )
+
+            expected, time_pandas, peak_pandas = measure(
+                filter_diamond_results_pandas, path
+            )
+            result, time_streaming, peak_streaming = measure(
+                filter_diamond_results, path
+            )
+
+            assert result.index.equals(expected.index)
+            assert result.target_accession.equals(expected.target_accession)
+            print(
+                f"{n_queries}\t{n_hits}\t{time_pandas:.3f}\t{time_streaming:.3f}"
+                f"\t{peak_pandas:.1f}\t{peak_streaming:.1f}"
+            )
@@ -0,0 +1,109 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts", "metrics")
+)
+
+from forward_backward import forward_backward  # noqa: E402
+from intergenic_distances import STARTPROB, TRANSMAT  # noqa: E402
+
+
+def make_synthetic_contigs(
+    n_genes: int, n_contigs: int, n_categories: int, seed: int = 0
+) -> tuple:
+    """
+    Generates observed categories of intergenic distances split into contigs.
+
+    :param n_genes: number of genes
+    :param n_contigs: number of contigs
+    :param n_categories: number of distance categories
+    :param seed: random seed
+    :return: observed categories, number of genes in each contig
+    """
+    rng = np.random.default_rng(seed)
+    observations = rng.integers(0, n_categories, n_genes)
+    borders = np.sort(rng.choice(np.arange(1, n_genes), n_contigs - 1, replace=False))
+    lengths = np.diff(np.r_[0, borders, n_genes])
+    return observations, lengths
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        usage="bench_intergenic_distances.py [--emission-matrix MATRIX.NPY] [--genes 5000] [--contigs 1 50] [--batch 50]",
+        description="""Checks parity of NumPy forward-backward with hmmlearn and compares their speed.""",
+    )
+    parser.add_argument(
+        "--emission-matrix",
+        nargs="?",
+        default="data/matrix_emission_15.npy",
+        help="path to emission matrix.npy",
+    )
+    parser.add_argument(
+        "--genes", type=int, default=5000, help="genes in synthetic genome"
+    )
+    parser.add_argument(
+        "--contigs",
+        nargs="*",
+        type=int,
+        default=[1, 50],
+        help="numbers of contigs in synthetic genome",
+    )
+    parser.add_argument("--batch", type=int, default=50, help="genomes in batched call")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    emissionprob = np.load(args.emission_matrix)
+
+    start = time.perf_counter()
+    from hmmlearn import hmm
+
+    time_import = time.perf_counter() - start
+    print(f"hmmlearn import\t{time_import:.3f}")
+
+    model = hmm.CategoricalHMM(n_components=2, algorithm="map")
+    model.startprob_ = np.array(STARTPROB)
+    model.transmat_ = np.array(TRANSMAT)
+    model.emissionprob_ = emissionprob
+
+    print("genomes\tcontigs\thmmlearn_s\tnumpy_s\tmax_diff")
+    for n_contigs in args.contigs:
+        for n_genomes in [1, args.batch]:
+            genomes = [
+                make_synthetic_contigs(
+                    args.genes, n_contigs, emissionprob.shape[1], seed=genome
+                )
+                for genome in range(n_genomes)
+            ]
+
+            start = time.perf_counter()
+            posteriors_hmmlearn = np.concatenate(
+                [
+                    model.predict_proba(observations.reshape(-1, 1), lengths)
+                    for observations, lengths in genomes
+                ]
+            )
+            time_hmmlearn = time.perf_counter() - start
+
+            start = time.perf_counter()
+            posteriors = forward_backward(
+                np.concatenate([observations for observations, _ in genomes]),
+                np.concatenate([lengths for _, lengths in genomes]),
+                STARTPROB,
+                TRANSMAT,
+                emissionprob,
+            )
+            time_numpy = time.perf_counter() - start
+
+            max_diff = np.abs(posteriors_hmmlearn - posteriors).max()
+            assert max_diff < 1e-9
+            print(
+                f"{n_genomes}\t{n_contigs}\t{time_hmmlearn:.3f}\t{time_numpy:.3f}\t{max_diff:.1e}"
+            )
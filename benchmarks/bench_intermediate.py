@@ -0,0 +1,105 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")
+)
+
+from intermediate import read_table, write_table  # noqa: E402
+from synthetic import make_parsed_gff  # noqa: E402
+
+
+def make_stage_tables(parsed_gff: pd.DataFrame, seed: int = 0) -> dict:
+    """
+    Generates tables of gene metrics in the format of the metrics stages.
+
+    :param parsed_gff: parsed gff3 annotation
+    :param seed: random seed
+    :return: table or series for each kind of intermediate table
+    """
+    rng = np.random.default_rng(seed)
+    n_genes = parsed_gff.shape[0]
+    scores = rng.integers(150, 1000, (n_genes, 3)).astype(float)
+    kos = np.where(
+        rng.random(n_genes) < 0.5,
+        np.char.add("K", rng.integers(10000, 99999, n_genes).astype(str)),
+        "",
+    ).astype(object)
+
+    return {
+        "parsed_gff": parsed_gff,
+        "diamond_filtered": pd.DataFrame(
+            {
+                "query_accession": parsed_gff.locus_name,
+                "target_accession": np.char.add(
+                    "1.P", np.arange(n_genes).astype(str)
+                ).astype(object),
+                "sequence_identity": rng.choice([35.2, 60.0, 100.0], n_genes),
+            }
+        ),
+        "string_scores": pd.DataFrame(
+            scores, columns=["prev_scores", "next_scores", "final_scores"]
+        ),
+        "kegg": pd.DataFrame(
+            {
+                "kegg_orthology": kos,
+                "metabolic_pathway_kegg": np.where(kos != "", "map00010,map01100", ""),
+                "description_kegg": np.where(kos != "", "glycolysis enzyme", ""),
+                "intersection_map_count": rng.poisson(1.0, n_genes).astype(float),
+            }
+        ),
+        "inter_dist": pd.Series(rng.random(n_genes)),
+        "predictions": pd.Series(rng.integers(0, 2, n_genes)),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        usage="bench_intermediate.py [--genes 10000 100000 1000000]",
+        description="""Compares writing and reading of intermediate tables in .tsv and Arrow formats.""",
+    )
+    parser.add_argument(
+        "--genes",
+        nargs="+",
+        type=int,
+        default=[10000, 100000, 1000000],
+        help="numbers of genes",
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    print("genes\ttable\tformat\twrite_s\tread_s\tsize_mb")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for n_genes in args.genes:
+            parsed_gff = make_parsed_gff(n_genes, 10)
+            locus_names = parsed_gff.locus_name
+            for kind, table in make_stage_tables(parsed_gff).items():
+                # Gene metrics are joined to the annotation when they are read
+                keys = (
+                    None if kind in ("parsed_gff", "diamond_filtered") else locus_names
+                )
+                for extension in ["tsv", "arrow"]:
+                    path = f"{temp_dir}/{kind}.{extension}"
+
+                    start = time.perf_counter()
+                    write_table(table, path, kind, locus_names)
+                    write_seconds = time.perf_counter() - start
+
+                    start = time.perf_counter()
+                    read_table(path, kind, keys)
+                    read_seconds = time.perf_counter() - start
+
+                    print(
+                        f"{n_genes}\t{kind}\t{extension}\t{write_seconds:.3f}\t"
+                        f"{read_seconds:.3f}\t{os.path.getsize(path) / 1024**2:.1f}"
+                    )
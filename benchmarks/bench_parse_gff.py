@@ -0,0 +1,76 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "..", "scripts", "preprocessing"
+    )
+)
+
+from parse_gff import parse_gff, parse_gff_bcbio  # noqa: E402
+from synthetic import make_parsed_gff, write_bakta_gff  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        usage="bench_parse_gff.py [--input-gff FILE.GFF3] [--genes 10000 100000]",
+        description="""Compares streaming parse_gff with the previous BCBio-based parser.""",
+    )
+    parser.add_argument(
+        "-i",
+        "--input-gff",
+        nargs="*",
+        default=[],
+        help="existing gff files to parse.gff3",
+    )
+    parser.add_argument(
+        "--genes",
+        nargs="*",
+        type=int,
+        default=[10000, 100000],
+        help="sizes of synthetic gff files",
+    )
+    parser.add_argument(
+        "--contigs", type=int, default=10, help="contigs in synthetic gff files"
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = list(args.input_gff)
+        for n_genes in args.genes:
+            paths.append(f"{temp_dir}/synthetic_{n_genes}.gff3")
+            write_bakta_gff(paths[-1], make_parsed_gff(n_genes, args.contigs))
+
+        # BCBio yields contigs sorted by name, streaming parser keeps the file order
+        print("file\tcds\tbcbio_s\tstreaming_s\tspeedup\tsame_features")
+        for path in paths:
+            start = time.perf_counter()
+            parsed_bcbio = parse_gff_bcbio(path)
+            time_bcbio = time.perf_counter() - start
+
+            start = time.perf_counter()
+            parsed_streaming = parse_gff(path)
+            time_streaming = time.perf_counter() - start
+
+            same_features = (
+                parsed_bcbio.sort_values("locus_name")
+                .reset_index(drop=True)
+                .equals(
+                    parsed_streaming.sort_values("locus_name").reset_index(drop=True)
+                )
+            )
+            print(
+                f"{os.path.basename(path)}\t{parsed_streaming.shape[0]}\t"
+                f"{time_bcbio:.3f}\t{time_streaming:.3f}\t"
+                f"{time_bcbio / time_streaming:.1f}\t{same_features}"
+            )
@@ -0,0 +1,407 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+PATH_REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.extend(
+    [
+        os.path.join(PATH_REPO, "scripts"),
+        os.path.join(PATH_REPO, "scripts", "preprocessing"),
+        os.path.join(PATH_REPO, "scripts", "metrics"),
+    ]
+)
+
+from filter_diamond_results import filter_diamond_results  # noqa: E402
+from get_string_scores import get_string_scores  # noqa: E402
+from intergenic_distances import (  # noqa: E402
+    calculate_intergenic_dist,
+    predict_operon_inter_dist,
+)
+from intermediate import read_table  # noqa: E402
+from kegg import calc_intersection_map  # noqa: E402
+from kegg_index import build_kegg_index, load_kegg_index  # noqa: E402
+from main import format_output, result_to_gff, write_predictions  # noqa: E402
+from parse_gff import parse_gff  # noqa: E402
+from predict_operon import get_data_for_predict, predict_operon  # noqa: E402
+from server import load_resources  # noqa: E402
+from string_links import (  # noqa: E402
+    convert_string_links,
+    load_string_links,
+    read_string_links,
+)
+from synthetic import (  # noqa: E402
+    assign_string_proteins,
+    get_string_proteins,
+    make_parsed_gff,
+    write_bakta_gff,
+    write_diamond_result,
+    write_kofam_result,
+    write_string_links,
+)
+
+TAXON_ID = 1
+
+# Stages which depend on the size of STRING links file rather than on the number of genes
+LINK_STAGES = {"read_string_links", "convert_string_links"}
+
+
+def measure(function: Callable, repeat: int = 1) -> tuple:
+    """
+    Measures time and memory in separate runs, as tracing slows down Python code.
+
+    :param function: stage without arguments
+    :param repeat: number of timed runs, the fastest one is reported
+    :return: result, wall time in seconds, peak of Python allocations in megabytes
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1] / 1024**2
+    tracemalloc.stop()
+    return result, min(times), peak
+
+
+def prepare_workspace(workspace: str, path_ko_index: str) -> None:
+    """
+    Creates data and models folders in the workspace, as stages use paths
+    relative to the repository root.
+
+    :param workspace: directory for synthetic results
+    :param path_ko_index: KEGG index directory, built if absent
+    """
+    os.makedirs(f"{workspace}/data", exist_ok=True)
+    for name in ["ko_map.json", "ko_descriptions.json", "matrix_emission_15.npy"]:
+        os.symlink(os.path.abspath(f"data/{name}"), f"{workspace}/data/{name}")
+    if os.path.isdir(path_ko_index):
+        os.symlink(os.path.abspath(path_ko_index), f"{workspace}/data/ko_index")
+    else:
+        build_kegg_index(f"{workspace}/data/ko_index")
+    os.symlink(os.path.abspath("models"), f"{workspace}/models")
+
+
+def write_synthetic_genome(
+    genome: str, n_genes: int, n_links: int, n_contigs: int, seed: int = 0
+) -> None:
+    """
+    Writes bakta, Diamond, kofam_scan and STRING files of synthetic genome
+    to the results folder of the workspace.
+
+    :param genome: genome name
+    :param n_genes: number of genes
+    :param n_links: number of STRING links
+    :param n_contigs: number of contigs
+    :param seed: random seed
+    """
+    for folder in ["bakta", "diamond", "hmm", "string", "predictions/temp_dir"]:
+        os.makedirs(f"results/{TAXON_ID}/{folder}", exist_ok=True)
+
+    parsed_gff = make_parsed_gff(n_genes, n_contigs, seed)
+    write_bakta_gff(f"results/{TAXON_ID}/bakta/{genome}.gff3", parsed_gff)
+
+    proteins = get_string_proteins(max(n_genes * 6 // 5, 1000), TAXON_ID)
+    gene_proteins = assign_string_proteins(n_genes, len(proteins), seed=seed)
+    write_diamond_result(
+        f"results/{TAXON_ID}/diamond/{TAXON_ID}_{genome}.tsv",
+        parsed_gff.locus_name.to_numpy(),
+        np.where(gene_proteins >= 0, proteins[gene_proteins], None),
+        proteins,
+        seed=seed,
+    )
+    write_string_links(
+        f"results/{TAXON_ID}/string/{TAXON_ID}_{genome}.protein.links.v12.0.txt",
+        proteins,
+        gene_proteins,
+        n_links,
+        seed=seed,
+    )
+
+    kegg_index = load_kegg_index("data/ko_index")
+    with_pathways = kegg_index.ko_pathways.any(axis=1)
+    write_kofam_result(
+        f"results/{TAXON_ID}/hmm/{TAXON_ID}_{genome}_hmm.txt",
+        parsed_gff.locus_name.to_numpy(),
+        kegg_index.kos[with_pathways].astype(str),
+        seed=seed,
+    )
+
+
+def run_stages(
+    genome: str, path_matrix_emission: str, model_file: str, repeat: int = 1
+) -> Dict[str, tuple]:
+    """
+    Runs each stage on the results of the previous ones, as the Snakemake rules do.
+
+    :param genome: genome name
+    :param path_matrix_emission: path to emission matrix.npy
+    :param model_file: path to model.pkl or compiled model directory
+    :param repeat: number of timed runs of each stage
+    :return: wall time in seconds and peak memory in megabytes for each stage
+    """
+    prefix = f"results/{TAXON_ID}"
+    temp_dir = f"{prefix}/predictions/temp_dir"
+    path_links = f"{prefix}/string/{TAXON_ID}_{genome}.protein.links.v12.0"
+    measurements = {}
+
+    def run(name: str, function: Callable):
+        result, elapsed, peak = measure(function, repeat)
+        measurements[name] = (elapsed, peak)
+        return result
+
+    parsed_gff = run("parse_gff", lambda: parse_gff(f"{prefix}/bakta/{genome}.gff3"))
+    diamond_result_filtered = run(
+        "filter_diamond_results",
+        lambda: filter_diamond_results(f"{prefix}/diamond/{TAXON_ID}_{genome}.tsv"),
+    )
+    targets = diamond_result_filtered.target_accession
+    protein_links = run(
+        "read_string_links",
+        lambda: read_string_links(f"{path_links}.txt", targets),
+    )
+    run(
+        "convert_string_links",
+        lambda: convert_string_links(f"{path_links}.txt", f"{path_links}.cache"),
+    )
+    run(
+        "load_string_links",
+        lambda: load_string_links(f"{path_links}.cache", targets),
+    )
+    string_scores = run(
+        "get_string_scores",
+        lambda: get_string_scores(parsed_gff, diamond_result_filtered, protein_links),
+    )
+    kegg_annotation = run(
+        "calc_intersection_map",
+        lambda: calc_intersection_map(
+            parsed_gff, f"{prefix}/hmm/{TAXON_ID}_{genome}_hmm.txt"
+        ).fillna(0),
+    )
+    prob_operon = run(
+        "predict_operon_inter_dist",
+        lambda: predict_operon_inter_dist(
+            calculate_intergenic_dist(parsed_gff), path_matrix_emission
+        ),
+    )
+    data_for_predict = get_data_for_predict(
+        parsed_gff, string_scores, prob_operon, kegg_annotation
+    )
+    predictions = run(
+        "predict_operon", lambda: predict_operon(model_file, data_for_predict)
+    )
+
+    # format_output and result_to_gff read the tables written by the previous rules
+    parsed_gff.to_csv(f"{prefix}/bakta/{genome}_parsed.tsv", sep="\t")
+    kegg_annotation.to_csv(f"{temp_dir}/{TAXON_ID}_{genome}_kegg.tsv", sep="\t")
+    string_scores.to_csv(f"{temp_dir}/{TAXON_ID}_{genome}_string_scores.tsv", sep="\t")
+    predictions.to_csv(f"{temp_dir}/{TAXON_ID}_{genome}_predictions.tsv", sep="\t")
+    predictions_table = read_table(
+        f"{temp_dir}/{TAXON_ID}_{genome}_predictions.tsv", "predictions"
+    )
+
+    final_table, operons = run(
+        "format_output",
+        lambda: format_output(genome, TAXON_ID, predictions_table),
+    )
+    write_predictions(
+        final_table,
+        operons,
+        f"{prefix}/predictions/{genome}_predictions.tsv",
+        f"{prefix}/predictions/{genome}_operons",
+    )
+    run(
+        "result_to_gff",
+        lambda: result_to_gff(
+            f"{prefix}/bakta/{genome}.gff3",
+            f"{prefix}/predictions/{genome}_predictions.tsv",
+            f"{prefix}/predictions/{genome}_predictions.gff3",
+        ),
+    )
+
+    return measurements
+
+
+def get_scaling_exponents(results: pd.DataFrame) -> pd.Series:
+    """
+    Fits time ~ size^exponent for each stage, size is the number of links
+    for stages reading STRING links and the number of genes for the others.
+
+    :param results: table with measurements
+    :return: exponent for each stage
+    """
+    exponents = {}
+    for stage, measurements in results.groupby("stage", sort=False):
+        sizes = measurements["links" if stage in LINK_STAGES else "genes"]
+        if sizes.nunique() < 2:
+            continue
+        exponents[stage] = np.polyfit(
+            np.log(sizes), np.log(measurements.seconds.clip(lower=1e-6)), 1
+        )[0]
+    return pd.Series(exponents, name="exponent")
+
+
+def find_regressions(
+    results: pd.DataFrame,
+    baseline: pd.DataFrame,
+    tolerance: float = 1.25,
+    min_seconds: float = 0.05,
+    min_mb: float = 5,
+) -> List[str]:
+    """
+    Compares measurements with the baseline of the same stages and sizes.
+    Differences below min_seconds and min_mb are considered noise.
+
+    :param results: table with measurements
+    :param baseline: table with baseline measurements
+    :param tolerance: allowed ratio to the baseline
+    :param min_seconds: minimal time difference in seconds
+    :param min_mb: minimal memory difference in megabytes
+    :return: descriptions of regressions
+    """
+    merged = results.merge(
+        baseline, on=["stage", "genes", "links"], suffixes=("", "_baseline")
+    )
+    regressions = []
+    for row in merged.itertuples():
+        if (
+            row.seconds > row.seconds_baseline * tolerance
+            and row.seconds - row.seconds_baseline > min_seconds
+        ):
+            regressions.append(
+                f"{row.stage} ({row.genes} genes, {row.links} links): "
+                f"{row.seconds:.3f} s vs {row.seconds_baseline:.3f} s"
+            )
+        if (
+            row.peak_mb > row.peak_mb_baseline * tolerance
+            and row.peak_mb - row.peak_mb_baseline > min_mb
+        ):
+            regressions.append(
+                f"{row.stage} ({row.genes} genes, {row.links} links): "
+                f"{row.peak_mb:.1f} MB vs {row.peak_mb_baseline:.1f} MB"
+            )
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        usage="bench_pipeline.py [--genes 1000 10000 100000] [--links 1000000] [--output RESULTS.TSV] [--baseline BASELINE.TSV]",
+        description="""Measures time and memory of Python stages on synthetic genomes of increasing size.""",
+    )
+    parser.add_argument(
+        "--genes",
+        nargs="+",
+        type=int,
+        default=[1000, 10000, 100000],
+        help="numbers of genes in synthetic genomes",
+    )
+    parser.add_argument(
+        "--links",
+        nargs="+",
+        type=int,
+        default=[1_000_000],
+        help="numbers of STRING links for each genome (one value for all genomes)",
+    )
+    parser.add_argument(
+        "--contigs", type=int, default=10, help="contigs in synthetic genomes"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="timed runs of each stage"
+    )
+    parser.add_argument(
+        "--emission-matrix",
+        nargs="?",
+        default="data/matrix_emission_15.npy",
+        help="path to emission matrix.npy",
+    )
+    parser.add_argument(
+        "--model",
+        nargs="?",
+        default="models/model.pkl",
+        help="model for predictions.pkl or compiled model",
+    )
+    parser.add_argument(
+        "--ko-index",
+        nargs="?",
+        default="data/ko_index",
+        help="KEGG index directory (built in temporary folder if absent)",
+    )
+    parser.add_argument(
+        "-o", "--output", nargs="?", help="file to save measurements.tsv"
+    )
+    parser.add_argument(
+        "--baseline",
+        nargs="?",
+        help="measurements.tsv to compare with, exit code is 1 if any stage regressed",
+    )
+    parser.add_argument(
+        "--tolerance", type=float, default=1.25, help="allowed ratio to the baseline"
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    links = args.links * len(args.genes) if len(args.links) == 1 else args.links
+    if len(links) != len(args.genes):
+        raise ValueError("--links must have one value or a value for each genome")
+
+    path_repo = os.getcwd()
+    paths = {
+        "ko_index": os.path.abspath(args.ko_index),
+        "output": os.path.abspath(args.output) if args.output else None,
+        "baseline": os.path.abspath(args.baseline) if args.baseline else None,
+    }
+    rows = []
+    with tempfile.TemporaryDirectory() as workspace:
+        prepare_workspace(workspace, paths["ko_index"])
+        os.chdir(workspace)
+
+        # Model and indexes are loaded once per process, so they are not measured
+        warnings.simplefilter("ignore")
+        load_resources(args.emission_matrix, args.model)
+
+        print("stage\tgenes\tlinks\tseconds\tpeak_mb")
+        for n_genes, n_links in zip(args.genes, links):
+            genome = f"synthetic_{n_genes}_{n_links}"
+            write_synthetic_genome(genome, n_genes, n_links, args.contigs)
+            measurements = run_stages(
+                genome, args.emission_matrix, args.model, args.repeat
+            )
+            for stage, (seconds, peak_mb) in measurements.items():
+                rows.append([stage, n_genes, n_links, seconds, peak_mb])
+                print(f"{stage}\t{n_genes}\t{n_links}\t{seconds:.3f}\t{peak_mb:.1f}")
+        os.chdir(path_repo)
+
+    results = pd.DataFrame(
+        rows, columns=["stage", "genes", "links", "seconds", "peak_mb"]
+    )
+    if paths["output"]:
+        results.to_csv(paths["output"], sep="\t", index=False)
+
+    exponents = get_scaling_exponents(results)
+    if not exponents.empty:
+        print("\nstage\texponent")
+        for stage, exponent in exponents.items():
+            print(f"{stage}\t{exponent:.2f}")
+
+    if paths["baseline"]:
+        regressions = find_regressions(
+            results, pd.read_csv(paths["baseline"], sep="\t"), args.tolerance
+        )
+        print(f"\n{len(regressions)} regressions compared to {args.baseline}")
+        for regression in regressions:
+            print(regression)
+        sys.exit(1 if regressions else 0)
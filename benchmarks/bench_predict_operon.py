@@ -0,0 +1,171 @@
+import argparse
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+PATH_METRICS = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "scripts", "metrics"
+)
+sys.path.append(PATH_METRICS)
+
+from compiled_model import (  # noqa: E402
+    export_model,
+    load_compiled_model,
+    predict,
+    predict_batch,
+    predict_proba,
+    traverse_trees,
+)
+
+
+def make_synthetic_features(n_genes: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Generates table with data required for prediction.
+
+    :param n_genes: number of genes
+    :param seed: random seed
+    :return: table with data required for prediction
+    """
+    rng = np.random.default_rng(seed)
+    pred_string = rng.integers(150, 1000, n_genes).astype(float)
+    pred_string[rng.random(n_genes) < 0.5] = 500
+
+    data_for_predict = pd.DataFrame(
+        data={
+            "strand": rng.integers(0, 2, n_genes),
+            "prob_operon": rng.random(n_genes),
+            "pred_string": pred_string,
+            "intersection_map_count": rng.poisson(1.0, n_genes).astype(float),
+        }
+    )
+    return data_for_predict
+
+
+def time_cold_load(code: str) -> float:
+    """
+    Measures time of model loading in a new interpreter, including imports.
+
+    :param code: python code loading the model
+    :return: time in seconds
+    """
+    start = time.perf_counter()
+    subprocess.run(
+        [
+            sys.executable,
+            "-W",
+            "ignore",
+            "-c",
+            f"import sys; sys.path.append({PATH_METRICS!r}); {code}",
+        ],
+        check=True,
+    )
+    return time.perf_counter() - start
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        usage="bench_predict_operon.py [--model MODEL.PKL] [--genes 5000 50000] [--batch 100]",
+        description="""Checks parity of compiled model with the pickled one and compares their speed.""",
+    )
+    parser.add_argument(
+        "--model",
+        nargs="?",
+        default="models/model.pkl",
+        help="model for predictions.pkl",
+    )
+    parser.add_argument(
+        "--genes",
+        nargs="*",
+        type=int,
+        default=[5000, 50000],
+        help="sizes of synthetic feature tables",
+    )
+    parser.add_argument(
+        "--batch", type=int, default=100, help="genomes of 5000 genes in batch test"
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        export_model(args.model, f"{temp_dir}/model_compiled")
+
+        time_load_pickle = time_cold_load(
+            f"import pickle; pickle.load(open({args.model!r}, 'rb'))"
+        )
+        time_load_compiled = time_cold_load(
+            "from compiled_model import load_compiled_model; "
+            f"load_compiled_model({temp_dir + '/model_compiled'!r})"
+        )
+        print(
+            f"cold load\tpickle_s={time_load_pickle:.3f}\tcompiled_s={time_load_compiled:.3f}"
+        )
+
+        with open(args.model, "rb") as f:
+            model = pickle.load(f)
+        compiled_model = load_compiled_model(f"{temp_dir}/model_compiled")
+
+        print("genes\tpickle_s\tcompiled_s\tspeedup\tmax_proba_diff\tsame_labels")
+        for n_genes in args.genes:
+            data_for_predict = make_synthetic_features(n_genes, seed=n_genes)
+
+            start = time.perf_counter()
+            proba_pickle = model.predict_proba(data_for_predict)
+            labels_pickle = model.predict(data_for_predict)
+            time_pickle = time.perf_counter() - start
+
+            start = time.perf_counter()
+            proba_compiled = predict_proba(compiled_model, data_for_predict)
+            labels_compiled = predict(compiled_model, data_for_predict)
+            time_compiled = time.perf_counter() - start
+
+            # Score table and tree traversal give the same sums of leaf values
+            features = data_for_predict[list(compiled_model.columns)].to_numpy()
+            raw_score = traverse_trees(
+                compiled_model,
+                (features - compiled_model.scaler_mean) / compiled_model.scaler_scale,
+            ) / len(compiled_model.tree_roots)
+            proba_traversal = 1.0 / (
+                1.0 + np.exp(-compiled_model.output[1] * raw_score)
+            )
+
+            assert np.allclose(proba_pickle, proba_compiled, rtol=0, atol=1e-12)
+            assert np.array_equal(proba_compiled[:, 1], proba_traversal)
+            assert np.array_equal(labels_pickle, labels_compiled)
+            print(
+                f"{n_genes}\t{time_pickle:.3f}\t{time_compiled:.3f}\t"
+                f"{time_pickle / time_compiled:.1f}\t"
+                f"{np.abs(proba_pickle - proba_compiled).max():.1e}\t"
+                f"{np.array_equal(labels_pickle, labels_compiled)}"
+            )
+
+        tables = [
+            make_synthetic_features(5000, seed=genome) for genome in range(args.batch)
+        ]
+
+        start = time.perf_counter()
+        labels_pickle = [model.predict(table) for table in tables]
+        time_pickle = time.perf_counter() - start
+
+        start = time.perf_counter()
+        labels_compiled = predict_batch(compiled_model, tables)
+        time_compiled = time.perf_counter() - start
+
+        same_labels = all(
+            np.array_equal(genome_pickle, genome_compiled)
+            for genome_pickle, genome_compiled in zip(labels_pickle, labels_compiled)
+        )
+        assert same_labels
+        print(
+            f"batch of {args.batch}\t{time_pickle:.3f}\t{time_compiled:.3f}\t"
+            f"{time_pickle / time_compiled:.1f}\t-\t{same_labels}"
+        )
@@ -0,0 +1,105 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import List
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")
+sys.path.append(SCRIPTS_DIR)
+
+from lofi import COMMANDS  # noqa: E402
+
+# Modules reported if they are imported by a command
+HEAVY_MODULES = [
+    "numpy",
+    "pandas",
+    "Bio",
+    "BCBio",
+    "hmmlearn",
+    "sklearn",
+    "lightgbm",
+    "wget",
+]
+
+
+def measure_startup(command: List[str], repeats: int) -> float:
+    """
+    :param command: command to run
+    :param repeats: number of runs
+    :return: median wall time of the command in seconds
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def get_heavy_imports(command: List[str]) -> List[str]:
+    """
+    :param command: python3 command to run
+    :return: heavy modules imported by the command (see HEAVY_MODULES)
+    """
+    output = subprocess.run(
+        [command[0], "-X", "importtime", *command[1:]],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    ).stderr
+    imported = {line.split("|")[-1].strip() for line in output.splitlines()}
+    return [module for module in HEAVY_MODULES if module in imported]
+
+
+def find_script(module: str) -> str:
+    """
+    :param module: module name of lofi subcommand
+    :return: path to the script of the module
+    """
+    for directory in ["", "preprocessing", "metrics"]:
+        path = os.path.join(SCRIPTS_DIR, directory, f"{module}.py")
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(module)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        usage="bench_startup.py [--commands parse-gff kegg] [--repeats 10]",
+        description="""Measures startup time of lofi subcommands and stage scripts with --help.""",
+    )
+    parser.add_argument(
+        "--commands",
+        nargs="*",
+        default=list(COMMANDS),
+        choices=list(COMMANDS),
+        help="lofi subcommands",
+    )
+    parser.add_argument("--repeats", type=int, default=10, help="runs of each command")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    lofi = [sys.executable, os.path.join(SCRIPTS_DIR, "lofi.py")]
+
+    print("command\tscript_s\tlofi_s\theavy_imports")
+    print(
+        f"python\t{measure_startup([sys.executable, '-c', 'pass'], args.repeats):.3f}\t\t"
+    )
+    print(
+        f"lofi\t\t{measure_startup([*lofi, '--help'], args.repeats):.3f}\t"
+        f"{','.join(get_heavy_imports([*lofi, '--help']))}"
+    )
+    for command in args.commands:
+        script = [sys.executable, find_script(COMMANDS[command][0]), "--help"]
+        subcommand = [*lofi, command, "--help"]
+        print(
+            f"{command}\t{measure_startup(script, args.repeats):.3f}\t"
+            f"{measure_startup(subcommand, args.repeats):.3f}\t"
+            f"{','.join(get_heavy_imports(subcommand))}"
+        )
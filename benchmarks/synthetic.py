@@ -0,0 +1,241 @@
+import numpy as np
+import pandas as pd
+
+
+def make_parsed_gff(n_genes: int, n_contigs: int = 1, seed: int = 0) -> pd.DataFrame:
+    """
+    Generates table in the format of parse_gff output.
+
+    :param n_genes: number of CDS features
+    :param n_contigs: number of contigs
+    :param seed: random seed
+    :return: parsed gff3 annotation
+    """
+    rng = np.random.default_rng(seed)
+    contig_sizes = [
+        len(genes) for genes in np.array_split(np.arange(n_genes), n_contigs)
+    ]
+    contigs = np.repeat(
+        [f"contig_{contig}" for contig in range(1, n_contigs + 1)], contig_sizes
+    )
+
+    lengths = rng.integers(300, 1000, n_genes)
+    gaps = rng.integers(-20, 100, n_genes)
+    steps = lengths + gaps
+
+    # Positions restart at each contig
+    contig_starts = np.cumsum([0, *contig_sizes[:-1]])
+    offsets = np.cumsum(steps) - steps
+    starts = 100 + offsets - np.repeat(offsets[contig_starts], contig_sizes)
+
+    gene_names = np.where(
+        rng.random(n_genes) < 0.5,
+        np.char.add("gen", np.arange(n_genes).astype(str)),
+        "",
+    )
+
+    return pd.DataFrame(
+        data={
+            "contig": contigs,
+            "start": starts.astype(np.int64),
+            "end": (starts + lengths).astype(np.int64),
+            "strand": (rng.random(n_genes) < 0.5).astype(np.int64),
+            "gene_name": gene_names.astype(object),
+            "locus_name": [f"SYN_{gene + 1:06d}" for gene in range(n_genes)],
+        }
+    )
+
+
+def write_bakta_gff(path: str, parsed_gff: pd.DataFrame) -> None:
+    """
+    Writes bakta-like .gff3 file with gene and CDS features and ##FASTA section.
+
+    :param path: output file
+    :param parsed_gff: parsed gff3 annotation (see make_parsed_gff)
+    """
+    contig_ends = parsed_gff.groupby("contig", sort=False).end.max() + 1000
+
+    with open(path, "w") as gff:
+        gff.write("##gff-version 3\n")
+        for contig, end in contig_ends.items():
+            gff.write(f"##sequence-region {contig} 1 {end}\n")
+        for contig, genes in parsed_gff.groupby("contig", sort=False):
+            gff.write(
+                f"{contig}\tBakta\tregion\t1\t{contig_ends[contig]}\t.\t+\t.\t"
+                f"ID={contig};Name={contig}\n"
+            )
+            for gene in genes.itertuples():
+                strand = "+" if gene.strand == 1 else "-"
+                gene_name = f";gene={gene.gene_name}" if gene.gene_name else ""
+                gff.write(
+                    f"{contig}\tPyrodigal\tgene\t{gene.start}\t{gene.end}\t.\t"
+                    f"{strand}\t.\tID={gene.locus_name}_gene;locus_tag={gene.locus_name}\n"
+                    f"{contig}\tPyrodigal\tCDS\t{gene.start}\t{gene.end}\t.\t"
+                    f"{strand}\t0\tID={gene.locus_name};Name=hypothetical protein{gene_name};"
+                    f"locus_tag={gene.locus_name};product=hypothetical protein\n"
+                )
+        gff.write("##FASTA\n")
+        for contig in contig_ends.index:
+            gff.write(f">{contig}\n" + "ACGT" * 20 + "\n")
+
+
+def get_string_proteins(n_proteins: int, taxon_id: int = 1) -> np.ndarray:
+    """
+    :param n_proteins: number of STRING proteins
+    :param taxon_id: NCBI taxon id
+    :return: STRING ids of proteins
+    """
+    return np.array(
+        [f"{taxon_id}.P{protein:08d}" for protein in range(n_proteins)], dtype=object
+    )
+
+
+def assign_string_proteins(
+    n_genes: int, n_proteins: int, hit_rate: float = 0.85, seed: int = 0
+) -> np.ndarray:
+    """
+    Chooses STRING protein for each gene.
+
+    :param n_genes: number of genes
+    :param n_proteins: number of STRING proteins
+    :param hit_rate: fraction of genes with STRING protein
+    :param seed: random seed
+    :return: protein code for each gene (-1 for genes without protein)
+    """
+    rng = np.random.default_rng(seed)
+    gene_proteins = rng.permutation(max(n_proteins, n_genes))[:n_genes] % n_proteins
+    gene_proteins[rng.random(n_genes) >= hit_rate] = -1
+    return gene_proteins
+
+
+def write_diamond_result(
+    path: str,
+    queries: np.ndarray,
+    best_targets: np.ndarray,
+    targets: np.ndarray,
+    max_hits: int = 25,
+    seed: int = 0,
+) -> int:
+    """
+    Writes Diamond tabular output with hits grouped by query. Other hits may have
+    the same maximal identity, so the first of them is not always the given one.
+
+    :param path: path to Diamond result.tsv
+    :param queries: query ids
+    :param best_targets: STRING id of a hit with maximal identity (None for no hits)
+    :param targets: STRING ids of other hits
+    :param max_hits: maximum number of hits per query
+    :param seed: random seed
+    :return: number of hits
+    """
+    rng = np.random.default_rng(seed)
+    has_hits = pd.notna(best_targets)
+    queries, best_targets = np.asarray(queries)[has_hits], best_targets[has_hits]
+
+    hits = rng.integers(1, max_hits + 1, len(queries))
+    query_codes = np.repeat(np.arange(len(queries)), hits)
+    target_accession = np.asarray(targets, dtype=object)[
+        rng.integers(0, len(targets), query_codes.size)
+    ]
+    identities = rng.choice(
+        [35.2, 60.0, 87.5, 100.0], query_codes.size, p=[0.4, 0.3, 0.2, 0.1]
+    )
+
+    # A hit with maximal identity is placed at random position among hits of the query
+    first_hits = np.cumsum(hits) - hits
+    best_hits = first_hits + rng.integers(0, hits)
+    target_accession[best_hits] = best_targets
+    identities[best_hits] = 100.0
+
+    table = pd.DataFrame(
+        {
+            "query_accession": np.asarray(queries, dtype=object)[query_codes],
+            "target_accession": target_accession,
+            "sequence_identity": identities,
+        }
+    )
+    for column in range(9):
+        table[f"column_{column}"] = rng.integers(1, 1000, query_codes.size)
+    table.to_csv(path, sep="\t", header=False, index=False)
+    return query_codes.size
+
+
+def write_string_links(
+    path: str,
+    proteins: np.ndarray,
+    gene_proteins: np.ndarray,
+    n_links: int,
+    neighbour_rate: float = 0.7,
+    chunk_size: int = 1_000_000,
+    seed: int = 0,
+) -> None:
+    """
+    Writes protein.links file of the STRING database. Most neighbouring genes
+    are linked, the remaining links are random.
+
+    :param path: path to protein links.txt
+    :param proteins: STRING ids of proteins
+    :param gene_proteins: protein code for each gene (-1 for genes without protein)
+    :param n_links: number of links
+    :param neighbour_rate: fraction of neighbouring genes with a link
+    :param chunk_size: number of links written at once
+    :param seed: random seed
+    """
+    rng = np.random.default_rng(seed)
+    first, second = gene_proteins[:-1], gene_proteins[1:]
+    linked = (first >= 0) & (second >= 0) & (rng.random(len(first)) < neighbour_rate)
+    neighbours = np.concatenate(
+        [
+            np.stack([first[linked], second[linked]], axis=1),
+            np.stack([second[linked], first[linked]], axis=1),
+        ]
+    )[:n_links]
+
+    with open(path, "w") as links:
+        links.write("protein1 protein2 combined_score\n")
+        for start in range(0, n_links, chunk_size):
+            size = min(chunk_size, n_links - start)
+            pairs = rng.integers(0, len(proteins), (size, 2))
+            chunk_neighbours = neighbours[start : start + size]
+            pairs[: len(chunk_neighbours)] = chunk_neighbours
+            pd.DataFrame(
+                {
+                    "protein1": proteins[pairs[:, 0]],
+                    "protein2": proteins[pairs[:, 1]],
+                    "combined_score": rng.integers(150, 1000, size),
+                }
+            ).to_csv(links, sep=" ", header=False, index=False)
+
+
+def write_kofam_result(
+    path: str,
+    locus_names: np.ndarray,
+    kos: np.ndarray,
+    annotated_rate: float = 0.5,
+    shared_rate: float = 0.3,
+    seed: int = 0,
+) -> None:
+    """
+    Writes kofam_scan result in mapper-one-line format: a line for each protein,
+    annotated proteins have 1-3 KOs, neighbouring proteins often share a KO.
+
+    :param path: path to hmm result.txt
+    :param locus_names: locus tags of proteins
+    :param kos: KO ids to choose from
+    :param annotated_rate: fraction of proteins with KO
+    :param shared_rate: fraction of annotated proteins sharing a KO with the previous one
+    :param seed: random seed
+    """
+    rng = np.random.default_rng(seed)
+    previous = []
+    with open(path, "w") as result:
+        for locus_name in locus_names:
+            if rng.random() >= annotated_rate:
+                result.write(f"{locus_name}\n")
+                previous = []
+                continue
+            protein_kos = list(rng.choice(kos, rng.integers(1, 4)))
+            if previous and rng.random() < shared_rate:
+                protein_kos[0] = previous[0]
+            result.write(f"{locus_name}\t" + "\t".join(protein_kos) + "\n")
+            previous = protein_kos
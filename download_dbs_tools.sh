@@ -31,12 +31,14 @@ databases/db-light \
 databases/ko_list \
 databases/profiles/prokaryote.hal \
 databases/mash/refseq.genomes.k21s1000.msh \
+databases/mash/refseq_taxid_index \
 kofam_scan-1.3.0/exec_annotation
 
 #snakemake --cores=all databases/db-light # download_db_light
 #
 #snakemake --cores=all mash-Linux64-v2.3 # download_mash
 #snakemake --cores=all databases/mash/refseq.genomes.k21s1000.msh # download_mash_db
+#snakemake --cores=all databases/mash/refseq_taxid_index # download_assembly_summary, build_taxid_index
 #
 #snakemake --cores=all databases/ko_list # download_db_for_kofam_scan (get_ko_list)
 #snakemake --cores=all databases/profiles/prokaryote.hal # download_db_for_kofam_scan (get_profiles)
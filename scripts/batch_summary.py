@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import argparse
+from typing import TYPE_CHECKING, List, Tuple
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def read_manifest(path_manifest: str) -> List[Tuple[str, str]]:
+    """
+    Reads batch manifest with genomes for prediction.
+
+    :param path_manifest: path to manifest.tsv with taxid and genome columns
+    (genome file name in the genomes folder, extension is optional)
+    :return: list of (taxid, genome name without extension)
+    """
+    import pandas as pd
+
+    manifest = pd.read_csv(path_manifest, sep="\t", dtype=str, comment="#")
+    genomes = [
+        (taxid.strip(), genome.strip().removesuffix(".fna"))
+        for taxid, genome in zip(manifest.taxid, manifest.genome)
+    ]
+    return genomes
+
+
+def summarize_predictions(genomes: List[Tuple[str, str]]) -> pd.DataFrame:
+    """
+    Creates combined table with operon statistics for each genome in batch.
+
+    :param genomes: list of (taxid, genome name without extension)
+    :return: table with one row per genome
+    """
+    import pandas as pd
+
+    summary = []
+    for taxon_id, genome in genomes:
+        final_table = pd.read_csv(
+            f"results/{taxon_id}/predictions/{genome}_predictions.tsv",
+            sep="\t",
+            usecols=["operon_number", "contig"],
+        )
+        operon_sizes = final_table.operon_number[
+            final_table.operon_number != "non_operon"
+        ].value_counts()
+
+        summary.append(
+            [
+                taxon_id,
+                genome,
+                final_table.contig.nunique(),
+                final_table.shape[0],
+                operon_sizes.sum(),
+                operon_sizes.shape[0],
+                round(operon_sizes.mean(), 2) if operon_sizes.shape[0] else 0,
+                operon_sizes.max() if operon_sizes.shape[0] else 0,
+            ]
+        )
+
+    columns = [
+        "taxid",
+        "genome",
+        "contigs",
+        "genes",
+        "operon_genes",
+        "operons",
+        "mean_operon_size",
+        "max_operon_size",
+    ]
+    return pd.DataFrame(data=summary, columns=columns)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        usage="batch_summary.py --manifest MANIFEST.TSV --output SUMMARY.TSV",
+        description="""Combines operon predictions for genomes from batch manifest.""",
+    )
+    parser.add_argument(
+        "-m", "--manifest", nargs="?", help="manifest.tsv with taxid and genome columns"
+    )
+    parser.add_argument("-o", "--output", nargs="?", help="summary table.tsv")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    summary = summarize_predictions(read_manifest(args.manifest))
+    summary.to_csv(args.output, sep="\t", index=False)
+
+    print(f"Batch summary for {summary.shape[0]} genomes is in {args.output}")
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "metrics"))
+
+from get_string_scores import get_string_scores  # noqa: E402
+from intergenic_distances import (  # noqa: E402
+    calculate_intergenic_dist,
+    predict_operon_inter_dist,
+)
+from predict_operon import get_data_for_predict, predict_operon  # noqa: E402
+
+
+def split_contig_batches(gene_contigs: np.ndarray, n_batches: int) -> List[slice]:
+    """
+    Splits genes into batches of whole contigs with nearly equal numbers of genes.
+    Batches keep the order of genes, a contig larger than a batch forms its own batch.
+
+    :param gene_contigs: contig of each gene, genes of a contig must go in a row
+    :param n_batches: desired number of batches
+    :return: slices of genes in each batch
+    """
+    import numpy as np
+
+    gene_contigs = np.asarray(gene_contigs)
+    contig_starts = np.flatnonzero(np.r_[True, gene_contigs[1:] != gene_contigs[:-1]])
+
+    # Each batch ends before the first contig starting after its share of genes
+    targets = np.arange(1, n_batches) * len(gene_contigs) / n_batches
+    positions = np.searchsorted(contig_starts, targets)
+    borders = np.unique(contig_starts[positions[positions < len(contig_starts)]])
+    borders = [0, *borders[borders > 0].tolist(), len(gene_contigs)]
+
+    return [slice(start, end) for start, end in zip(borders[:-1], borders[1:])]
+
+
+def predict_contig_batch(
+    parsed_gff: pd.DataFrame,
+    diamond_result_filtered: pd.DataFrame,
+    protein_links: pd.DataFrame,
+    kegg_annotation: Optional[pd.DataFrame],
+    contigs: pd.DataFrame,
+    path_matrix_emission: str,
+    model_file: str,
+) -> Tuple[pd.DataFrame, pd.Series, pd.Series]:
+    """
+    Runs the stages which depend on neighbouring genes for a batch of whole contigs.
+
+    :param parsed_gff: parsed gff3 annotation of the batch
+    :param diamond_result_filtered: filtered Diamond alignment of the batch proteins
+    :param protein_links: STRING links of the proteins aligned to the batch proteins
+    :param kegg_annotation: table with KEGG annotation of the batch genes
+    (None for provisional prediction, see get_data_for_predict)
+    :param contigs: table with length and topology of the batch contigs (see parse_contigs)
+    :param path_matrix_emission: path to emission matrix.npy
+    :param model_file: path to model.pkl or compiled model directory
+    :return: STRING scores, operon probability based on intergenic distances
+    and predictions with the index of parsed_gff
+    """
+    string_scores = get_string_scores(
+        parsed_gff, diamond_result_filtered, protein_links, contigs
+    )
+    df_inter_dist = calculate_intergenic_dist(parsed_gff, contigs)
+    prob_operon = predict_operon_inter_dist(df_inter_dist, path_matrix_emission)
+
+    data_for_predict = get_data_for_predict(
+        parsed_gff, string_scores, prob_operon, kegg_annotation
+    )
+    predictions = predict_operon(model_file, data_for_predict)
+
+    return (
+        string_scores.set_axis(parsed_gff.index),
+        prob_operon.set_axis(parsed_gff.index),
+        predictions.set_axis(parsed_gff.index),
+    )
+
+
+def predict_by_contigs(
+    parsed_gff: pd.DataFrame,
+    diamond_result_filtered: pd.DataFrame,
+    protein_links: pd.DataFrame,
+    kegg_annotation: Optional[pd.DataFrame],
+    contigs: pd.DataFrame,
+    path_matrix_emission: str = "data/matrix_emission_15.npy",
+    model_file: str = "models/model.pkl",
+    workers: int = 1,
+) -> Tuple[pd.DataFrame, pd.Series, pd.Series]:
+    """
+    Predicts operons in batches of contigs processed independently in a process pool.
+    Each batch gets only its own proteins and STRING links, results are merged
+    in the order of genes.
+
+    :param parsed_gff: parsed gff3 annotation
+    :param diamond_result_filtered: filtered Diamond alignment against STRING proteins
+    :param protein_links: STRING links between the aligned proteins
+    :param kegg_annotation: table with KEGG annotation for each gene
+    (None for provisional prediction, see get_data_for_predict)
+    :param contigs: table with length and topology of contigs (see parse_contigs)
+    :param path_matrix_emission: path to emission matrix.npy
+    :param model_file: path to model.pkl or compiled model directory
+    :param workers: number of processes (1 - in this process)
+    :return: STRING scores, operon probability based on intergenic distances, predictions
+    """
+    import pandas as pd
+
+    # Several batches per worker even out contigs of different sizes
+    batches = split_contig_batches(parsed_gff["contig"].to_numpy(), workers * 4)
+
+    tasks = []
+    for batch in batches:
+        batch_gff = parsed_gff.iloc[batch]
+        batch_diamond = diamond_result_filtered[
+            diamond_result_filtered.query_accession.isin(batch_gff.locus_name)
+        ]
+        tasks.append(
+            (
+                batch_gff,
+                batch_diamond,
+                protein_links[
+                    protein_links.protein1.isin(batch_diamond.target_accession)
+                ],
+                None if kegg_annotation is None else kegg_annotation.iloc[batch],
+                contigs[contigs.index.isin(batch_gff.contig)],
+                path_matrix_emission,
+                model_file,
+            )
+        )
+
+    if workers == 1 or len(tasks) == 1:
+        results = [predict_contig_batch(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            results = list(executor.map(predict_contig_batch, *zip(*tasks)))
+
+    string_scores, prob_operon, predictions = zip(*results)
+    return pd.concat(string_scores), pd.concat(prob_operon), pd.concat(predictions)
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Optional, Sequence, Union
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+# Column types of intermediate tables written in Arrow format,
+# tables of gene metrics are keyed by locus_name
+SCHEMAS = {
+    "parsed_gff": {
+        "contig": "string",
+        "start": "int64",
+        "end": "int64",
+        "strand": "int8",
+        "gene_name": "string",
+        "locus_name": "string",
+    },
+    "diamond_filtered": {
+        "query_accession": "string",
+        "target_accession": "string",
+        "sequence_identity": "float64",
+    },
+    "string_scores": {
+        "locus_name": "string",
+        "prev_scores": "float64",
+        "next_scores": "float64",
+        "final_scores": "float64",
+    },
+    "kegg": {
+        "locus_name": "string",
+        "kegg_orthology": "string",
+        "metabolic_pathway_kegg": "string",
+        "description_kegg": "string",
+        "intersection_map_count": "float64",
+    },
+    "inter_dist": {"locus_name": "string", "prob_operon": "float64"},
+    "predictions": {"locus_name": "string", "prediction": "int64"},
+}
+
+
+def is_arrow(path: str) -> bool:
+    """
+    :param path: path to intermediate table
+    :return: True if the table is in Arrow IPC format (.arrow extension)
+    """
+    return path.endswith(".arrow")
+
+
+def write_table(
+    table: Union[pd.DataFrame, pd.Series],
+    path: str,
+    kind: str,
+    locus_names: Optional[Sequence[str]] = None,
+) -> None:
+    """
+    Writes intermediate table. A path with .arrow extension gives uncompressed
+    Arrow IPC file with column types of SCHEMAS, which can be memory-mapped,
+    other paths give .tsv file with index as before.
+
+    :param table: table or series with values for each gene
+    :param path: output file
+    :param kind: name of the table in SCHEMAS
+    :param locus_names: locus tag of each row for tables keyed by locus_name
+    """
+    import numpy as np
+    import pandas as pd
+
+    if not is_arrow(path):
+        table.to_csv(path, sep="\t")
+        return
+
+    import pyarrow as pa
+
+    schema = pa.schema(
+        [(column, pa.type_for_alias(dtype)) for column, dtype in SCHEMAS[kind].items()]
+    )
+    columns = [column for column in SCHEMAS[kind] if column != "locus_name"]
+    if isinstance(table, pd.Series):
+        table = table.to_frame(columns[0])
+    if "locus_name" in SCHEMAS[kind] and "locus_name" not in table:
+        table = table.assign(locus_name=np.asarray(locus_names, dtype=object))
+
+    arrow_table = pa.Table.from_pandas(
+        table[schema.names], schema=schema, preserve_index=False
+    )
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        writer.write_table(arrow_table)
+
+
+def read_table(
+    path: str, kind: str, locus_names: Optional[Sequence[str]] = None
+) -> pd.DataFrame:
+    """
+    Reads intermediate table written by write_table. Arrow files are memory-mapped,
+    numeric columns are not copied. The index column of .tsv files is dropped.
+
+    :param path: path to intermediate table
+    :param kind: name of the table in SCHEMAS
+    :param locus_names: locus tags of genes to align the rows to (see align_by_locus)
+    :return: table with RangeIndex
+    """
+    import pandas as pd
+
+    if is_arrow(path):
+        import pyarrow as pa
+
+        arrow_table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        if arrow_table.schema.names != list(SCHEMAS[kind]):
+            raise ValueError(f"{path} is not a {kind} table")
+        table = arrow_table.to_pandas(split_blocks=True)
+    else:
+        table = pd.read_csv(path, sep="\t", index_col=0).reset_index(drop=True)
+
+    if locus_names is not None:
+        table = align_by_locus(table, locus_names, path)
+    return table
+
+
+def align_by_locus(
+    table: pd.DataFrame, locus_names: Sequence[str], path: str = "table"
+) -> pd.DataFrame:
+    """
+    Orders rows of a table keyed by locus_name as the given genes and drops the key.
+    Tables without the key (.tsv) must have a row for each gene in the same order.
+
+    :param table: table with values for each gene
+    :param locus_names: locus tags of genes
+    :param path: path to the table for error messages
+    :return: table with a row for each gene
+    """
+    import numpy as np
+
+    if "locus_name" not in table:
+        if table.shape[0] != len(locus_names):
+            raise ValueError(
+                f"{path} has {table.shape[0]} rows for {len(locus_names)} genes"
+            )
+        return table
+
+    # Tables written by the stages usually follow the order of the annotation
+    keys = table["locus_name"].to_numpy(dtype=object)
+    if (
+        len(keys) == len(locus_names)
+        and (keys == np.asarray(locus_names, dtype=object)).all()
+    ):
+        return table.drop(columns="locus_name")
+
+    keyed = table.set_index("locus_name")
+    if not keyed.index.is_unique:
+        raise ValueError(f"{path} has repeated locus tags")
+    positions = keyed.index.get_indexer(locus_names)
+    if (positions == -1).any():
+        missing = np.asarray(locus_names, dtype=object)[positions == -1]
+        raise ValueError(
+            f"{path} has no rows for {len(missing)} genes, e.g. {missing[0]}"
+        )
+    return keyed.iloc[positions].reset_index(drop=True)
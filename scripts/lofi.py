@@ -0,0 +1,81 @@
+import argparse
+import os
+import runpy
+import sys
+from typing import List, Optional
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Subcommand: (module, help), modules are imported only when the subcommand is run
+COMMANDS = {
+    "parse-gff": ("parse_gff", "parse .gff3 annotation of bakta"),
+    "filter-diamond": (
+        "filter_diamond_results",
+        "keep the best DIAMOND hit of each protein",
+    ),
+    "string-scores": ("get_string_scores", "STRING scores of neighbouring genes"),
+    "kegg": ("kegg", "KEGG annotation and common metabolic pathways"),
+    "inter-dist": (
+        "intergenic_distances",
+        "operon probabilities from intergenic distances",
+    ),
+    "predict": ("predict_operon", "operon prediction by the model"),
+    "format-output": ("main", "final .tsv, .gff3 and operon tables"),
+    "pipeline": ("pipeline", "all stages after annotation in one process"),
+    "string-links": ("string_links", "convert STRING links to memory-mapped cache"),
+    "kegg-index": ("kegg_index", "build memory-mapped KEGG index"),
+    "compile-model": ("compiled_model", "compile the model to arrays"),
+    "download-string": ("download_string_files", "download STRING files of a taxon"),
+    "taxid": ("obtain_taxid", "taxid of the closest Mash hit"),
+    "taxid-index": ("taxid_index", "build taxid index of RefSeq genomes"),
+    "annotation-cache": (
+        "annotation_cache",
+        "DIAMOND and kofam_scan with cache of proteins",
+    ),
+    "shard-proteins": ("shard_proteins", "split proteome into shards for kofam_scan"),
+    "batch-summary": ("batch_summary", "operon statistics of a batch"),
+    "run-report": ("run_report", "time and memory of the stages"),
+    "server": ("server", "prediction service"),
+}
+
+
+def run_command(command: str, args: List[str]) -> None:
+    """
+    Runs script of the subcommand as __main__ with the given arguments.
+    Only the modules of this script are imported.
+
+    :param command: subcommand name (see COMMANDS)
+    :param args: arguments of the script
+    """
+    module, _ = COMMANDS[command]
+    sys.path[:0] = [
+        SCRIPTS_DIR,
+        os.path.join(SCRIPTS_DIR, "preprocessing"),
+        os.path.join(SCRIPTS_DIR, "metrics"),
+    ]
+    # sys.argv[0] is replaced by the path to the script
+    sys.argv = [module, *args]
+    runpy.run_module(module, run_name="__main__", alter_sys=True)
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="lofi",
+        usage="lofi COMMAND [ARGS ...]",
+        description="""Operon prediction tools, run lofi COMMAND --help for arguments of a command.""",
+    )
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND", required=True)
+    for command, (_, help_text) in COMMANDS.items():
+        # Arguments are parsed by the script of the command
+        subparsers.add_parser(command, help=help_text, add_help=False)
+
+    return parser.parse_known_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args, command_args = parse_args(argv)
+    run_command(args.command, command_args)
+
+
+if __name__ == "__main__":
+    main()
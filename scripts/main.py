@@ -1,34 +1,182 @@
+from __future__ import annotations
+
 import argparse
+import json
+import os
+import sys
+from typing import TYPE_CHECKING, Dict, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "metrics"))
+
+from intermediate import align_by_locus, read_table  # noqa: E402
+from kegg import count_common_pathways  # noqa: E402
+from kegg_index import (  # noqa: E402
+    decode_pathways,
+    encode_pathways,
+    load_kegg_index,
+    popcount,
+)
+
+
+def get_next_pathway_overlap(
+    pathways: pd.Series, contigs: np.ndarray, path_to_ko_index: str = "data/ko_index"
+) -> np.ndarray:
+    """
+    Checks if each gene shares metabolic pathways with the next gene.
+
+    :param pathways: comma-joined KEGG metabolic pathways for each gene
+    :param contigs: contig of each gene
+    :param path_to_ko_index: KEGG index directory (see kegg_index.py)
+    :return: boolean array, True if the gene and the next one have a common pathway
+    """
+    import numpy as np
+
+    bitsets = encode_pathways(load_kegg_index(path_to_ko_index), pathways)
+    _, common_next = count_common_pathways(bitsets, contigs)
+
+    # Genes without pathways share the empty pathway "" as in set("".split(","))
+    no_pathways = popcount(bitsets) == 0
+    no_pathways_pair = np.append(no_pathways[:-1] & no_pathways[1:], False)
+
+    return (common_next > 0) | no_pathways_pair
+
+
+def label_operons(
+    prediction: np.ndarray,
+    next_scores: np.ndarray,
+    next_pathway_overlap: np.ndarray,
+    contigs: np.ndarray,
+    string_threshold: int = 810,
+) -> np.ndarray:
+    """
+    Splits genes predicted as operonic into numbered operons.
+    An operon ends after a gene if the next gene is not operonic, lies on another contig,
+    or has neither a high STRING score nor a common metabolic pathway with the gene.
+
+    :param prediction: operon predictions for each gene (1 - operonic gene)
+    :param next_scores: STRING scores with the next gene
+    :param next_pathway_overlap: True if the gene shares a pathway with the next gene
+    :param contigs: contig of each gene
+    :param string_threshold: minimal STRING score to join genes without common pathways
+    :return: operon label for each gene ("operon_N" or "non_operon")
+    """
+    import numpy as np
+
+    prediction = np.asarray(prediction) == 1
+    contigs = np.asarray(contigs)
+
+    # The last gene of the genome is never assigned to an operon
+    in_operon = prediction.copy()
+    in_operon[-1:] = False
+
+    operon_end = in_operon[:-1] & (
+        ((np.asarray(next_scores)[:-1] < string_threshold) & ~next_pathway_overlap[:-1])
+        | ~prediction[1:]
+        | (contigs[:-1] != contigs[1:])
+    )
+    operon_end = np.append(operon_end, False)
+    operon_number = 1 + np.cumsum(operon_end) - operon_end
 
-import numpy as np
-import pandas as pd
+    labels = np.full(len(prediction), "non_operon", dtype=object)
+    labels[in_operon] = np.char.add("operon_", operon_number[in_operon].astype(str))
+    return labels
 
 
 def format_output(
-    genome: str, taxon_id: int, predictions: pd.DataFrame
-) -> pd.DataFrame:
+    genome: str,
+    taxon_id: int,
+    predictions: pd.DataFrame,
+    intermediate_format: str = "tsv",
+    provisional: bool = False,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
     """
-    Creates final table with results of operons predictions.
+    Creates final table with results of operons predictions and the table of operons.
+    Intermediate tables are joined by locus tag.
 
     :param genome: input genome fasta file
     :param taxon_id: NCBI taxon id
-    :param predictions: file with predictions
-    :return: table with final results
+    :param predictions: table with predictions (see read_table)
+    :param intermediate_format: extension of intermediate tables (tsv or arrow)
+    :param provisional: predictions were made before kofam_scan finished,
+    KEGG annotation is left empty (see build_final_table)
+    :return: table with final results, table of operons (see build_operon_table)
     """
-    parsed_gff = pd.read_csv(f"results/{taxon_id}/bakta/{genome}_parsed.tsv", sep="\t")
-    parsed_gff.drop(columns=parsed_gff.columns[0], axis=1, inplace=True)
-    predictions.drop(columns=predictions.columns[0], axis=1, inplace=True)
+    temp_dir = f"results/{taxon_id}/predictions/temp_dir"
+    parsed_gff = read_table(
+        f"results/{taxon_id}/bakta/{genome}_parsed.{intermediate_format}",
+        "parsed_gff",
+    )
+    predictions = align_by_locus(predictions, parsed_gff.locus_name, "predictions")
 
-    final_table = parsed_gff.copy()
-    kegg_annotation = pd.read_csv(
-        f"results/{taxon_id}/predictions/temp_dir/{taxon_id}_{genome}_kegg.tsv",
-        sep="\t",
+    kegg_annotation = None
+    if not provisional:
+        kegg_annotation = read_table(
+            f"{temp_dir}/{taxon_id}_{genome}_kegg.{intermediate_format}",
+            "kegg",
+            parsed_gff.locus_name,
+        )
+    string_result = read_table(
+        f"{temp_dir}/{taxon_id}_{genome}_string_scores.{intermediate_format}",
+        "string_scores",
+        parsed_gff.locus_name,
     )
-    string_result = pd.read_csv(
-        f"results/{taxon_id}/predictions/temp_dir/{taxon_id}_{genome}_string_scores.tsv",
-        sep="\t",
+
+    final_table = build_final_table(
+        parsed_gff, kegg_annotation, string_result, predictions.iloc[:, 0]
+    )
+    operons = build_operon_table(
+        final_table, parsed_gff["strand"], string_result["next_scores"]
     )
 
+    return final_table, operons
+
+
+def build_final_table(
+    parsed_gff: pd.DataFrame,
+    kegg_annotation: Optional[pd.DataFrame],
+    string_result: pd.DataFrame,
+    predictions: pd.Series,
+    path_to_ko_index: str = "data/ko_index",
+) -> pd.DataFrame:
+    """
+    Combines parsed annotation, metrics and predictions into the final table.
+    Without KEGG annotation (provisional prediction before kofam_scan finishes)
+    KEGG columns are empty and neighbouring genes have no common pathways,
+    so operons are split by STRING scores alone.
+
+    :param parsed_gff: parsed gff3 annotation
+    :param kegg_annotation: table with KEGG annotation for each gene or None
+    :param string_result: table with STRING scores for each gene
+    :param predictions: operon predictions for each gene
+    :param path_to_ko_index: KEGG index directory (see kegg_index.py)
+    :return: table with final results
+    """
+    import numpy as np
+    import pandas as pd
+
+    final_table = parsed_gff.copy()
+
+    if kegg_annotation is None:
+        kegg_annotation = pd.DataFrame(
+            {
+                "kegg_orthology": "",
+                "metabolic_pathway_kegg": "",
+                "description_kegg": "",
+            },
+            index=parsed_gff.index,
+        )
+        next_pathway_overlap = np.zeros(parsed_gff.shape[0], dtype=bool)
+    else:
+        next_pathway_overlap = get_next_pathway_overlap(
+            kegg_annotation["metabolic_pathway_kegg"].replace(np.nan, ""),
+            parsed_gff["contig"].to_numpy(),
+            path_to_ko_index,
+        )
+
     final_table["kegg_orthology"] = kegg_annotation["kegg_orthology"]
     final_table["metabolic_pathway_kegg"] = kegg_annotation[
         "metabolic_pathway_kegg"
@@ -36,36 +184,184 @@ def format_output(
     final_table["description_kegg"] = kegg_annotation["description_kegg"]
     final_table["prediction"] = predictions
 
-    current_operon = 1
-    dict_operons = {1: []}
-    for i in range(len(final_table) - 1):
-        if final_table["prediction"].iloc[i] == 1:
-            dict_operons[current_operon].append(i)
-            map_current_gene = final_table["metabolic_pathway_kegg"].iloc[i]
-            map_next_gene = final_table["metabolic_pathway_kegg"].iloc[i + 1]
-            string_next_gene = string_result["next_scores"].iloc[i]
-            if (
-                string_next_gene < 810
-                and len(
-                    set(map_current_gene.split(",")).intersection(
-                        map_next_gene.split(",")
-                    )
-                )
-                < 1
-            ) or final_table["prediction"].iloc[i + 1] == 0:
-                current_operon += 1
-                dict_operons[current_operon] = []
-
-    final_table.insert(loc=0, column="operon_number", value="non_operon")
-
-    for operon_number, index_cds in dict_operons.items():
-        final_table.loc[index_cds, "operon_number"] = f"operon_{operon_number}"
+    final_table.insert(
+        loc=0,
+        column="operon_number",
+        value=label_operons(
+            final_table["prediction"].to_numpy(),
+            string_result["next_scores"].to_numpy(),
+            next_pathway_overlap,
+            final_table["contig"].to_numpy(),
+        ),
+    )
 
     final_table = final_table.drop(["prediction", "strand"], axis=1)
 
     return final_table
 
 
+def build_operon_table(
+    final_table: pd.DataFrame,
+    strands: Sequence[int],
+    next_scores: Sequence[float],
+    path_to_ko_index: str = "data/ko_index",
+) -> pd.DataFrame:
+    """
+    Collects genes of each operon of the final table into one record.
+    Genes of an operon are consecutive, so the records are reduced
+    over operon borders of the gene arrays without grouping.
+
+    :param final_table: table with final results (see build_final_table)
+    :param strands: strand of each gene (1 - plus strand)
+    :param next_scores: STRING scores with the next gene
+    :param path_to_ko_index: KEGG index directory (see kegg_index.py)
+    :return: table with contig, borders, strand ("." for genes on both strands),
+    comma-joined locus tags, mean STRING score of adjacent genes (NaN for single genes)
+    and comma-joined metabolic pathways shared by all genes of each operon
+    """
+    import numpy as np
+    import pandas as pd
+
+    labels = final_table["operon_number"].to_numpy()
+    in_operon = np.flatnonzero(labels != "non_operon")
+    if not len(in_operon):
+        return pd.DataFrame(
+            columns=[
+                "operon_number",
+                "contig",
+                "start",
+                "end",
+                "strand",
+                "locus_tags",
+                "mean_string_score",
+                "shared_pathways",
+            ]
+        )
+
+    operon_labels = labels[in_operon]
+    borders = np.flatnonzero(np.append(True, operon_labels[1:] != operon_labels[:-1]))
+    sizes = np.diff(np.append(borders, len(in_operon)))
+
+    plus_strand = np.add.reduceat(
+        (np.asarray(strands)[in_operon] == 1).astype(np.int64), borders
+    )
+    strand = np.where(
+        plus_strand == sizes, "+", np.where(plus_strand == 0, "-", ".")
+    ).astype(object)
+
+    # The score of the last gene of an operon is the score with a gene outside of it
+    is_last = np.zeros(len(in_operon), dtype=bool)
+    is_last[np.append(borders[1:], len(in_operon)) - 1] = True
+    scores = np.where(is_last, 0, np.asarray(next_scores, dtype=float)[in_operon])
+    with np.errstate(invalid="ignore"):
+        mean_scores = np.add.reduceat(scores, borders) / (sizes - 1)
+
+    kegg_index = load_kegg_index(path_to_ko_index)
+    bitsets = encode_pathways(
+        kegg_index, final_table["metabolic_pathway_kegg"].to_numpy()[in_operon]
+    )
+    shared_bitsets = np.bitwise_and.reduceat(bitsets, borders, axis=0)
+
+    locus_names = final_table["locus_name"].to_numpy()[in_operon]
+    operons = pd.DataFrame(
+        data={
+            "operon_number": operon_labels[borders],
+            "contig": final_table["contig"].to_numpy()[in_operon][borders],
+            "start": np.minimum.reduceat(
+                final_table["start"].to_numpy()[in_operon], borders
+            ),
+            "end": np.maximum.reduceat(
+                final_table["end"].to_numpy()[in_operon], borders
+            ),
+            "strand": strand,
+            "locus_tags": [
+                ",".join(tags) for tags in np.split(locus_names, borders[1:])
+            ],
+            "mean_string_score": mean_scores,
+            "shared_pathways": [
+                ",".join(decode_pathways(kegg_index, bitset))
+                for bitset in shared_bitsets
+            ],
+        }
+    )
+
+    return operons
+
+
+def write_predictions(
+    final_table: pd.DataFrame,
+    operons: pd.DataFrame,
+    output_filename_tsv: str,
+    output_prefix_operons: str,
+    operon_formats: Sequence[str] = ("tsv", "bed", "jsonl"),
+    prediction_status: str = "final",
+) -> None:
+    """
+    Writes final table and the table of operons in the given formats:
+    .tsv with the columns of build_operon_table, .bed (BED6, score is the mean STRING score)
+    and .jsonl with one operon per line, locus tags and pathways as lists.
+    Tables in .tsv and .jsonl format have prediction_status column.
+
+    :param final_table: table with final results
+    :param operons: table of operons (see build_operon_table)
+    :param output_filename_tsv: output filename of final table
+    :param output_prefix_operons: output filename of operons without extension
+    :param operon_formats: formats of operons (tsv, bed, jsonl)
+    :param prediction_status: "provisional" (without KEGG annotation) or "final"
+    """
+    import numpy as np
+    import pandas as pd
+
+    final_table = final_table.assign(prediction_status=prediction_status)
+    operons = operons.assign(prediction_status=prediction_status)
+
+    final_table.to_csv(output_filename_tsv, sep="\t")
+
+    if "tsv" in operon_formats:
+        operons.to_csv(f"{output_prefix_operons}.tsv", sep="\t", index=False)
+
+    if "bed" in operon_formats:
+        bed = pd.DataFrame(
+            data={
+                "contig": operons["contig"],
+                "start": operons["start"] - 1,
+                "end": operons["end"],
+                "name": operons["operon_number"],
+                "score": operons["mean_string_score"]
+                .fillna(0)
+                .clip(0, 1000)
+                .round()
+                .astype(np.int64),
+                "strand": operons["strand"],
+            }
+        )
+        bed.to_csv(f"{output_prefix_operons}.bed", sep="\t", header=False, index=False)
+
+    if "jsonl" in operon_formats:
+        with open(f"{output_prefix_operons}.jsonl", "w") as out_file:
+            for operon in operons.itertuples(index=False):
+                record = {
+                    "operon_number": operon.operon_number,
+                    "contig": operon.contig,
+                    "start": int(operon.start),
+                    "end": int(operon.end),
+                    "strand": operon.strand,
+                    "locus_tags": operon.locus_tags.split(","),
+                    "mean_string_score": (
+                        None
+                        if np.isnan(operon.mean_string_score)
+                        else float(operon.mean_string_score)
+                    ),
+                    "shared_pathways": [
+                        pathway
+                        for pathway in operon.shared_pathways.split(",")
+                        if pathway
+                    ],
+                    "prediction_status": operon.prediction_status,
+                }
+                out_file.write(json.dumps(record) + "\n")
+
+
 def result_to_gff(path_gff: str, path_tsv: str, output_filename: str) -> None:
     """
     Adds additional qualifier with operon prediction to .gff3 file annotated by bakta.
@@ -74,50 +370,115 @@ def result_to_gff(path_gff: str, path_tsv: str, output_filename: str) -> None:
     :param path_tsv: path to file with operon prediction results
     :param output_filename: output filename
     """
-    df_tsv = pd.read_csv(path_tsv, sep="\t")
+    import pandas as pd
+
+    df_tsv = pd.read_csv(path_tsv, sep="\t", usecols=["locus_name", "operon_number"])
+    annotate_gff(
+        path_gff, dict(zip(df_tsv.locus_name, df_tsv.operon_number)), output_filename
+    )
+
+
+def annotate_gff(path_gff: str, operons: Dict[str, str], output_filename: str) -> None:
+    """
+    Writes .gff3 file with operon_info qualifier added to CDS features.
+    The file is rewritten line by line: headers, sequence regions and the ##FASTA section
+    are kept untouched.
+
+    :param path_gff: path to file with annotation
+    :param operons: operon label for each locus tag
+    :param output_filename: output filename
+    """
+    with open(path_gff, "r") as in_file, open(output_filename, "w") as out_file:
+        for line in in_file:
+            if line.startswith("##FASTA"):
+                out_file.write(line)
+                out_file.writelines(in_file)
+                break
 
-    rows_to_keep = list(range(8, df_tsv.shape[0]+9))  #FIXME borders (left=comment, right=comment_length + 1 region)
-    df_gff = pd.read_csv(path_gff, sep="\t", header=None, skiprows=lambda x: x not in rows_to_keep)
+            columns = line.rstrip("\n").split("\t")
+            if line.startswith("#") or len(columns) != 9 or columns[2] != "CDS":
+                out_file.write(line)
+                continue
 
-    for i in range(df_gff.shape[0]):
-        if df_gff.iloc[i][2] == "CDS":
-            locus_tag = df_gff.iloc[i][8].split(";")[0][3:]
-            operon_info = df_tsv.query("locus_name == @locus_tag").operon_number.iloc[0]
-            df_gff.iloc[i, 8] = f"{df_gff.iloc[i][8]};operon_info={operon_info}"
+            qualifiers = dict(
+                qualifier.split("=", 1)
+                for qualifier in columns[8].split(";")
+                if "=" in qualifier
+            )
+            locus_tag = qualifiers.get("locus_tag", qualifiers.get("ID"))
+            if locus_tag not in operons:
+                out_file.write(line)
+                continue
 
-    df_gff.to_csv(output_filename, sep="\t", header=False, index=False)
+            columns[8] = f"{columns[8]};operon_info={operons[locus_tag]}"
+            out_file.write("\t".join(columns) + "\n")
 
 
 def parse_args():
     parser = argparse.ArgumentParser(
-        usage="main.py --genome GENOME.FNA --taxid TAXON_ID",
+        usage="main.py --genome GENOME.FNA --taxid TAXON_ID [--intermediate-format tsv|arrow] [--operon-formats tsv bed jsonl] [--provisional]",
         description="""Starts operon prediction pipeline.""",
     )
     parser.add_argument("--genome", nargs="?", help="genome.fna")
     parser.add_argument("--taxid", nargs="?", help="ncbi taxon id")
+    parser.add_argument(
+        "--intermediate-format",
+        choices=["tsv", "arrow"],
+        default="tsv",
+        help="format of intermediate tables",
+    )
+    parser.add_argument(
+        "--operon-formats",
+        nargs="*",
+        choices=["tsv", "bed", "jsonl"],
+        default=["tsv", "bed", "jsonl"],
+        help="formats of the table of operons",
+    )
+    parser.add_argument(
+        "--provisional",
+        action="store_true",
+        help="publish predictions made without KEGG annotation (before kofam_scan finishes)",
+    )
 
     return parser.parse_args()
 
 
 if __name__ == "__main__":
-    genome = parse_args().genome
-    taxon_id = parse_args().taxid
+    args = parse_args()
+    genome = args.genome
+    taxon_id = args.taxid
+    intermediate_format = args.intermediate_format
+    operon_formats = args.operon_formats
+    prediction_status = "provisional" if args.provisional else "final"
 
-    predictions = pd.read_csv(
-        f"results/{taxon_id}/predictions/temp_dir/{taxon_id}_{genome}_predictions.tsv",
-        sep="\t",
+    # Provisional predictions are made without KEGG annotation (see predict_operon.py)
+    suffix = "_provisional" if args.provisional else ""
+    predictions = read_table(
+        f"results/{taxon_id}/predictions/temp_dir/{taxon_id}_{genome}_predictions{suffix}.{intermediate_format}",
+        "predictions",
+    )
+    final_table, operons = format_output(
+        genome, taxon_id, predictions, intermediate_format, args.provisional
     )
-    final_table = format_output(genome, taxon_id, predictions)
 
+    # Provisional tables have their own names, the final ones are never overwritten
     raw_filename_gff = f"results/{taxon_id}/bakta/{genome}.gff3"
-    output_filename_tsv = f"results/{taxon_id}/predictions/{genome}_predictions.tsv"
-    output_filename_gff = f"results/{taxon_id}/predictions/{genome}_predictions.gff3"
+    output_filename_tsv = f"results/{taxon_id}/predictions/{genome}_predictions{suffix}.tsv"
+    output_filename_gff = f"results/{taxon_id}/predictions/{genome}_predictions{suffix}.gff3"
+    output_prefix_operons = f"results/{taxon_id}/predictions/{genome}_operons{suffix}"
 
-    final_table.to_csv(
+    write_predictions(
+        final_table,
+        operons,
         output_filename_tsv,
-        sep="\t",
+        output_prefix_operons,
+        operon_formats,
+        prediction_status,
+    )
+    annotate_gff(
+        raw_filename_gff,
+        dict(zip(final_table.locus_name, final_table.operon_number)),
+        output_filename_gff,
     )
-
-    result_to_gff(raw_filename_gff, output_filename_tsv, output_filename_gff)
 
     print(f"Job is done! Prediction results are in the folder results/{taxon_id}/predictions/")
@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+import argparse
+import os
+import pickle
+from functools import lru_cache
+from typing import TYPE_CHECKING, List, NamedTuple
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+# Codes of LightGBM missing value handling in tree nodes
+MISSING_TYPES = {"None": 0, "Zero": 1, "NaN": 2}
+ZERO_THRESHOLD = 1e-35
+# Maximum number of cells in the table of precomputed scores
+MAX_TABLE_SIZE = 1 << 24
+
+
+class CompiledModel(NamedTuple):
+    columns: np.ndarray  # input columns in the order of the model features
+    scaler_mean: np.ndarray
+    scaler_scale: np.ndarray
+    classes: np.ndarray
+    tree_roots: np.ndarray  # root node of each tree
+    split_feature: np.ndarray
+    threshold: np.ndarray
+    missing_type: np.ndarray
+    default_left: np.ndarray
+    left_child: np.ndarray  # leaves point to themselves
+    right_child: np.ndarray  # leaves point to themselves
+    node_value: np.ndarray  # leaf value (0 for split nodes)
+    output: np.ndarray  # [average_output, sigmoid, max_depth]
+    score_table: np.ndarray  # sum of leaf values for each combination of feature bins
+
+
+def export_model(model_file: str, output_dir: str) -> None:
+    """
+    Compiles pickled pipeline (ColumnTransformer with StandardScaler + LightGBM classifier)
+    into flat arrays which can be memory-mapped and used without sklearn.
+
+    :param model_file: path to model.pkl
+    :param output_dir: directory for the compiled model files
+    """
+    import numpy as np
+
+    with open(model_file, "rb") as f:
+        model = pickle.load(f)
+
+    column_transformer, classifier = model.steps[0][1], model.steps[-1][1]
+    transformers = [
+        transformer
+        for transformer in column_transformer.transformers_
+        if transformer[0] != "remainder"
+    ]
+    if len(model.steps) != 2 or len(transformers) != 1:
+        raise ValueError(
+            "Only ColumnTransformer(StandardScaler) + LightGBM is supported"
+        )
+    _, scaler, columns = transformers[0]
+
+    booster = classifier.booster_.dump_model()
+    objective = booster["objective"].split()
+    if objective[0] != "binary" or booster["num_tree_per_iteration"] != 1:
+        raise ValueError("Only binary LightGBM classifiers are supported")
+    sigmoid = float(objective[1].split(":")[1]) if len(objective) > 1 else 1.0
+
+    nodes = {name: [] for name in CompiledModel._fields[5:12]}
+    tree_roots = []
+    max_depth = 0
+
+    def add_node(node: dict, depth: int) -> int:
+        nonlocal max_depth
+        index = len(nodes["split_feature"])
+        is_leaf = "leaf_index" in node
+        nodes["split_feature"].append(0 if is_leaf else node["split_feature"])
+        nodes["threshold"].append(0.0 if is_leaf else node["threshold"])
+        nodes["missing_type"].append(
+            0 if is_leaf else MISSING_TYPES[node["missing_type"]]
+        )
+        nodes["default_left"].append(False if is_leaf else node["default_left"])
+        nodes["left_child"].append(index)
+        nodes["right_child"].append(index)
+        nodes["node_value"].append(node["leaf_value"] if is_leaf else 0.0)
+
+        if is_leaf:
+            max_depth = max(max_depth, depth)
+        else:
+            nodes["left_child"][index] = add_node(node["left_child"], depth + 1)
+            nodes["right_child"][index] = add_node(node["right_child"], depth + 1)
+        return index
+
+    for tree in booster["tree_info"]:
+        tree_roots.append(add_node(tree["tree_structure"], 0))
+
+    arrays = {
+        "columns": np.array(columns, dtype=str),
+        "scaler_mean": np.asarray(scaler.mean_, dtype=np.float64),
+        "scaler_scale": np.asarray(scaler.scale_, dtype=np.float64),
+        "classes": np.asarray(classifier.classes_),
+        "tree_roots": np.array(tree_roots, dtype=np.int32),
+        "split_feature": np.array(nodes["split_feature"], dtype=np.int32),
+        "threshold": np.array(nodes["threshold"], dtype=np.float64),
+        "missing_type": np.array(nodes["missing_type"], dtype=np.int8),
+        "default_left": np.array(nodes["default_left"], dtype=bool),
+        "left_child": np.array(nodes["left_child"], dtype=np.int32),
+        "right_child": np.array(nodes["right_child"], dtype=np.int32),
+        "node_value": np.array(nodes["node_value"], dtype=np.float64),
+        "output": np.array(
+            [booster["average_output"], sigmoid, max_depth], dtype=np.float64
+        ),
+    }
+
+    arrays["score_table"] = build_score_table(CompiledModel(**arrays, score_table=None))
+
+    os.makedirs(output_dir, exist_ok=True)
+    for name, values in arrays.items():
+        np.save(f"{output_dir}/{name}.npy", values)
+
+
+@lru_cache(maxsize=None)
+def load_compiled_model(path_compiled_model: str) -> CompiledModel:
+    """
+    Memory-maps model compiled by export_model, once per process.
+
+    :param path_compiled_model: directory with the compiled model files
+    :return: compiled model
+    """
+    import numpy as np
+
+    return CompiledModel(
+        *[
+            np.load(f"{path_compiled_model}/{name}.npy", mmap_mode="r")
+            for name in CompiledModel._fields
+        ]
+    )
+
+
+def get_bin_thresholds(model: CompiledModel) -> List[np.ndarray]:
+    """
+    Collects sorted unique split thresholds of each feature.
+
+    :param model: compiled model
+    :return: thresholds for each feature
+    """
+    import numpy as np
+
+    is_split = model.left_child != np.arange(len(model.left_child))
+    return [
+        np.unique(model.threshold[is_split & (model.split_feature == feature)])
+        for feature in range(len(model.columns))
+    ]
+
+
+def bin_features(model: CompiledModel, features: np.ndarray) -> np.ndarray:
+    """
+    Replaces feature values with the numbers of split thresholds below them.
+    Rows with equal bins go the same way in every tree.
+
+    :param model: compiled model
+    :param features: scaled features without missing values
+    :return: bins of features
+    """
+    import numpy as np
+
+    bins = np.empty(features.shape, dtype=np.int64)
+    for feature, thresholds in enumerate(get_bin_thresholds(model)):
+        bins[:, feature] = np.searchsorted(thresholds, features[:, feature])
+    return bins
+
+
+def build_score_table(model: CompiledModel) -> np.ndarray:
+    """
+    Precomputes sum of leaf values for each combination of feature bins.
+    Each leaf covers a box of bins, leaf values are added tree by tree as LightGBM does.
+
+    :param model: compiled model without score table
+    :return: table of scores (empty if the model has missing value handling or too many bins)
+    """
+    import numpy as np
+
+    bin_thresholds = get_bin_thresholds(model)
+    shape = tuple(len(thresholds) + 1 for thresholds in bin_thresholds)
+    if np.any(model.missing_type != 0) or np.prod(shape) > MAX_TABLE_SIZE:
+        return np.empty(0)
+
+    split_bin = np.zeros(len(model.threshold), dtype=np.int64)
+    for feature, thresholds in enumerate(bin_thresholds):
+        is_feature = model.split_feature == feature
+        split_bin[is_feature] = np.searchsorted(thresholds, model.threshold[is_feature])
+
+    score_table = np.zeros(shape)
+
+    def add_leaves(node: int, box: List[slice]) -> None:
+        left, right = model.left_child[node], model.right_child[node]
+        if left == node:
+            score_table[tuple(box)] += model.node_value[node]
+            return
+        feature, bin_border = model.split_feature[node], split_bin[node] + 1
+        bins = box[feature]
+        add_leaves(
+            left, box[:feature] + [slice(bins.start, bin_border)] + box[feature + 1 :]
+        )
+        add_leaves(
+            right, box[:feature] + [slice(bin_border, bins.stop)] + box[feature + 1 :]
+        )
+
+    for root in model.tree_roots:
+        add_leaves(root, [slice(0, size) for size in shape])
+
+    return score_table
+
+
+def traverse_trees(
+    model: CompiledModel, features: np.ndarray, chunk_size: int = 2000
+) -> np.ndarray:
+    """
+    Finds leaves of all trees for each row and sums their values.
+
+    :param model: compiled model
+    :param features: scaled features
+    :param chunk_size: number of rows processed at once
+    :return: sum of leaf values for each row
+    """
+    import numpy as np
+
+    check_missing = bool(np.any(model.missing_type != 0))
+    if not check_missing:
+        # Without special missing value handling LightGBM treats NaN as zero
+        features = np.nan_to_num(features, nan=0.0)
+    children = np.stack([model.left_child, model.right_child], axis=1).ravel()
+    split_feature = np.asarray(model.split_feature)
+    threshold = np.asarray(model.threshold)
+
+    raw_score = np.zeros(features.shape[0])
+    for start in range(0, features.shape[0], chunk_size):
+        chunk = features[start : start + chunk_size]
+        offsets = np.arange(chunk.shape[0]) * chunk.shape[1]
+
+        # All trees are traversed at once, one tree level per iteration, leaves loop on themselves
+        node = np.repeat(model.tree_roots[:, None], chunk.shape[0], axis=1)
+        for _ in range(int(model.output[2])):
+            values = chunk.ravel()[offsets + split_feature[node]]
+            go_right = values > threshold[node]
+            if check_missing:
+                missing_type = model.missing_type[node]
+                go_right = np.where(
+                    np.isnan(values) & (missing_type == 0),
+                    0.0 > threshold[node],
+                    go_right,
+                )
+                is_missing = (
+                    (missing_type == 1)
+                    & (np.abs(np.nan_to_num(values)) <= ZERO_THRESHOLD)
+                ) | ((missing_type == 2) & np.isnan(values))
+                go_right = np.where(is_missing, ~model.default_left[node], go_right)
+            node = children[2 * node + go_right]
+
+        # Reduction over the first axis adds trees one by one as LightGBM does
+        raw_score[start : start + chunk_size] = model.node_value[node].sum(axis=0)
+
+    return raw_score
+
+
+def predict_proba(model: CompiledModel, data_for_predict: pd.DataFrame) -> np.ndarray:
+    """
+    Calculates class probabilities as predict_proba of the pickled pipeline does.
+
+    :param model: compiled model
+    :param data_for_predict: table with data required for prediction
+    :return: array with probabilities of each class
+    """
+    import numpy as np
+
+    features = data_for_predict[list(model.columns)].to_numpy(dtype=np.float64)
+    features = (features - model.scaler_mean) / model.scaler_scale
+
+    if model.score_table.size:
+        bins = bin_features(model, np.nan_to_num(features, nan=0.0))
+        raw_score = model.score_table[tuple(bins.T)]
+    else:
+        raw_score = traverse_trees(model, features)
+
+    average_output, sigmoid = model.output[:2]
+    if average_output:
+        raw_score /= len(model.tree_roots)
+    probability = 1.0 / (1.0 + np.exp(-sigmoid * raw_score))
+
+    return np.vstack([1.0 - probability, probability]).T
+
+
+def predict(model: CompiledModel, data_for_predict: pd.DataFrame) -> np.ndarray:
+    """
+    Makes predictions as predict of the pickled pipeline does.
+
+    :param model: compiled model
+    :param data_for_predict: table with data required for prediction
+    :return: predicted class for each row
+    """
+    import numpy as np
+
+    return model.classes[np.argmax(predict_proba(model, data_for_predict), axis=1)]
+
+
+def predict_batch(
+    model: CompiledModel, tables_for_predict: List[pd.DataFrame]
+) -> List[np.ndarray]:
+    """
+    Makes predictions for many genomes at once.
+
+    :param model: compiled model
+    :param tables_for_predict: tables with data required for prediction, one per genome
+    :return: predicted classes for each genome
+    """
+    import numpy as np
+    import pandas as pd
+
+    predictions = predict(model, pd.concat(tables_for_predict, ignore_index=True))
+    borders = np.cumsum([table.shape[0] for table in tables_for_predict])[:-1]
+    return np.split(predictions, borders)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        usage="compiled_model.py --model MODEL.PKL --output COMPILED_MODEL",
+        description="""Compiles trained model into arrays for prediction without sklearn.""",
+    )
+    parser.add_argument("--model", nargs="?", help="model for predictions.pkl")
+    parser.add_argument("-o", "--output", nargs="?", help="compiled model directory")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    export_model(args.model, args.output)
+
+    print("Model compiled successfully")
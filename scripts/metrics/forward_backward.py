@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+from functools import reduce
+from typing import TYPE_CHECKING, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+def logsumexp(values: np.ndarray, axis: int) -> np.ndarray:
+    """
+    Calculates log(sum(exp(values))) along a short axis (hidden states).
+
+    :param values: array with log probabilities
+    :param axis: axis to sum over
+    :return: array without the summed axis
+    """
+    import numpy as np
+
+    return reduce(
+        np.logaddexp, [values.take(i, axis=axis) for i in range(values.shape[axis])]
+    )
+
+
+def pack_sequences(lengths: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Orders observations of many sequences by position: first elements of all sequences,
+    then second elements and so on. Sequences are sorted by length in descending order,
+    so the sequences which are still running at any position form a prefix.
+
+    :param lengths: lengths of the sequences concatenated one after another
+    :return: indexes of observations in packed order, number of running sequences at each position
+    """
+    import numpy as np
+
+    order = np.argsort(-lengths, kind="stable")
+    starts = (np.cumsum(lengths) - lengths)[order]
+    sorted_lengths = lengths[order]
+
+    batch_sizes = np.searchsorted(
+        -sorted_lengths, -np.arange(sorted_lengths[0]), side="left"
+    )
+    packed_index = np.concatenate(
+        [
+            starts[:batch_size] + position
+            for position, batch_size in enumerate(batch_sizes)
+        ]
+    )
+    return packed_index, batch_sizes
+
+
+def forward_backward(
+    observations: np.ndarray,
+    lengths: np.ndarray,
+    startprob: np.ndarray,
+    transmat: np.ndarray,
+    emissionprob: np.ndarray,
+) -> np.ndarray:
+    """
+    Calculates posterior probabilities of hidden states of a categorical HMM
+    as predict_proba of hmmlearn does. Forward and backward passes go in log space
+    one position at a time for all sequences together.
+
+    :param observations: observed categories of all sequences concatenated
+    :param lengths: lengths of the sequences
+    :param startprob: start probabilities of the hidden states
+    :param transmat: transition matrix
+    :param emissionprob: emission matrix (hidden states x categories)
+    :return: posterior probabilities (observations x hidden states)
+    """
+    import numpy as np
+
+    observations = np.asarray(observations, dtype=np.int64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    if observations.size == 0:
+        return np.empty((0, len(startprob)))
+
+    with np.errstate(divide="ignore"):
+        log_startprob = np.log(startprob)
+        log_transmat = np.log(transmat)
+        log_emission = np.log(emissionprob).T
+
+    packed_index, batch_sizes = pack_sequences(lengths[lengths > 0])
+    offsets = np.concatenate([[0], np.cumsum(batch_sizes)])
+    frame_emission = log_emission[observations[packed_index]]
+
+    # Forward pass
+    log_alpha = np.empty_like(frame_emission)
+    log_alpha[: offsets[1]] = log_startprob + frame_emission[: offsets[1]]
+    for position in range(1, len(batch_sizes)):
+        start, end = offsets[position], offsets[position + 1]
+        previous = log_alpha[
+            offsets[position - 1] : offsets[position - 1] + end - start
+        ]
+        log_alpha[start:end] = frame_emission[start:end] + logsumexp(
+            previous[:, :, None] + log_transmat, axis=1
+        )
+
+    # Backward pass, the last element of each sequence has log_beta = 0
+    log_beta = np.zeros_like(frame_emission)
+    for position in range(len(batch_sizes) - 2, -1, -1):
+        start = offsets[position]
+        next_start, next_end = offsets[position + 1], offsets[position + 2]
+        following = frame_emission[next_start:next_end] + log_beta[next_start:next_end]
+        log_beta[start : start + next_end - next_start] = logsumexp(
+            log_transmat + following[:, None, :], axis=2
+        )
+
+    log_gamma = log_alpha + log_beta
+    log_gamma -= logsumexp(log_gamma, axis=1)[:, None]
+
+    posteriors = np.empty_like(log_gamma)
+    posteriors[packed_index] = np.exp(log_gamma)
+    return posteriors
@@ -1,29 +1,85 @@
+from __future__ import annotations
+
 import argparse
+import os
+import sys
+from typing import TYPE_CHECKING, Optional, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
 
-import numpy as np
-import pandas as pd
+from intermediate import read_table, write_table  # noqa: E402
+from string_links import load_string_links, read_string_links  # noqa: E402
 
 
-def get_score_from_df_subset(df_subset: pd.DataFrame, id: str) -> int:
+def get_pair_scores(
+    protein_links: pd.DataFrame, ids_first: np.ndarray, ids_second: np.ndarray
+) -> np.ndarray:
     """
-    Additional function for get_string_scores function to match
-    the id of the second protein in the data subset for the first protein.
+    Additional function for get_string_scores function to look up
+    combined scores for many protein pairs at once.
 
-    :param df_subset: subset of data from the protein_links table for a specific protein id
-    :param id: the second id for the protein that needs to be matched with the first one from df_subset
-    :return: combined_score
+    :param protein_links: table with protein combined scores
+    :param ids_first: STRING ids of the first proteins in pairs
+    :param ids_second: STRING ids of the second proteins in pairs
+    :return: combined_score for each pair (NaN if the pair is absent)
     """
-    try:
-        score = df_subset.query("protein2 == @id").combined_score.iloc[0]
-    except IndexError:
-        score = np.nan
-    return score
+    import numpy as np
+    import pandas as pd
+
+    # Only the first occurrence of the pair is used, as in a row-by-row search
+    links_subset = protein_links.loc[
+        protein_links.protein1.isin(ids_first),
+        ["protein1", "protein2", "combined_score"],
+    ].drop_duplicates(subset=["protein1", "protein2"])
+
+    links_index = pd.MultiIndex.from_frame(links_subset[["protein1", "protein2"]])
+    positions = links_index.get_indexer(
+        pd.MultiIndex.from_arrays([ids_first, ids_second])
+    )
+
+    scores = np.full(len(positions), np.nan)
+    found = positions != -1
+    scores[found] = links_subset.combined_score.to_numpy()[positions[found]]
+    return scores
+
+
+def get_neighbours(
+    gene_contigs: np.ndarray, circular: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the previous and the next gene of each gene on the same contig.
+    The first and the last genes of a circular contig are neighbours.
+
+    :param gene_contigs: contig of each gene, genes of a contig must go in a row
+    :param circular: True for genes of circular contigs
+    :return: positions of the previous and the next genes (-1 if there is no neighbour)
+    """
+    import numpy as np
+
+    positions = np.arange(len(gene_contigs))
+    first = np.r_[True, gene_contigs[1:] != gene_contigs[:-1]][: len(positions)]
+    last = np.r_[gene_contigs[1:] != gene_contigs[:-1], True][: len(positions)]
+    contig_first = np.maximum.accumulate(np.where(first, positions, 0))
+    contig_last = np.minimum.accumulate(
+        np.where(last, positions, len(positions))[::-1]
+    )[::-1]
+
+    # A single gene of a circular contig is not its own neighbour
+    wraps = circular & (contig_first != contig_last)
+    prev_positions = np.where(first, np.where(wraps, contig_last, -1), positions - 1)
+    next_positions = np.where(last, np.where(wraps, contig_first, -1), positions + 1)
+    return prev_positions, next_positions
 
 
 def get_string_scores(
     parsed_gff: pd.DataFrame,
     diamond_result_filtered: pd.DataFrame,
     protein_links: pd.DataFrame,
+    contigs: Optional[pd.DataFrame] = None,
 ) -> pd.DataFrame:
     """
     Creates table with combined STRING scores for previous, current and next proteins.
@@ -31,66 +87,63 @@ def get_string_scores(
     :param parsed_gff: parsed gff3 annotation
     :param diamond_result_filtered: unique values from Diamond alignment
     :param protein_links: table with protein combined scores
+    :param contigs: table with topology of contigs (see parse_contigs), if None,
+    all genes form one ring in the order of the table
     :return: table with scores for each gene
     """
-    # for now contigs must be in the correct order)
-    final_scores = []
-    next_scores = []
-    prev_scores = []
-
-    df_length = parsed_gff.shape[0]
-
-    for n_id in range(df_length):
-        id_cur = parsed_gff.locus_name.iloc[n_id]
-        try:
-            id_cur_string = diamond_result_filtered.query(
-                "query_accession == @id_cur"
-            ).target_accession.iloc[0]
-        except IndexError:
-            final_scores.append(500)  # mean threshold for prediction
-            next_scores.append(500)
-            prev_scores.append(500)
-            continue
-
-        df_subset = protein_links.query("protein1 == @id_cur_string")
-
-        id_prev = parsed_gff.locus_name.iloc[n_id - 1]
-        try:
-            id_prev_string = diamond_result_filtered.query(
-                "query_accession == @id_prev"
-            ).target_accession.iloc[0]
-        except IndexError:
-            score_prev = 500
-        else:
-            score_prev = get_score_from_df_subset(df_subset, id_prev_string)
+    import numpy as np
+    import pandas as pd
+
+    locus_to_string = (
+        diamond_result_filtered.drop_duplicates(subset="query_accession")
+        .set_index("query_accession")
+        .target_accession
+    )
+    ids_cur = parsed_gff.locus_name.map(locus_to_string).to_numpy(dtype=object)
 
+    if contigs is None:
+        # for now contigs must be in the correct order)
         # Take into account the ring structure of the bacterial chromosome
-        if n_id == parsed_gff.shape[0] - 1:
-            id_next = parsed_gff.locus_name.iloc[0]
-        else:
-            id_next = parsed_gff.locus_name.iloc[n_id + 1]
-
-        try:
-            id_next_string = diamond_result_filtered.query(
-                "query_accession == @id_next"
-            ).target_accession.iloc[0]
-        except IndexError:
-            score_next = 500
-        else:
-            score_next = get_score_from_df_subset(df_subset, id_next_string)
-
-        final_score = max(score_prev, score_next)
-        final_scores.append(final_score)
-        next_scores.append(score_next)
-        prev_scores.append(score_prev)
+        ids_prev = np.roll(ids_cur, 1)
+        ids_next = np.roll(ids_cur, -1)
+    else:
+        # Genes at the ends of linear contigs have no neighbours
+        gene_contigs = parsed_gff["contig"].to_numpy()
+        circular = (
+            contigs["circular"].reindex(gene_contigs).fillna(False).to_numpy(dtype=bool)
+        )
+        prev_positions, next_positions = get_neighbours(gene_contigs, circular)
+        ids_prev = np.where(prev_positions >= 0, ids_cur[prev_positions], None)
+        ids_next = np.where(next_positions >= 0, ids_cur[next_positions], None)
+
+    has_cur = pd.notna(ids_cur)
+    has_prev = has_cur & pd.notna(ids_prev)
+    has_next = has_cur & pd.notna(ids_next)
+
+    # 500 is the mean threshold for prediction
+    score_prev = np.full(len(ids_cur), 500.0)
+    score_next = np.full(len(ids_cur), 500.0)
+    score_prev[has_prev] = get_pair_scores(
+        protein_links, ids_cur[has_prev], ids_prev[has_prev]
+    )
+    score_next[has_next] = get_pair_scores(
+        protein_links, ids_cur[has_next], ids_next[has_next]
+    )
+
+    # Same as max(score_prev, score_next): a missing previous score wins
+    final_scores = np.where(score_next > score_prev, score_next, score_prev)
 
     scores = pd.DataFrame(
         data={
-            "prev_scores": prev_scores,
-            "next_scores": next_scores,
+            "prev_scores": score_prev,
+            "next_scores": score_next,
             "final_scores": final_scores,
         }
     )
+    # Columns without missing pairs keep the integer type of combined_score
+    for column in scores.columns:
+        if scores[column].notna().all():
+            scores[column] = scores[column].astype(int)
     scores = scores.fillna(500)
 
     return scores
@@ -105,33 +158,50 @@ def parse_args():
         --output STRING_SCORES.TSV",
         description="""Gets STRING scores for each protein in parsed gff file.""",
     )
-    parser.add_argument("--parsed-gff", nargs="?", help="parsed gff file.tsv")
+    parser.add_argument("--parsed-gff", nargs="?", help="parsed gff file.tsv or .arrow")
     parser.add_argument(
-        "--filtered-diamond-result", nargs="?", help="filtered diamond result.tsv"
+        "--filtered-diamond-result",
+        nargs="?",
+        help="filtered diamond result.tsv or .arrow",
     )
     parser.add_argument(
-        "--protein-links", nargs="?", help="protein links from STRING db.txt"
+        "--protein-links",
+        nargs="?",
+        help="protein links from STRING db.txt or their binary cache directory",
     )
     parser.add_argument(
-        "-o", "--output", nargs="?", help="result file with obtained STRING scores.tsv"
+        "-o",
+        "--output",
+        nargs="?",
+        help="result file with obtained STRING scores.tsv or .arrow",
     )
 
     return parser.parse_args()
 
 
 if __name__ == "__main__":
-    path_parsed_gff = parse_args().parsed_gff
-    path_filtered_diamond_result = parse_args().filtered_diamond_result
-    path_protein_links = parse_args().protein_links
-    output_filename = parse_args().output
-
-    parsed_gff = pd.read_csv(path_parsed_gff, sep="\t")
-    filtered_diamond_result = pd.read_csv(path_filtered_diamond_result, sep="\t")
-    protein_links = pd.read_csv(path_protein_links, sep=" ")
+    args = parse_args()
+    path_parsed_gff = args.parsed_gff
+    path_filtered_diamond_result = args.filtered_diamond_result
+    path_protein_links = args.protein_links
+    output_filename = args.output
+
+    parsed_gff = read_table(path_parsed_gff, "parsed_gff")
+    filtered_diamond_result = read_table(
+        path_filtered_diamond_result, "diamond_filtered"
+    )
+    if os.path.isdir(path_protein_links):
+        protein_links = load_string_links(
+            path_protein_links, filtered_diamond_result.target_accession
+        )
+    else:
+        protein_links = read_string_links(
+            path_protein_links, filtered_diamond_result.target_accession
+        )
 
     string_scores = get_string_scores(
         parsed_gff, filtered_diamond_result, protein_links
     )
 
-    string_scores.to_csv(output_filename, sep="\t")
+    write_table(string_scores, output_filename, "string_scores", parsed_gff.locus_name)
     print("STRING scores obtained")
@@ -1,41 +1,111 @@
+from __future__ import annotations
+
 import argparse
+import os
+import sys
+from functools import lru_cache
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
 
-import numpy as np
-import pandas as pd
-from hmmlearn import hmm
+from forward_backward import forward_backward  # noqa: E402
+from intermediate import read_table, write_table  # noqa: E402
 
+# Parameters of HMM with hidden states operon / not operon
+STARTPROB = [0.5, 0.5]
+TRANSMAT = [[0.72143634, 0.27856366], [0.19284369, 0.80715631]]
 
-def calculate_intergenic_dist(parsed_gff: pd.DataFrame) -> pd.DataFrame:
+
+def get_contig_intergenic_dist(
+    parsed_gff: pd.DataFrame, contigs: pd.DataFrame
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Counts the distance between genes within each contig. The first and the last genes
+    of a circular contig are neighbours through the origin, genes at the ends of
+    a linear contig get the distance to the contig end. Genes of contigs with unknown
+    length get 1 at the ends, as in calculate_intergenic_dist without contigs.
+
+    :param parsed_gff: parsed gff file, genes of a contig must go in a row
+    :param contigs: table indexed by contig with length and circular columns (see parse_contigs)
+    :return: distance to the next gene, distance to the previous gene
+    """
+    import numpy as np
+
+    gene_contigs = parsed_gff["contig"].to_numpy()
+    if len(gene_contigs) == 0:
+        return np.empty(0), np.empty(0)
+    starts = parsed_gff["start"].to_numpy(dtype=float)
+    ends = parsed_gff["end"].to_numpy(dtype=float)
+
+    first = np.flatnonzero(np.r_[True, gene_contigs[1:] != gene_contigs[:-1]])
+    last = np.r_[first[1:] - 1, len(gene_contigs) - 1].astype(np.int64)
+    contig_info = contigs.reindex(gene_contigs[first])
+    lengths = contig_info["length"].to_numpy(dtype=float)
+    circular = contig_info["circular"].fillna(False).to_numpy(dtype=bool)
+
+    # A gene ending right before the next one has the distance 1
+    through_origin = starts[first] + lengths - ends[last]
+    edge_next = np.where(circular, through_origin, lengths + 1 - ends[last])
+    edge_prev = np.where(circular, through_origin, starts[first])
+
+    inter_dist_next = np.r_[starts[1:] - ends[:-1], np.nan]
+    inter_dist_next[last] = np.where(np.isnan(lengths), 1, edge_next)
+    inter_dist_prev = np.r_[np.nan, inter_dist_next[:-1]]
+    inter_dist_prev[first] = np.where(np.isnan(lengths), 1, edge_prev)
+
+    # Long distances at the ends of contigs fall into the last category
+    return np.minimum(inter_dist_next, 30000), inter_dist_prev
+
+
+def calculate_intergenic_dist(
+    parsed_gff: pd.DataFrame, contigs: Optional[pd.DataFrame] = None
+) -> pd.DataFrame:
     """
     Counts the distance between genes.
 
     :param parsed_gff: parsed gff file
+    :param contigs: table with length and topology of contigs (see parse_contigs),
+    if None, genes at the ends of contigs get 1 as the distance to the neighbour
     :return: table with additional columns (intergenic_distance_next - the distance to the next gene,
-    intergenic_distance_prev - the distance to the previous gene)
+    intergenic_distance_prev - the distance to the previous gene, contig)
     """
+    import numpy as np
+    import pandas as pd
+
     df_inter_dist = pd.DataFrame(
-        columns=["intergenic_distance_next", "intergenic_distance_prev"]
+        columns=["intergenic_distance_next", "intergenic_distance_prev"],
+        index=parsed_gff.index,
     )
 
-    # Add columns with intergenic distance
-    df_inter_dist["intergenic_distance_next"] = (
-        parsed_gff.start - parsed_gff.end.shift(1)
-    ).shift(-1)
-    df_inter_dist["intergenic_distance_prev"] = df_inter_dist[
-        "intergenic_distance_next"
-    ].shift(1)
-
-    # Find gene indexes at the beginning and end of the contigs
-    ind_start_contig = parsed_gff.loc[
-        parsed_gff["contig"] != parsed_gff["contig"].shift(1)
-    ].index
-    ind_end_contig = parsed_gff.loc[
-        parsed_gff["contig"] != parsed_gff["contig"].shift(-1)
-    ].index
-
-    # FIXME
-    df_inter_dist.loc[ind_start_contig, "intergenic_distance_prev"] = 1
-    df_inter_dist.loc[ind_end_contig, "intergenic_distance_next"] = 1
+    if contigs is not None:
+        (
+            df_inter_dist["intergenic_distance_next"],
+            df_inter_dist["intergenic_distance_prev"],
+        ) = get_contig_intergenic_dist(parsed_gff, contigs)
+    else:
+        # Add columns with intergenic distance
+        df_inter_dist["intergenic_distance_next"] = (
+            parsed_gff.start - parsed_gff.end.shift(1)
+        ).shift(-1)
+        df_inter_dist["intergenic_distance_prev"] = df_inter_dist[
+            "intergenic_distance_next"
+        ].shift(1)
+
+        # Find gene indexes at the beginning and end of the contigs
+        ind_start_contig = parsed_gff.loc[
+            parsed_gff["contig"] != parsed_gff["contig"].shift(1)
+        ].index
+        ind_end_contig = parsed_gff.loc[
+            parsed_gff["contig"] != parsed_gff["contig"].shift(-1)
+        ].index
+
+        # FIXME
+        df_inter_dist.loc[ind_start_contig, "intergenic_distance_prev"] = 1
+        df_inter_dist.loc[ind_end_contig, "intergenic_distance_next"] = 1
 
     # FIXME
     # Replace the negative distance
@@ -51,34 +121,79 @@ def calculate_intergenic_dist(parsed_gff: pd.DataFrame) -> pd.DataFrame:
         [i for i in range(-1, 800, 15)] + [30000],
         labels=[i for i in range(54)],
     )
+    df_inter_dist["contig"] = parsed_gff["contig"].to_numpy()
 
     return df_inter_dist
 
 
+@lru_cache(maxsize=None)
+def load_emission_matrix(path_matrix_emission: str) -> np.ndarray:
+    """
+    Loads emission matrix of the HMM, repeated calls return the same array.
+
+    :param path_matrix_emission: path to emission matrix.npy
+    :return: emission matrix (hidden states x categories of distance)
+    """
+    import numpy as np
+
+    return np.load(path_matrix_emission)
+
+
+def get_contig_lengths(df_inter_dist: pd.DataFrame) -> np.ndarray:
+    """
+    Counts genes in each contig, genes of a contig must go in a row.
+
+    :param df_inter_dist: table with intergenic distances
+    :return: number of genes in each contig in order of appearance
+    """
+    import numpy as np
+
+    if "contig" not in df_inter_dist:
+        return np.array([df_inter_dist.shape[0]])
+    contigs = df_inter_dist["contig"].to_numpy()
+    contig_starts = np.flatnonzero(np.r_[True, contigs[1:] != contigs[:-1]])
+    return np.diff(np.r_[contig_starts, len(contigs)])
+
+
+def predict_operon_inter_dist_batch(
+    inter_dist_tables: List[pd.DataFrame], path_matrix_emission: str
+) -> List[pd.Series]:
+    """
+    Calculates the operon score for genes of many genomes at once.
+    Each contig is an independent sequence of observations.
+
+    :param inter_dist_tables: tables with intergenic distances, one per genome
+    :param path_matrix_emission: path to emission matrix.npy
+    :return: operonic predictions for each gene of each genome
+    """
+    import numpy as np
+    import pandas as pd
+
+    emissionprob = load_emission_matrix(path_matrix_emission)
+
+    observations = np.concatenate(
+        [np.asarray(table.cat_dist, dtype=np.int64) for table in inter_dist_tables]
+    )
+    lengths = np.concatenate([get_contig_lengths(table) for table in inter_dist_tables])
+    hid_states = forward_backward(
+        observations, lengths, STARTPROB, TRANSMAT, emissionprob
+    )[:, 0]
+
+    borders = np.cumsum([table.shape[0] for table in inter_dist_tables])[:-1]
+    return [pd.Series(genome_states) for genome_states in np.split(hid_states, borders)]
+
+
 def predict_operon_inter_dist(
     df_inter_dist: pd.DataFrame, path_matrix_emission: str
 ) -> pd.Series:
     """
     Calculates the оperon score for genes based on the intergenic distance.
 
-    :param df_inter_dist: pd.DataFrame
+    :param df_inter_dist: table with intergenic distances
+    :param path_matrix_emission: path to emission matrix.npy
     :return: operonic predictions for each gene
     """
-
-    # Predict operon
-    model = hmm.CategoricalHMM(
-        n_components=2, algorithm="map"
-    )  # build model (lib hmm learn), forward-backward
-    model.startprob_ = np.array([0.5, 0.5])  # initialize start probability
-    model.transmat_ = np.array(
-        [[0.72143634, 0.27856366], [0.19284369, 0.80715631]]
-    )  # initialize transition matrix
-    model.emissionprob_ = np.load(path_matrix_emission)  # initialize emission matrix
-
-    obs_states = np.array(df_inter_dist.cat_dist.values).reshape(-1, 1)
-    hid_states = pd.Series(model.predict_proba(obs_states)[:, 0])
-
-    return hid_states
+    return predict_operon_inter_dist_batch([df_inter_dist], path_matrix_emission)[0]
 
 
 def parse_args():
@@ -86,26 +201,32 @@ def parse_args():
         usage="intergenic_distances.py --input PARSED_GFF.TSV --emission-matrix PATH_TO_MATRIX.NPY --output RESULT.TSV",
         description="""Gets hidden states based on intergenic distance for HMM.""",
     )
-    parser.add_argument("-i", "--input", nargs="?", help="parsed gff file.tsv")
+    parser.add_argument(
+        "-i", "--input", nargs="?", help="parsed gff file.tsv or .arrow"
+    )
     parser.add_argument(
         "--emission-matrix", nargs="?", help="path to emission matrix.npy"
     )
     parser.add_argument(
-        "-o", "--output", nargs="?", help="path to intergenic distances result file.tsv"
+        "-o",
+        "--output",
+        nargs="?",
+        help="path to intergenic distances result file.tsv or .arrow",
     )
 
     return parser.parse_args()
 
 
 if __name__ == "__main__":
-    path_parsed_gff = parse_args().input
-    path_to_emission_matrix = parse_args().emission_matrix
-    output_filename = parse_args().output
+    args = parse_args()
+    path_parsed_gff = args.input
+    path_to_emission_matrix = args.emission_matrix
+    output_filename = args.output
 
-    parsed_gff = pd.read_csv(path_parsed_gff, sep="\t")
+    parsed_gff = read_table(path_parsed_gff, "parsed_gff")
     df_inter_dist = calculate_intergenic_dist(parsed_gff)
     result = predict_operon_inter_dist(df_inter_dist, path_to_emission_matrix)
 
-    result.to_csv(output_filename, sep="\t")
+    write_table(result, output_filename, "inter_dist", parsed_gff.locus_name)
 
     print("Intergenic analysis completed")
@@ -1,134 +1,186 @@
-import argparse
-import json
-from typing import Tuple, Dict, List
-
-import pandas as pd
-
-
-def get_ko_map(
-    path_hmm_result: str, path_to_ko_map: str = "data/ko_map.json"
-) -> Tuple[Dict[str, List[str]], Dict[str, List[str]]]:
-    """
-    Gets information about KO and metabolic pathways for each protein_id.
-
-    :param path_to_ko_map: .json KO map file
-    :param path_hmm_result: path to hmm result file (after kofam scan)
-    :return: dict with KO for each protein_id, dict with metabolic pathways for each protein_id
-    """
-    with open(path_to_ko_map, "r", encoding="utf-8") as fh:
-        ko_map = json.load(fh)
-    dict_ko = {}
-    dict_map = {}
-    with open(path_hmm_result, "r") as file:
-        for line in file:
-            map = []
-            protein_id = line.strip().split("\t")[0]
-            kos = line.strip().split("\t")[1:]
-            if not kos:
-                map.extend([])
-            else:
-                for ko in kos:
-                    if not ko_map[ko]:
-                        map.extend([])
-                    map.extend(ko_map[ko])
-            dict_ko[protein_id] = kos
-            dict_map[protein_id] = list(set(map))
-    return dict_ko, dict_map
-
-
-def calc_intersection_map(
-    parsed_gff: pd.DataFrame,
-    path_hmm_result: str,
-    path_to_ko_desc: str = "data/ko_descriptions.json",
-) -> pd.DataFrame:
-    """
-    Counts the number of matches between metabolic pathways.
-
-    :param parsed_gff: parsed file.gff with annotation: the result of the parse_gff function
-    :param path_hmm_result: path to hmm result file (after kofam scan)
-    :param path_to_ko_desc: .json file with KO descriptions
-    :return: table with the number of intersections between metabolic pathways
-    """
-    dict_ko, dict_map = get_ko_map(path_hmm_result)
-    parsed_gff["ko"] = parsed_gff["locus_name"].map(dict_ko)
-    parsed_gff["map"] = parsed_gff["locus_name"].map(dict_map)
-
-    map_list = parsed_gff["map"].to_list()
-    map_list_sh1 = map_list[1:]
-    map_list_sh1.append([])
-    map_list_sh2 = map_list[:-1]
-    map_list_sh2.insert(0, [])
-
-    inter_map = []
-    for list1, list2 in zip(map_list, map_list_sh1):
-        try:
-            inter_map.append(len(set(list1).intersection(list2)))
-        except TypeError:
-            inter_map.append(0)
-    inter_map2 = []
-    for list1, list2 in zip(map_list, map_list_sh2):
-        try:
-            inter_map2.append(len(set(list1).intersection(list2)))
-        except TypeError:
-            inter_map2.append(0)
-
-    parsed_gff.loc[parsed_gff["map"].index, "intersection_map_count"] = [
-        max(itm) for itm in zip(inter_map, inter_map2)
-    ]
-
-    with open(path_to_ko_desc, "r", encoding="utf-8") as fh:
-        ko_desc = json.load(fh)
-
-    list_desc_ko = []
-    ko_description = []
-    for kos in parsed_gff["ko"]:
-        for ko in kos:
-            ko_description.append("".join(ko_desc[ko]))
-        list_desc_ko.append("; ".join(ko_description))
-        ko_description = []
-
-    kegg_annotation = pd.DataFrame(
-        data={
-            "kegg_orthology": [",".join(map(str, l)) for l in parsed_gff["ko"]],
-            "metabolic_pathway_kegg": [
-                ",".join(map(str, l)) for l in parsed_gff["map"]
-            ],
-            "description_kegg": list_desc_ko,
-            "intersection_map_count": parsed_gff.intersection_map_count,
-        }
-    )
-
-    kegg_annotation = kegg_annotation.fillna("")
-
-    return kegg_annotation
-
-
-def parse_args():
-    parser = argparse.ArgumentParser(
-        usage="kegg.py \
-        --input_gff PARSED_GFF.TSV \
-        --input_hmm PATH_TO_HMM_RESULT.TXT \
-        --output INTERSECTION_MAP_COUNT.TSV",
-        description="""Gets intersection of metabolic pathways for each protein.""",
-    )
-    parser.add_argument("-igff", "--input-gff", nargs="?", help="parsed gff file.tsv")
-    parser.add_argument(
-        "-ihmm", "--input-hmm", nargs="?", help="hmm results after kofam scan.tsv"
-    )
-    parser.add_argument("-o", "--output", nargs="?", help="path to hmm result file.txt")
-
-    return parser.parse_args()
-
-
-if __name__ == "__main__":
-    path_parsed_gff = parse_args().input_gff
-    path_hmm_result = parse_args().input_hmm
-    output_filename = parse_args().output
-
-    parsed_gff = pd.read_csv(path_parsed_gff, sep="\t")
-    result = calc_intersection_map(parsed_gff, path_hmm_result)
-    result = result.fillna(0)
-
-    result.to_csv(output_filename, sep="\t")
-
-    print("Kegg analysis completed")
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from intermediate import read_table, write_table  # noqa: E402
+from kegg_index import (  # noqa: E402
+    decode_pathways,
+    encode_kos,
+    get_ko_description,
+    load_kegg_index,
+    popcount,
+)
+
+
+def get_ko_map(
+    path_hmm_result: str, path_to_ko_index: str = "data/ko_index"
+) -> Tuple[Dict[str, List[str]], Dict[str, np.ndarray]]:
+    """
+    Gets information about KO and metabolic pathways for each protein_id.
+
+    :param path_to_ko_index: KEGG index directory (see kegg_index.py)
+    :param path_hmm_result: path to hmm result file (after kofam scan)
+    :return: dict with KO for each protein_id, dict with metabolic pathway bitset for each protein_id
+    """
+    import numpy as np
+
+    kegg_index = load_kegg_index(path_to_ko_index)
+    dict_ko = {}
+    with open(path_hmm_result, "r") as file:
+        for line in file:
+            protein_id = line.strip().split("\t")[0]
+            kos = line.strip().split("\t")[1:]
+            dict_ko[protein_id] = kos
+
+    # Pathway bitsets of all KOs of the protein are combined
+    ko_codes = encode_kos(kegg_index, [ko for kos in dict_ko.values() for ko in kos])
+    ko_bitsets = np.where(
+        (ko_codes >= 0)[:, None], kegg_index.ko_pathways[ko_codes], np.uint64(0)
+    )
+    protein_bitsets = np.zeros(
+        (len(dict_ko), kegg_index.ko_pathways.shape[1]), dtype=np.uint64
+    )
+    np.bitwise_or.at(
+        protein_bitsets,
+        np.repeat(np.arange(len(dict_ko)), [len(kos) for kos in dict_ko.values()]),
+        ko_bitsets,
+    )
+
+    dict_map = dict(zip(dict_ko, protein_bitsets))
+    return dict_ko, dict_map
+
+
+def count_common_pathways(
+    bitsets: np.ndarray, contigs: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Counts common metabolic pathways of each gene with the previous and the next genes.
+    Genes on different contigs have no common pathways.
+
+    :param bitsets: pathway bitset (uint64 words) for each gene
+    :param contigs: contig of each gene
+    :return: number of common pathways with the previous gene, with the next gene
+    """
+    import numpy as np
+
+    contigs = np.asarray(contigs)
+    common = popcount(bitsets[1:] & bitsets[:-1])
+    common[contigs[1:] != contigs[:-1]] = 0
+
+    common_prev = np.concatenate([[0], common])
+    common_next = np.concatenate([common, [0]])
+    return common_prev, common_next
+
+
+def calc_intersection_map(
+    parsed_gff: pd.DataFrame,
+    path_hmm_result: str,
+    path_to_ko_index: str = "data/ko_index",
+) -> pd.DataFrame:
+    """
+    Counts the number of matches between metabolic pathways.
+
+    :param parsed_gff: parsed file.gff with annotation: the result of the parse_gff function
+    :param path_hmm_result: path to hmm result file (after kofam scan)
+    :param path_to_ko_index: KEGG index directory (see kegg_index.py)
+    :return: table with the number of intersections between metabolic pathways
+    """
+    import numpy as np
+    import pandas as pd
+
+    kegg_index = load_kegg_index(path_to_ko_index)
+    dict_ko, dict_map = get_ko_map(path_hmm_result, path_to_ko_index)
+
+    # Genes absent in hmm result get the empty bitset from the last row
+    protein_bitsets = np.vstack(
+        [*dict_map.values(), np.zeros(kegg_index.ko_pathways.shape[1], np.uint64)]
+    )
+    gene_bitsets = protein_bitsets[
+        pd.Index(list(dict_map)).get_indexer(parsed_gff["locus_name"])
+    ]
+    common_prev, common_next = count_common_pathways(
+        gene_bitsets, parsed_gff["contig"].to_numpy()
+    )
+
+    gene_kos = parsed_gff["locus_name"].map(dict_ko)
+    kos = [ko for kos in gene_kos.dropna() for ko in kos]
+    ko_desc = {
+        ko: get_ko_description(kegg_index, ko_code) if ko_code >= 0 else ""
+        for ko, ko_code in zip(kos, encode_kos(kegg_index, kos))
+    }
+
+    kegg_annotation = pd.DataFrame(
+        data={
+            "kegg_orthology": [
+                ",".join(kos) if isinstance(kos, list) else kos for kos in gene_kos
+            ],
+            "metabolic_pathway_kegg": [
+                ",".join(decode_pathways(kegg_index, bitset)) for bitset in gene_bitsets
+            ],
+            "description_kegg": [
+                "; ".join(ko_desc[ko] for ko in kos) if isinstance(kos, list) else kos
+                for kos in gene_kos
+            ],
+            "intersection_map_count": np.maximum(common_prev, common_next).astype(
+                float
+            ),
+        },
+        index=parsed_gff.index,
+    )
+
+    kegg_annotation = kegg_annotation.fillna("")
+
+    return kegg_annotation
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        usage="kegg.py \
+        --input_gff PARSED_GFF.TSV \
+        --input_hmm PATH_TO_HMM_RESULT.TXT \
+        --ko-index KO_INDEX \
+        --output INTERSECTION_MAP_COUNT.TSV",
+        description="""Gets intersection of metabolic pathways for each protein.""",
+    )
+    parser.add_argument(
+        "-igff", "--input-gff", nargs="?", help="parsed gff file.tsv or .arrow"
+    )
+    parser.add_argument(
+        "-ihmm", "--input-hmm", nargs="?", help="hmm results after kofam scan.tsv"
+    )
+    parser.add_argument(
+        "--ko-index",
+        nargs="?",
+        default="data/ko_index",
+        help="KEGG index directory built by kegg_index.py",
+    )
+    parser.add_argument(
+        "-o", "--output", nargs="?", help="path to kegg result file.tsv or .arrow"
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    path_parsed_gff = args.input_gff
+    path_hmm_result = args.input_hmm
+    path_to_ko_index = args.ko_index
+    output_filename = args.output
+
+    parsed_gff = read_table(path_parsed_gff, "parsed_gff")
+    result = calc_intersection_map(parsed_gff, path_hmm_result, path_to_ko_index)
+    result = result.fillna(0)
+
+    write_table(result, output_filename, "kegg", parsed_gff.locus_name)
+
+    print("Kegg analysis completed")
@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+from functools import lru_cache
+from typing import TYPE_CHECKING, Iterable, List, NamedTuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+class KeggIndex(NamedTuple):
+    kos: np.ndarray  # sorted KO ids
+    pathways: np.ndarray  # sorted metabolic pathway ids
+    ko_pathways: np.ndarray  # pathway bitset (uint64 words) for each KO
+    desc_offsets: np.ndarray  # borders of KO descriptions in desc_blob
+    desc_blob: np.ndarray  # utf-8 encoded KO descriptions
+
+
+def build_kegg_index(
+    output_dir: str,
+    path_to_ko_map: str = "data/ko_map.json",
+    path_to_ko_desc: str = "data/ko_descriptions.json",
+) -> None:
+    """
+    Compiles .json KO map and KO descriptions into integer-coded index
+    which can be memory-mapped instead of parsing .json files.
+
+    :param output_dir: directory for the index files
+    :param path_to_ko_map: .json KO map file
+    :param path_to_ko_desc: .json file with KO descriptions
+    """
+    import numpy as np
+
+    with open(path_to_ko_map, "r", encoding="utf-8") as fh:
+        ko_map = json.load(fh)
+    with open(path_to_ko_desc, "r", encoding="utf-8") as fh:
+        ko_desc = json.load(fh)
+
+    kos = sorted(set(ko_map) | set(ko_desc))
+    pathways = sorted(
+        {pathway for ko_pathways in ko_map.values() for pathway in ko_pathways}
+    )
+    pathway_codes = {pathway: code for code, pathway in enumerate(pathways)}
+
+    ko_pathways = np.zeros((len(kos), (len(pathways) + 63) // 64), dtype=np.uint64)
+    for ko_code, ko in enumerate(kos):
+        for pathway in ko_map.get(ko, []):
+            code = pathway_codes[pathway]
+            ko_pathways[ko_code, code // 64] |= np.uint64(1) << np.uint64(code % 64)
+
+    descriptions = ["".join(ko_desc.get(ko, [])).encode("utf-8") for ko in kos]
+    desc_offsets = np.zeros(len(kos) + 1, dtype=np.int64)
+    desc_offsets[1:] = np.cumsum([len(description) for description in descriptions])
+
+    os.makedirs(output_dir, exist_ok=True)
+    np.save(f"{output_dir}/kos.npy", np.array(kos, dtype=np.bytes_))
+    np.save(f"{output_dir}/pathways.npy", np.array(pathways, dtype=np.bytes_))
+    np.save(f"{output_dir}/ko_pathways.npy", ko_pathways)
+    np.save(f"{output_dir}/desc_offsets.npy", desc_offsets)
+    np.save(
+        f"{output_dir}/desc_blob.npy",
+        np.frombuffer(b"".join(descriptions), dtype=np.uint8),
+    )
+
+
+@lru_cache(maxsize=None)
+def load_kegg_index(path_to_ko_index: str = "data/ko_index") -> KeggIndex:
+    """
+    Memory-maps KEGG index created by build_kegg_index.
+    The index is opened once per process.
+
+    :param path_to_ko_index: directory with the index files
+    :return: KEGG index
+    """
+    import numpy as np
+
+    return KeggIndex(
+        *[
+            np.load(f"{path_to_ko_index}/{name}.npy", mmap_mode="r")
+            for name in KeggIndex._fields
+        ]
+    )
+
+
+def encode_kos(kegg_index: KeggIndex, kos: Iterable[str]) -> np.ndarray:
+    """
+    Converts KO ids to integer codes of the index.
+
+    :param kegg_index: KEGG index
+    :param kos: KO ids
+    :return: KO codes (-1 for KO ids absent in the index)
+    """
+    import numpy as np
+
+    kos = np.asarray(list(kos), dtype=np.bytes_)
+    codes = np.searchsorted(kegg_index.kos, kos)
+    codes[codes == len(kegg_index.kos)] = 0
+    codes[kegg_index.kos[codes] != kos] = -1
+    return codes
+
+
+def encode_pathways(kegg_index: KeggIndex, pathway_lists: Iterable[str]) -> np.ndarray:
+    """
+    Converts comma-joined metabolic pathway ids to pathway bitsets.
+
+    :param kegg_index: KEGG index
+    :param pathway_lists: comma-joined metabolic pathway ids for each gene
+    :return: pathway bitset (uint64 words) for each gene
+    """
+    import numpy as np
+
+    # Only unique pathway combinations are parsed, genes refer to them by codes
+    unique_lists = {}
+    codes = np.array(
+        [
+            unique_lists.setdefault(pathways, len(unique_lists))
+            for pathways in pathway_lists
+        ],
+        dtype=np.int64,
+    )
+
+    rows, pathway_ids = [], []
+    for row, pathways in enumerate(unique_lists):
+        names = [name for name in pathways.split(",") if name]
+        rows.extend([row] * len(names))
+        pathway_ids.extend(names)
+
+    pathway_ids = np.asarray(pathway_ids, dtype=np.bytes_)
+    pathway_codes = np.searchsorted(kegg_index.pathways, pathway_ids)
+    pathway_codes[pathway_codes == len(kegg_index.pathways)] = 0
+    known = kegg_index.pathways[pathway_codes] == pathway_ids
+    rows, pathway_codes = np.asarray(rows, dtype=np.int64)[known], pathway_codes[known]
+
+    bitsets = np.zeros(
+        (len(unique_lists), kegg_index.ko_pathways.shape[1]), dtype=np.uint64
+    )
+    np.bitwise_or.at(
+        bitsets,
+        (rows, pathway_codes // 64),
+        np.left_shift(np.uint64(1), (pathway_codes % 64).astype(np.uint64)),
+    )
+    return bitsets[codes]
+
+
+def popcount(bitsets: np.ndarray) -> np.ndarray:
+    """
+    Counts the number of set bits (pathways) in each bitset.
+
+    :param bitsets: pathway bitsets (uint64 words)
+    :return: number of pathways for each bitset
+    """
+    import numpy as np
+
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(bitsets).sum(axis=-1, dtype=np.int64)
+    # Number of set bits for each byte value
+    byte_popcount = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(
+        axis=1
+    )
+    bytes_view = np.ascontiguousarray(bitsets, dtype="<u8").view(np.uint8)
+    return byte_popcount[bytes_view].sum(axis=-1, dtype=np.int64)
+
+
+def decode_pathways(kegg_index: KeggIndex, bitset: np.ndarray) -> List[str]:
+    """
+    Converts pathway bitset to the list of metabolic pathway ids.
+
+    :param kegg_index: KEGG index
+    :param bitset: pathway bitset (uint64 words)
+    :return: metabolic pathway ids
+    """
+    import numpy as np
+
+    bits = np.unpackbits(
+        np.ascontiguousarray(bitset, dtype="<u8").view(np.uint8), bitorder="little"
+    )
+    return kegg_index.pathways[np.flatnonzero(bits)].astype(str).tolist()
+
+
+def get_ko_description(kegg_index: KeggIndex, ko_code: int) -> str:
+    """
+    Gets description of KO from the index.
+
+    :param kegg_index: KEGG index
+    :param ko_code: KO code
+    :return: KO description
+    """
+    start, end = kegg_index.desc_offsets[ko_code], kegg_index.desc_offsets[ko_code + 1]
+    return kegg_index.desc_blob[start:end].tobytes().decode("utf-8")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        usage="kegg_index.py --ko-map KO_MAP.JSON --ko-desc KO_DESCRIPTIONS.JSON --output KO_INDEX",
+        description="""Compiles KEGG KO map and descriptions into memory-mapped index.""",
+    )
+    parser.add_argument(
+        "--ko-map", nargs="?", default="data/ko_map.json", help="KO map file.json"
+    )
+    parser.add_argument(
+        "--ko-desc",
+        nargs="?",
+        default="data/ko_descriptions.json",
+        help="KO descriptions file.json",
+    )
+    parser.add_argument("-o", "--output", nargs="?", help="index directory")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    build_kegg_index(args.output, args.ko_map, args.ko_desc)
+
+    print("KEGG index built successfully")
@@ -1,69 +1,145 @@
-import argparse
-import pickle
-
-import pandas as pd
-
-
-def predict_operon(model_file: str, data_for_predict: pd.DataFrame) -> pd.Series:
-    """
-    Makes predictions using a trained model.
-
-    :param data_for_predict: table with data required for prediction
-    :param model_file: path to model
-    :return: series with predicted operons
-    """
-    with open(model_file, "rb") as f:
-        model = pickle.load(f)
-
-    predictions = model.predict(data_for_predict)
-    return pd.Series(predictions)
-
-
-def parse_args():
-    parser = argparse.ArgumentParser(
-        usage="predict_operon.py"
-        "--parsed-gff PARSED_GFF.TSV"
-        "--string STRING_SCORES.TSV"
-        "--inter-dist INTER_DIST.TSV"
-        "--kegg KEGG.TSV"
-        "--model MODEL.PKL"
-        "--output RESULT.TSV",
-        description="""Makes predictions using a trained RandomForest model.""",
-    )
-    parser.add_argument("--parsed-gff", nargs="?", help="path to parsed gff file.tsv")
-    parser.add_argument("--string", nargs="?", help="path to STRING scores.tsv")
-    parser.add_argument(
-        "--inter-dist", nargs="?", help="path to intergenic distances result file.tsv"
-    )
-    parser.add_argument("--kegg", nargs="?", help="path to kegg result file.npy")
-    parser.add_argument("--model", nargs="?", help="model for predictions.pkl")
-    parser.add_argument("-o", "--output", nargs="?", help="predictions results.tsv")
-    return parser.parse_args()
-
-
-if __name__ == "__main__":
-    path_parsed_gff = parse_args().parsed_gff
-    path_string = parse_args().string
-    path_inter_dist = parse_args().inter_dist
-    path_kegg = parse_args().kegg
-    model = parse_args().model
-    output_filename = parse_args().output
-
-    parsed_gff = pd.read_csv(path_parsed_gff, sep="\t")
-    string = pd.read_csv(path_string, sep="\t")
-    inter_dist = pd.read_csv(path_inter_dist, sep="\t")
-    kegg = pd.read_csv(path_kegg, sep="\t")
-
-    data_for_predict = pd.DataFrame(
-        data={
-            "strand": parsed_gff.strand,
-            "prob_operon": inter_dist.iloc[:, 1],
-            "pred_string": string.final_scores,
-            "intersection_map_count": kegg.intersection_map_count,
-        }
-    )
-
-    result = predict_operon(model, data_for_predict)
-    result.to_csv(output_filename, sep="\t")
-
-    print("Operons predicted successfully")
+from __future__ import annotations
+
+import argparse
+import os
+import pickle
+import sys
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from compiled_model import load_compiled_model, predict  # noqa: E402
+from intermediate import read_table, write_table  # noqa: E402
+
+
+@lru_cache(maxsize=None)
+def load_pickled_model(model_file: str):
+    """
+    Unpickles a trained model, once per process.
+
+    :param model_file: path to model.pkl
+    :return: sklearn pipeline
+    """
+    with open(model_file, "rb") as f:
+        return pickle.load(f)
+
+
+def predict_operon(model_file: str, data_for_predict: pd.DataFrame) -> pd.Series:
+    """
+    Makes predictions using a trained model.
+    Model compiled by compiled_model.py is used without sklearn.
+
+    :param data_for_predict: table with data required for prediction
+    :param model_file: path to model.pkl or compiled model directory
+    :return: series with predicted operons
+    """
+    import pandas as pd
+
+    if os.path.isdir(model_file):
+        return pd.Series(predict(load_compiled_model(model_file), data_for_predict))
+
+    model = load_pickled_model(model_file)
+
+    predictions = model.predict(data_for_predict)
+    return pd.Series(predictions)
+
+
+def get_data_for_predict(
+    parsed_gff: pd.DataFrame,
+    string_scores: pd.DataFrame,
+    prob_operon: pd.Series,
+    kegg_annotation: Optional[pd.DataFrame] = None,
+) -> pd.DataFrame:
+    """
+    Collects features required by the model into one table.
+    Without KEGG annotation (provisional prediction before kofam_scan finishes)
+    genes get no intersections between metabolic pathways, as genes without KO do.
+
+    :param parsed_gff: parsed gff3 annotation
+    :param string_scores: table with STRING scores for each gene
+    :param prob_operon: operon probability based on intergenic distances
+    :param kegg_annotation: table with the number of intersections between metabolic pathways
+    :return: table with data required for prediction
+    """
+    import numpy as np
+    import pandas as pd
+
+    if kegg_annotation is None:
+        intersection_map_count = np.zeros(parsed_gff.shape[0])
+    else:
+        intersection_map_count = kegg_annotation.intersection_map_count.to_numpy()
+
+    data_for_predict = pd.DataFrame(
+        data={
+            "strand": parsed_gff.strand.to_numpy(),
+            "prob_operon": prob_operon.to_numpy(),
+            "pred_string": string_scores.final_scores.to_numpy(),
+            "intersection_map_count": intersection_map_count,
+        }
+    )
+    return data_for_predict
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        usage="predict_operon.py"
+        "--parsed-gff PARSED_GFF.TSV"
+        "--string STRING_SCORES.TSV"
+        "--inter-dist INTER_DIST.TSV"
+        "[--kegg KEGG.TSV]"
+        "--model MODEL.PKL|COMPILED_MODEL"
+        "--output RESULT.TSV",
+        description="""Makes predictions using a trained RandomForest model.""",
+    )
+    parser.add_argument(
+        "--parsed-gff", nargs="?", help="path to parsed gff file.tsv or .arrow"
+    )
+    parser.add_argument(
+        "--string", nargs="?", help="path to STRING scores.tsv or .arrow"
+    )
+    parser.add_argument(
+        "--inter-dist",
+        nargs="?",
+        help="path to intergenic distances result file.tsv or .arrow",
+    )
+    parser.add_argument(
+        "--kegg",
+        nargs="?",
+        help="path to kegg result file.tsv or .arrow (provisional prediction without it)",
+    )
+    parser.add_argument(
+        "--model", nargs="?", help="model for predictions.pkl or compiled model"
+    )
+    parser.add_argument(
+        "-o", "--output", nargs="?", help="predictions results.tsv or .arrow"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    path_parsed_gff = args.parsed_gff
+    path_string = args.string
+    path_inter_dist = args.inter_dist
+    path_kegg = args.kegg
+    model = args.model
+    output_filename = args.output
+
+    # Metrics are joined by locus tag
+    parsed_gff = read_table(path_parsed_gff, "parsed_gff")
+    string = read_table(path_string, "string_scores", parsed_gff.locus_name)
+    inter_dist = read_table(path_inter_dist, "inter_dist", parsed_gff.locus_name)
+    kegg = read_table(path_kegg, "kegg", parsed_gff.locus_name) if path_kegg else None
+
+    data_for_predict = get_data_for_predict(
+        parsed_gff, string, inter_dist.iloc[:, 0], kegg
+    )
+
+    result = predict_operon(model, data_for_predict)
+    write_table(result, output_filename, "predictions", parsed_gff.locus_name)
+
+    print("Operons predicted successfully")
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import argparse
+import os
+from typing import TYPE_CHECKING, Iterable, NamedTuple, Optional
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+
+class StringLinksIndex(NamedTuple):
+    proteins: np.ndarray  # sorted STRING ids
+    offsets: np.ndarray  # borders of links of each protein1
+    protein2: np.ndarray  # codes of protein2 of each link
+    combined_score: np.ndarray  # combined score of each link
+
+
+def convert_string_links(path_protein_links: str, output_dir: str) -> None:
+    """
+    Converts a protein.links file from the STRING database into a binary columnar cache.
+    Proteins are integer-coded with a sorted dictionary, links are sorted by protein1
+    and indexed by offsets, so the cache can be memory-mapped instead of parsed.
+
+    :param path_protein_links: path to protein links from STRING db.txt
+    :param output_dir: directory for the cache files
+    """
+    import numpy as np
+    import pandas as pd
+
+    protein_links = pd.read_csv(path_protein_links, sep=" ")
+
+    codes, proteins = pd.factorize(
+        pd.concat([protein_links.protein1, protein_links.protein2], ignore_index=True)
+    )
+    # Sorted dictionary allows to encode ids with a binary search
+    order = np.argsort(proteins.to_numpy(dtype=str))
+    ranks = np.empty_like(order)
+    ranks[order] = np.arange(len(order))
+    codes = ranks[codes].astype(np.int32)
+
+    protein1 = codes[: len(protein_links)]
+    protein2 = codes[len(protein_links) :]
+    combined_score = protein_links.combined_score.to_numpy(dtype=np.int16)
+
+    sort_index = np.lexsort((protein2, protein1))
+    offsets = np.zeros(len(proteins) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(protein1, minlength=len(proteins)))
+
+    os.makedirs(output_dir, exist_ok=True)
+    np.save(
+        f"{output_dir}/proteins.npy",
+        proteins.to_numpy(dtype=str)[order].astype(np.bytes_),
+    )
+    np.save(f"{output_dir}/offsets.npy", offsets)
+    np.save(f"{output_dir}/protein2.npy", protein2[sort_index])
+    np.save(f"{output_dir}/combined_score.npy", combined_score[sort_index])
+
+
+def read_string_links(
+    path_protein_links: str,
+    proteins: Optional[Iterable[str]] = None,
+    chunksize: int = 1_000_000,
+) -> pd.DataFrame:
+    """
+    Reads a protein.links file from the STRING database in chunks. Only links between
+    provided proteins are kept, so memory depends on the genome, not on the links file.
+
+    :param path_protein_links: path to protein links from STRING db.txt
+    :param proteins: STRING ids of proteins to keep (all links if None)
+    :param chunksize: number of lines read at once
+    :return: table with protein combined scores
+    """
+    import numpy as np
+    import pandas as pd
+
+    if proteins is None:
+        return pd.read_csv(path_protein_links, sep=" ")
+
+    proteins = pd.unique(pd.Series(list(proteins), dtype=object).dropna())
+    chunks = []
+    with pd.read_csv(
+        path_protein_links,
+        sep=" ",
+        chunksize=chunksize,
+        dtype={"protein1": object, "protein2": object, "combined_score": np.int16},
+    ) as reader:
+        for chunk in reader:
+            chunks.append(
+                chunk[chunk.protein1.isin(proteins) & chunk.protein2.isin(proteins)]
+            )
+
+    protein_links = pd.concat(chunks, ignore_index=True)
+    protein_links["combined_score"] = protein_links.combined_score.astype(int)
+
+    return protein_links
+
+
+def load_string_links_index(
+    path_cache: str, mmap_mode: Optional[str] = "r"
+) -> StringLinksIndex:
+    """
+    Opens the binary cache created by convert_string_links.
+
+    :param path_cache: directory with the cache files
+    :param mmap_mode: memory-map mode of the arrays (None to read them into memory)
+    :return: index of protein links
+    """
+    import numpy as np
+
+    return StringLinksIndex(
+        *[
+            np.load(f"{path_cache}/{name}.npy", mmap_mode=mmap_mode)
+            for name in StringLinksIndex._fields
+        ]
+    )
+
+
+def select_string_links(
+    links_index: StringLinksIndex, proteins: Optional[Iterable[str]] = None
+) -> pd.DataFrame:
+    """
+    Selects links between given proteins from the index.
+
+    :param links_index: index of protein links
+    :param proteins: STRING ids of proteins to keep (all links if None)
+    :return: table with protein combined scores
+    """
+    import numpy as np
+    import pandas as pd
+
+    dictionary, offsets, protein2, combined_score = links_index
+
+    if proteins is None:
+        codes = np.arange(len(dictionary))
+    else:
+        ids = np.unique(np.asarray(list(proteins), dtype=np.bytes_))
+        codes = np.searchsorted(dictionary, ids)
+        codes = codes[codes < len(dictionary)]
+        codes = codes[np.isin(dictionary[codes], ids)]
+
+    # Gather the rows of each requested protein1 from its offsets segment
+    starts = offsets[codes]
+    counts = offsets[codes + 1] - starts
+    rows = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(
+        counts.sum()
+    )
+    codes1 = np.repeat(codes, counts)
+    codes2 = protein2[rows]
+
+    if proteins is not None:
+        kept = np.isin(codes2, codes)
+        rows, codes1, codes2 = rows[kept], codes1[kept], codes2[kept]
+
+    protein_links = pd.DataFrame(
+        data={
+            "protein1": dictionary[codes1].astype(str),
+            "protein2": dictionary[codes2].astype(str),
+            "combined_score": combined_score[rows].astype(int),
+        }
+    )
+
+    return protein_links
+
+
+def load_string_links(
+    path_cache: str, proteins: Optional[Iterable[str]] = None
+) -> pd.DataFrame:
+    """
+    Reads protein links from the binary cache created by convert_string_links.
+
+    :param path_cache: directory with the cache files
+    :param proteins: STRING ids of proteins to keep (all links if None)
+    :return: table with protein combined scores
+    """
+    return select_string_links(load_string_links_index(path_cache), proteins)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        usage="string_links.py --protein-links PROTEIN_LINKS.TXT --output PROTEIN_LINKS_CACHE",
+        description="""Converts protein links from STRING db into a memory-mapped binary cache.""",
+    )
+    parser.add_argument(
+        "--protein-links", nargs="?", help="protein links from STRING db.txt"
+    )
+    parser.add_argument("-o", "--output", nargs="?", help="cache directory")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    convert_string_links(args.protein_links, args.output)
+
+    print("STRING protein links converted successfully")
@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from typing import TYPE_CHECKING, NamedTuple, Optional, Tuple
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+sys.path.extend(
+    [
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "preprocessing"),
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "metrics"),
+    ]
+)
+
+from contig_pipeline import predict_by_contigs  # noqa: E402
+from filter_diamond_results import filter_diamond_results  # noqa: E402
+from get_string_scores import get_string_scores  # noqa: E402
+from intergenic_distances import (  # noqa: E402
+    calculate_intergenic_dist,
+    predict_operon_inter_dist,
+)
+from kegg import calc_intersection_map  # noqa: E402
+from main import (  # noqa: E402
+    annotate_gff,
+    build_final_table,
+    build_operon_table,
+    write_predictions,
+)
+from parse_gff import parse_contigs, parse_gff  # noqa: E402
+from predict_operon import get_data_for_predict, predict_operon  # noqa: E402
+from string_links import load_string_links, read_string_links  # noqa: E402
+
+
+class StageResults(NamedTuple):
+    string_scores: pd.DataFrame
+    kegg_annotation: Optional[pd.DataFrame]
+    prob_operon: pd.Series
+    predictions: pd.Series
+    final_table: pd.DataFrame
+    operons: pd.DataFrame
+
+
+def predict_from_tables(
+    parsed_gff: pd.DataFrame,
+    diamond_result_filtered: pd.DataFrame,
+    protein_links: pd.DataFrame,
+    path_hmm_result: Optional[str],
+    path_matrix_emission: str = "data/matrix_emission_15.npy",
+    model_file: str = "models/model.pkl",
+    contigs: Optional[pd.DataFrame] = None,
+    contig_workers: int = 1,
+) -> StageResults:
+    """
+    Runs the stages after annotation and alignment on tables in memory.
+    If contigs are given, each contig is scored on its own (see contig_pipeline.py),
+    otherwise the genome is scored as one ring.
+
+    :param parsed_gff: parsed gff3 annotation
+    :param diamond_result_filtered: filtered Diamond alignment against STRING proteins
+    :param protein_links: STRING links between the aligned proteins
+    :param path_hmm_result: path to hmm result file (after kofam scan),
+    None for provisional prediction without KEGG annotation (see build_final_table)
+    :param path_matrix_emission: path to emission matrix.npy
+    :param model_file: path to model.pkl or compiled model directory
+    :param contigs: table with length and topology of contigs (see parse_contigs)
+    :param contig_workers: number of processes scoring batches of contigs
+    :return: tables of all stages
+    """
+    kegg_annotation = None
+    if path_hmm_result is not None:
+        kegg_annotation = calc_intersection_map(parsed_gff, path_hmm_result).fillna(0)
+
+    if contigs is not None:
+        string_scores, prob_operon, predictions = predict_by_contigs(
+            parsed_gff,
+            diamond_result_filtered,
+            protein_links,
+            kegg_annotation,
+            contigs,
+            path_matrix_emission,
+            model_file,
+            contig_workers,
+        )
+    else:
+        string_scores = get_string_scores(
+            parsed_gff, diamond_result_filtered, protein_links
+        )
+
+        df_inter_dist = calculate_intergenic_dist(parsed_gff)
+        prob_operon = predict_operon_inter_dist(df_inter_dist, path_matrix_emission)
+
+        data_for_predict = get_data_for_predict(
+            parsed_gff, string_scores, prob_operon, kegg_annotation
+        )
+        predictions = predict_operon(model_file, data_for_predict)
+
+    final_table = build_final_table(
+        parsed_gff, kegg_annotation, string_scores, predictions
+    )
+    operons = build_operon_table(
+        final_table, parsed_gff["strand"], string_scores["next_scores"]
+    )
+
+    return StageResults(
+        string_scores, kegg_annotation, prob_operon, predictions, final_table, operons
+    )
+
+
+def run_pipeline(
+    genome: str,
+    taxon_id: int,
+    path_matrix_emission: str = "data/matrix_emission_15.npy",
+    model_file: str = "models/model.pkl",
+    keep_intermediate: bool = False,
+    contig_workers: int = 0,
+    circular: str = "annotation",
+    provisional: bool = False,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Runs all Python stages of the operon prediction in one process.
+    Tables are passed between stages in memory, results of external tools
+    (bakta, Diamond, kofam_scan) must already exist in the results folder.
+
+    :param genome: input genome fasta file name without extension
+    :param taxon_id: NCBI taxon id
+    :param path_matrix_emission: path to emission matrix.npy
+    :param model_file: path to model.pkl or compiled model directory
+    :param keep_intermediate: write intermediate tables as the Snakemake rules do
+    :param contig_workers: number of processes scoring contigs independently
+    (0 - the genome is scored as one ring)
+    :param circular: topology of contigs: "annotation" (Is_circular of bakta), "all" or "none"
+    :param provisional: predict without KEGG annotation, kofam_scan result is not needed
+    :return: table with final results, table of operons (see build_operon_table)
+    """
+    temp_dir = f"results/{taxon_id}/predictions/temp_dir"
+    path_links = f"results/{taxon_id}/string/{taxon_id}.protein.links.v12.0"
+
+    parsed_gff = parse_gff(f"results/{taxon_id}/bakta/{genome}.gff3")
+    contigs = None
+    if contig_workers > 0:
+        contigs = parse_contigs(f"results/{taxon_id}/bakta/{genome}.gff3")
+        if circular != "annotation":
+            contigs["circular"] = circular == "all"
+    diamond_result_filtered = filter_diamond_results(
+        f"results/{taxon_id}/diamond/{taxon_id}_{genome}.tsv"
+    )
+
+    if os.path.isdir(f"{path_links}.cache"):
+        protein_links = load_string_links(
+            f"{path_links}.cache", diamond_result_filtered.target_accession
+        )
+    else:
+        protein_links = read_string_links(
+            f"{path_links}.txt", diamond_result_filtered.target_accession
+        )
+
+    results = predict_from_tables(
+        parsed_gff,
+        diamond_result_filtered,
+        protein_links,
+        None if provisional else f"results/{taxon_id}/hmm/{taxon_id}_{genome}_hmm.txt",
+        path_matrix_emission,
+        model_file,
+        contigs,
+        contig_workers,
+    )
+
+    if keep_intermediate:
+        os.makedirs(temp_dir, exist_ok=True)
+        parsed_gff.to_csv(f"results/{taxon_id}/bakta/{genome}_parsed.tsv", sep="\t")
+        diamond_result_filtered.to_csv(
+            f"results/{taxon_id}/diamond/{taxon_id}_{genome}_filtered.tsv", sep="\t"
+        )
+        results.string_scores.to_csv(
+            f"{temp_dir}/{taxon_id}_{genome}_string_scores.tsv", sep="\t"
+        )
+        if results.kegg_annotation is not None:
+            results.kegg_annotation.to_csv(
+                f"{temp_dir}/{taxon_id}_{genome}_kegg.tsv", sep="\t"
+            )
+        results.prob_operon.to_csv(
+            f"{temp_dir}/{taxon_id}_{genome}_inter_dist.tsv", sep="\t"
+        )
+        suffix = "_provisional" if provisional else ""
+        results.predictions.to_csv(
+            f"{temp_dir}/{taxon_id}_{genome}_predictions{suffix}.tsv", sep="\t"
+        )
+
+    return results.final_table, results.operons
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        usage="pipeline.py --genome GENOME --taxid TAXON_ID [--keep-intermediate] [--contig-workers N [--circular annotation|all|none]] [--operon-formats tsv bed jsonl] [--provisional]",
+        description="""Runs operon prediction stages after annotation in a single process.""",
+    )
+    parser.add_argument("--genome", nargs="?", help="genome.fna")
+    parser.add_argument("--taxid", nargs="?", help="ncbi taxon id")
+    parser.add_argument(
+        "--emission-matrix",
+        nargs="?",
+        default="data/matrix_emission_15.npy",
+        help="path to emission matrix.npy",
+    )
+    parser.add_argument(
+        "--model",
+        nargs="?",
+        default="models/model.pkl",
+        help="model for predictions.pkl or compiled model",
+    )
+    parser.add_argument(
+        "--keep-intermediate",
+        action="store_true",
+        help="write intermediate tables to results folders",
+    )
+    parser.add_argument(
+        "--contig-workers",
+        type=int,
+        default=0,
+        help="score contigs independently in N processes (0 - genome as one ring)",
+    )
+    parser.add_argument(
+        "--circular",
+        choices=["annotation", "all", "none"],
+        default="annotation",
+        help="topology of contigs for --contig-workers (annotation - Is_circular of bakta)",
+    )
+    parser.add_argument(
+        "--operon-formats",
+        nargs="*",
+        choices=["tsv", "bed", "jsonl"],
+        default=["tsv", "bed", "jsonl"],
+        help="formats of the table of operons",
+    )
+    parser.add_argument(
+        "--provisional",
+        action="store_true",
+        help="publish predictions made without KEGG annotation (before kofam_scan finishes)",
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    genome = args.genome
+    taxon_id = args.taxid
+
+    final_table, operons = run_pipeline(
+        genome,
+        taxon_id,
+        path_matrix_emission=args.emission_matrix,
+        model_file=args.model,
+        keep_intermediate=args.keep_intermediate,
+        contig_workers=args.contig_workers,
+        circular=args.circular,
+        provisional=args.provisional,
+    )
+
+    # Provisional tables have their own names, the final ones are never overwritten
+    suffix = "_provisional" if args.provisional else ""
+    output_filename_tsv = (
+        f"results/{taxon_id}/predictions/{genome}_predictions{suffix}.tsv"
+    )
+    output_filename_gff = (
+        f"results/{taxon_id}/predictions/{genome}_predictions{suffix}.gff3"
+    )
+    output_prefix_operons = f"results/{taxon_id}/predictions/{genome}_operons{suffix}"
+
+    write_predictions(
+        final_table,
+        operons,
+        output_filename_tsv,
+        output_prefix_operons,
+        args.operon_formats,
+        "provisional" if args.provisional else "final",
+    )
+    annotate_gff(
+        f"results/{taxon_id}/bakta/{genome}.gff3",
+        dict(zip(final_table.locus_name, final_table.operon_number)),
+        output_filename_gff,
+    )
+
+    print(
+        f"Job is done! Prediction results are in the folder results/{taxon_id}/predictions/"
+    )
@@ -0,0 +1,375 @@
+import argparse
+import hashlib
+import os
+import sqlite3
+import subprocess
+import tempfile
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from filter_diamond_results import iter_best_hits
+
+
+class AnnotationCache:
+    """
+    Persistent cache of per-protein results of external tools.
+    Results are keyed by sequence hash within a namespace of tool, database and parameters,
+    least recently used results are evicted when the cache exceeds its size.
+    """
+
+    def __init__(self, path: str, max_size_mb: float = 2048):
+        """
+        :param path: path to cache database.sqlite
+        :param max_size_mb: maximum size of cached results in megabytes
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.connection = sqlite3.connect(path, timeout=600)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                namespace TEXT,
+                sequence_hash TEXT,
+                result TEXT,
+                size INTEGER,
+                last_used REAL,
+                PRIMARY KEY (namespace, sequence_hash)
+            )
+            """)
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)"
+        )
+        self.connection.commit()
+
+    def get(self, namespace: str, sequence_hashes: Iterable[str]) -> Dict[str, str]:
+        """
+        Finds cached results and marks them as recently used.
+
+        :param namespace: tool, database and parameters key
+        :param sequence_hashes: hashes of protein sequences
+        :return: dict with result for each cached sequence hash
+        """
+        sequence_hashes = list(dict.fromkeys(sequence_hashes))
+        found = {}
+        with self.connection:
+            for start in range(0, len(sequence_hashes), 500):
+                chunk = sequence_hashes[start : start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.connection.execute(
+                    f"SELECT sequence_hash, result FROM results "
+                    f"WHERE namespace = ? AND sequence_hash IN ({placeholders})",
+                    [namespace, *chunk],
+                ).fetchall()
+                found.update(rows)
+                self.connection.execute(
+                    f"UPDATE results SET last_used = ? "
+                    f"WHERE namespace = ? AND sequence_hash IN ({placeholders})",
+                    [time.time(), namespace, *chunk],
+                )
+        return found
+
+    def put(self, namespace: str, results: Dict[str, str]) -> None:
+        """
+        Stores results and evicts least recently used ones above the size limit.
+
+        :param namespace: tool, database and parameters key
+        :param results: dict with result for each sequence hash
+        """
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        namespace,
+                        sequence_hash,
+                        result,
+                        len(sequence_hash) + len(result),
+                        now,
+                    )
+                    for sequence_hash, result in results.items()
+                ],
+            )
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Removes least recently used results while the cache exceeds its size.
+        """
+        with self.connection:
+            total_size = self.connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM results"
+            ).fetchone()[0]
+            if total_size <= self.max_size:
+                return
+
+            excess, evicted = total_size - self.max_size, []
+            for rowid, size in self.connection.execute(
+                "SELECT rowid, size FROM results ORDER BY last_used"
+            ):
+                if excess <= 0:
+                    break
+                evicted.append((rowid,))
+                excess -= size
+            self.connection.executemany("DELETE FROM results WHERE rowid = ?", evicted)
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def read_fasta(path: str) -> List[Tuple[str, str]]:
+    """
+    Reads protein ids (first word of the header) and sequences from .faa file.
+
+    :param path: path to .faa file
+    :return: list of protein ids with sequences
+    """
+    proteins = []
+    with open(path, "r") as fasta:
+        for line in fasta:
+            line = line.strip()
+            if line.startswith(">"):
+                proteins.append((line[1:].split()[0], []))
+            elif line:
+                proteins[-1][1].append(line)
+    return [(protein_id, "".join(sequence)) for protein_id, sequence in proteins]
+
+
+def write_fasta(path: str, proteins: List[Tuple[str, str]]) -> None:
+    """
+    Writes proteins to .faa file.
+
+    :param path: path to .faa file
+    :param proteins: list of protein ids with sequences
+    """
+    with open(path, "w") as fasta:
+        for protein_id, sequence in proteins:
+            fasta.write(f">{protein_id}\n{sequence}\n")
+
+
+def get_sequence_hash(sequence: str) -> str:
+    """
+    :param sequence: protein sequence
+    :return: sha256 of the sequence without stop codon
+    """
+    return hashlib.sha256(sequence.upper().rstrip("*").encode()).hexdigest()
+
+
+def get_namespace(tool: str, database_files: List[str], params: List[str]) -> str:
+    """
+    Creates cache key of tool, database version and parameters.
+    Database version is identified by names, sizes and modification times of its files.
+
+    :param tool: tool name
+    :param database_files: paths to database files
+    :param params: parameters affecting the results
+    :return: namespace key
+    """
+    key = [tool, *params]
+    for path in database_files:
+        stat = os.stat(path)
+        key.append(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}")
+    return hashlib.sha256("\t".join(key).encode()).hexdigest()[:32]
+
+
+def split_cached(
+    cache: AnnotationCache, namespace: str, proteins: List[Tuple[str, str]]
+) -> Tuple[Dict[str, str], List[Tuple[str, str]]]:
+    """
+    Splits proteins into cached ones and proteins which must be processed by the tool.
+
+    :param cache: annotation cache
+    :param namespace: tool, database and parameters key
+    :param proteins: list of protein ids with sequences
+    :return: dict with cached result for each sequence hash, uncached proteins
+    """
+    cached = cache.get(namespace, [get_sequence_hash(seq) for _, seq in proteins])
+    uncached, seen = [], set()
+    for protein_id, sequence in proteins:
+        sequence_hash = get_sequence_hash(sequence)
+        if sequence_hash not in cached and sequence_hash not in seen:
+            seen.add(sequence_hash)
+            uncached.append((protein_id, sequence))
+    return cached, uncached
+
+
+def run_diamond_cached(
+    path_faa: str,
+    path_db: str,
+    output_filename: str,
+    cache: AnnotationCache,
+    threads: int = 4,
+    params: Tuple[str, ...] = ("--fast",),
+) -> None:
+    """
+    Runs Diamond blastp only for proteins absent in the cache. Diamond output is reduced
+    to the best hit of each protein (see filter_diamond_results.iter_best_hits) while it is
+    read, so neither the output nor the cache holds all hits.
+
+    :param path_faa: path to proteins.faa
+    :param path_db: path to Diamond database.dmnd
+    :param output_filename: path to Diamond best hits.tsv
+    :param cache: annotation cache
+    :param threads: number of threads
+    :param params: Diamond parameters affecting the results
+    """
+    proteins = read_fasta(path_faa)
+    namespace = get_namespace("diamond_blastp", [path_db], list(params))
+    cached, uncached = split_cached(cache, namespace, proteins)
+
+    hits = {}
+    if uncached:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            write_fasta(f"{temp_dir}/query.faa", uncached)
+            diamond = subprocess.Popen(
+                [
+                    "diamond",
+                    "blastp",
+                    "-q",
+                    f"{temp_dir}/query.faa",
+                    "-d",
+                    path_db,
+                    "--quiet",
+                    "--threads",
+                    str(threads),
+                    *params,
+                ],
+                stdout=subprocess.PIPE,
+                text=True,
+            )
+            for _, line in iter_best_hits(diamond.stdout):
+                query, hit = line.rstrip("\n").split("\t", 1)
+                hits[query] = hit
+            if diamond.wait():
+                raise subprocess.CalledProcessError(diamond.returncode, diamond.args)
+
+    # Proteins without hits are cached too
+    new_results = {
+        get_sequence_hash(sequence): hits.get(protein_id, "")
+        for protein_id, sequence in uncached
+    }
+    cache.put(namespace, new_results)
+
+    best_hits = {**cached, **new_results}
+    with open(output_filename, "w") as output:
+        for protein_id, sequence in proteins:
+            best_hit = best_hits[get_sequence_hash(sequence)]
+            if best_hit:
+                output.write(f"{protein_id}\t{best_hit}\n")
+
+
+def run_kofam_cached(
+    path_exec: str,
+    path_faa: str,
+    path_profile: str,
+    path_ko_list: str,
+    output_filename: str,
+    cache: AnnotationCache,
+    threads: int = 8,
+    params: Tuple[str, ...] = ("-f", "mapper-one-line"),
+) -> None:
+    """
+    Runs kofam_scan only for proteins absent in the cache and writes KO assignments
+    of all proteins in mapper-one-line format.
+
+    :param path_exec: path to kofam_scan exec_annotation
+    :param path_faa: path to proteins.faa
+    :param path_profile: path to KO profiles.hal
+    :param path_ko_list: path to ko_list
+    :param output_filename: path to hmm result.txt
+    :param cache: annotation cache
+    :param threads: number of threads
+    :param params: kofam_scan parameters affecting the results
+    """
+    proteins = read_fasta(path_faa)
+    namespace = get_namespace("kofam_scan", [path_profile, path_ko_list], list(params))
+    cached, uncached = split_cached(cache, namespace, proteins)
+
+    kos = {}
+    if uncached:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            write_fasta(f"{temp_dir}/query.faa", uncached)
+            subprocess.run(
+                [
+                    path_exec,
+                    f"--cpu={threads}",
+                    "-p",
+                    path_profile,
+                    "-k",
+                    path_ko_list,
+                    "-o",
+                    f"{temp_dir}/result.txt",
+                    "--tmp-dir",
+                    f"{temp_dir}/tmp",
+                    *params,
+                    f"{temp_dir}/query.faa",
+                ],
+                check=True,
+            )
+            with open(f"{temp_dir}/result.txt", "r") as result:
+                for line in result:
+                    query, *query_kos = line.rstrip("\n").split("\t")
+                    kos[query] = "\t".join(query_kos)
+
+    new_results = {
+        get_sequence_hash(sequence): kos.get(protein_id, "")
+        for protein_id, sequence in uncached
+    }
+    cache.put(namespace, new_results)
+
+    results = {**cached, **new_results}
+    with open(output_filename, "w") as output:
+        for protein_id, sequence in proteins:
+            protein_kos = results[get_sequence_hash(sequence)]
+            output.write(
+                f"{protein_id}\t{protein_kos}\n" if protein_kos else f"{protein_id}\n"
+            )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        usage="annotation_cache.py {diamond,kofam} --faa PROTEINS.FAA --output RESULT [--cache CACHE.SQLITE]",
+        description="""Runs Diamond or kofam_scan only for proteins absent in the annotation cache.""",
+    )
+    parser.add_argument("tool", choices=["diamond", "kofam"], help="tool to run")
+    parser.add_argument("--faa", nargs="?", help="proteins.faa")
+    parser.add_argument("--db", nargs="?", help="Diamond database.dmnd")
+    parser.add_argument("--kofam", nargs="?", help="kofam_scan exec_annotation")
+    parser.add_argument("--profile", nargs="?", help="KO profiles.hal")
+    parser.add_argument("--ko-list", nargs="?", help="ko_list")
+    parser.add_argument("-o", "--output", nargs="?", help="tool result file")
+    parser.add_argument("--threads", type=int, default=4, help="number of threads")
+    parser.add_argument(
+        "--cache",
+        nargs="?",
+        default="databases/annotation_cache.sqlite",
+        help="annotation cache.sqlite",
+    )
+    parser.add_argument(
+        "--max-size-mb",
+        type=float,
+        default=2048,
+        help="maximum size of the annotation cache in megabytes",
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    cache = AnnotationCache(args.cache, args.max_size_mb)
+    if args.tool == "diamond":
+        run_diamond_cached(args.faa, args.db, args.output, cache, args.threads)
+    else:
+        run_kofam_cached(
+            args.kofam,
+            args.faa,
+            args.profile,
+            args.ko_list,
+            args.output,
+            cache,
+            args.threads,
+        )
+    cache.close()
+
+    print(f"{args.tool} results are merged with the annotation cache successfully")
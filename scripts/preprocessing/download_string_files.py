@@ -1,59 +1,196 @@
 import argparse
-import gzip
 import os
-import shutil
+import pathlib
+import time
+import urllib.error
+import urllib.request
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPException
+from typing import Optional
 
-import wget
+STRING_URL = "https://stringdb-downloads.org/download"
+CHUNK_SIZE = 1 << 20
 
 
-def download_string_files(taxon_id: int) -> None:
+def get_string_url(base_url: str, kind: str, filename: str) -> str:
+    """
+    :param base_url: STRING download URL, mirror URL or local directory with the same layout
+    :param kind: file kind (e.g. protein.links.v12.0)
+    :param filename: name of .gz file
+    :return: URL of the file
+    """
+    if "://" not in base_url:
+        base_url = pathlib.Path(base_url).resolve().as_uri()
+    return f"{base_url.rstrip('/')}/{kind}/{filename}"
+
+
+def check_content(path: str, first_line: str) -> None:
+    """
+    Checks that decompressed file starts as a STRING file of its kind.
+
+    :param path: path to decompressed file
+    :param first_line: expected beginning of the first line
+    """
+    with open(path, "r") as file:
+        line = file.readline()
+    if not line.startswith(first_line):
+        raise ValueError(f"{path} does not look like a STRING file: {line[:80]!r}")
+
+
+def download_gzip(
+    url: str,
+    output_filename: str,
+    first_line: Optional[str] = None,
+    retries: int = 5,
+    timeout: float = 60,
+) -> None:
+    """
+    Downloads .gz file and decompresses it on the fly. Compressed bytes are kept
+    in output.gz.part only until the download is finished, so an interrupted
+    transfer is resumed from where it stopped. Completeness and integrity are checked
+    by Content-Length and by gzip end of stream and CRC, the content by its first line,
+    before the file is renamed to output_filename.
+
+    :param url: URL of .gz file (http(s):// or file://)
+    :param output_filename: path to decompressed file
+    :param first_line: expected beginning of the first line (see check_content)
+    :param retries: number of attempts after failures
+    :param timeout: timeout of connection in seconds
+    :raises FileNotFoundError: the file is absent at the URL
+    """
+    path_compressed = f"{output_filename}.gz.part"
+    path_partial = f"{output_filename}.part"
+
+    for attempt in range(retries + 1):
+        offset = (
+            os.path.getsize(path_compressed) if os.path.exists(path_compressed) else 0
+        )
+        request = urllib.request.Request(url)
+        if offset:
+            request.add_header("Range", f"bytes={offset}-")
+
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                if offset and response.getcode() != 206:
+                    offset = 0  # Server does not support ranges, start again
+                length = response.headers.get("Content-Length")
+                expected_size = offset + int(length) if length else None
+
+                # Resumed transfer continues after already received bytes
+                decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+                with open(path_partial, "wb") as output:
+                    if offset:
+                        with open(path_compressed, "rb") as compressed:
+                            while chunk := compressed.read(CHUNK_SIZE):
+                                output.write(decompressor.decompress(chunk))
+
+                    with open(path_compressed, "ab" if offset else "wb") as compressed:
+                        while chunk := response.read(CHUNK_SIZE):
+                            compressed.write(chunk)
+                            output.write(decompressor.decompress(chunk))
+                    output.write(decompressor.flush())
+
+            size = os.path.getsize(path_compressed)
+            if expected_size is not None and size != expected_size:
+                raise HTTPException(f"received {size} of {expected_size} bytes")
+            if not decompressor.eof:
+                raise HTTPException(f"gzip stream of {url} is truncated")
+        except zlib.error as error:
+            # Corrupted data cannot be resumed
+            os.remove(path_compressed)
+            last_error = error
+        except (urllib.error.URLError, HTTPException, OSError) as error:
+            if isinstance(error, urllib.error.HTTPError) and error.code == 416:
+                # Range is beyond the end of the file, start again
+                os.remove(path_compressed)
+            elif (
+                isinstance(error, urllib.error.HTTPError) and error.code < 500
+            ) or isinstance(getattr(error, "reason", None), FileNotFoundError):
+                raise FileNotFoundError(f"{url} is not available: {error}") from error
+            last_error = error
+        else:
+            if first_line is not None:
+                try:
+                    check_content(path_partial, first_line)
+                except ValueError:
+                    # Wrong content is not fixed by downloading again
+                    os.remove(path_partial)
+                    os.remove(path_compressed)
+                    raise
+            os.replace(path_partial, output_filename)
+            os.remove(path_compressed)
+            return
+        time.sleep(min(2**attempt, 30))
+
+    raise RuntimeError(f"{url} was not downloaded: {last_error}")
+
+
+def download_string_files(
+    taxon_id: int, base_url: str = STRING_URL, retries: int = 5
+) -> None:
     """
     Downloads and unzips a protein score table and protein sequences
-    for provided taxon_id from the STRING database.
+    for provided taxon_id from the STRING database. Both files are downloaded concurrently.
 
     :param taxon_id: taxon_id for analyzing species
+    :param base_url: STRING download URL, mirror URL or local directory with the same layout
+    :param retries: number of attempts after failures
+    :raises ValueError: files of the taxon are absent in STRING
     """
     db_version = "v12.0"
-    keywords = [["sequences", "fa"], ["links", "txt"]]
+    keywords = [["sequences", "fa", ">"], ["links", "txt", "protein1 protein2"]]
     output_dir = f"results/{taxon_id}/string"
-    urls = []
-
-    for keyword in keywords:
-        urls.append(
-            f"https://stringdb-downloads.org/download/protein.{keyword[0]}.{db_version}/"
-            f"{taxon_id}.protein.{keyword[0]}.{db_version}.{keyword[1]}.gz"
-        )
 
     os.makedirs(
         output_dir, exist_ok=True
     )  # `if not os.exists(output_dir)` doesn't work with snakemake
 
-    for url in urls:
-        wget.download(url, out=output_dir, bar=None)
+    def download(keyword: list) -> None:
+        output_filename = (
+            f"{output_dir}/{taxon_id}.protein.{keyword[0]}.{db_version}.{keyword[1]}"
+        )
+        url = get_string_url(
+            base_url,
+            f"protein.{keyword[0]}.{db_version}",
+            f"{os.path.basename(output_filename)}.gz",
+        )
+        download_gzip(url, output_filename, keyword[2], retries)
 
-    for keyword in keywords:
-        with gzip.open(
-            f"{output_dir}/{taxon_id}.protein.{keyword[0]}.{db_version}.{keyword[1]}.gz",
-            "rb",
-        ) as in_file:
-            with open(
-                f"{output_dir}/{taxon_id}.protein.{keyword[0]}.{db_version}.{keyword[1]}",
-                "wb",
-            ) as out_file:
-                shutil.copyfileobj(in_file, out_file)
+    try:
+        with ThreadPoolExecutor(len(keywords)) as executor:
+            for future in [executor.submit(download, keyword) for keyword in keywords]:
+                future.result()
+    except FileNotFoundError as error:
+        if not os.listdir(output_dir):
+            os.removedirs(output_dir)  # Empty parent folders are removed as well
+        raise ValueError(
+            f"STRING files of taxon {taxon_id} are not found at {base_url}, "
+            f"check that the taxid is in data/species.v12.0.txt ({error})"
+        ) from error
 
 
 def parse_args():
     parser = argparse.ArgumentParser(
-        usage="download_string_files.py --taxid TAXON_ID",
+        usage="download_string_files.py --taxid TAXON_ID [--base-url URL]",
         description="""Downloads files for subsequent analysis from the STRING database.""",
     )
     parser.add_argument("--taxid", nargs="?", help="taxon_id")
+    parser.add_argument(
+        "--base-url",
+        nargs="?",
+        default=STRING_URL,
+        help="STRING download URL, mirror URL or local directory with the same layout",
+    )
+    parser.add_argument(
+        "--retries", type=int, default=5, help="number of attempts after failures"
+    )
 
     return parser.parse_args()
 
 
 if __name__ == "__main__":
-    taxon_id = parse_args().taxid
-    download_string_files(taxon_id)
+    args = parse_args()
+
+    download_string_files(args.taxid, args.base_url, args.retries)
     print("Files from STRING database downloaded and unzipped successfully")
@@ -1,33 +1,75 @@
+from __future__ import annotations
+
 import argparse
+import os
+import sys
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Iterable, Iterator, TextIO, Tuple, Union
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from intermediate import write_table  # noqa: E402
+
+
+def iter_best_hits(lines: Iterable[str]) -> Iterator[Tuple[int, str]]:
+    """
+    Selects the hit with maximal sequence identity for each query from Diamond
+    tabular output, the first one of equal hits wins. Diamond writes hits of a query
+    one after another, so only the current query is kept in memory. Hits of a query
+    that are not grouped together are reported as separate queries.
+    Blank lines are skipped and are not counted as rows.
+
+    :param lines: lines of Diamond tabular output
+    :return: row number and line of the best hit of each query
+    """
+    query, best_row, best_line, best_identity = None, -1, "", float("-inf")
+
+    for row, line in enumerate(line for line in lines if line.strip()):
+        columns = line.split("\t", 3)
+        if columns[0] != query:
+            if query is not None:
+                yield best_row, best_line
+            query, best_identity = columns[0], float("-inf")
 
-import pandas as pd
+        identity = float(columns[2])
+        if identity > best_identity:
+            best_row, best_line, best_identity = row, line, identity
 
+    if query is not None:
+        yield best_row, best_line
 
-def filter_diamond_results(path: str) -> pd.DataFrame:
+
+def filter_diamond_results(path: Union[str, TextIO]) -> pd.DataFrame:
     """
     Filters results after Diamond alignment.
 
-    :param path: file path to diamond alignment
-    :return: filtered table
+    :param path: file path to diamond alignment or opened file (e.g. stdout of Diamond)
+    :return: filtered table with the columns necessary for subsequent analysis
     """
-    column_names = [
-        "query_accession",
-        "target_accession",
-        "sequence_identity",
-        "length",
-        "mismatches",
-        "gap_openings",
-        "query_start",
-        "query_end",
-        "target_start",
-        "target_end",
-        "e_value",
-        "bit_score",
-    ]
-    diamond_result = pd.read_csv(path, sep="\t", header=None, names=column_names)
-    diamond_result_filtered = diamond_result.loc[
-        diamond_result.groupby("query_accession")["sequence_identity"].idxmax()
-    ]
+    import numpy as np
+    import pandas as pd
+
+    rows, query_accession, target_accession, sequence_identity = [], [], [], []
+    # Opened files are closed by the caller
+    with open(path, "r") if isinstance(path, str) else nullcontext(path) as handle:
+        for row, line in iter_best_hits(handle):
+            columns = line.split("\t", 3)
+            rows.append(row)
+            query_accession.append(columns[0])
+            target_accession.append(columns[1])
+            sequence_identity.append(float(columns[2]))
+
+    diamond_result_filtered = pd.DataFrame(
+        data={
+            "query_accession": query_accession,
+            "target_accession": target_accession,
+            "sequence_identity": np.array(sequence_identity, dtype=np.float64),
+        },
+        index=np.array(rows, dtype=np.int64),
+    )
 
     return diamond_result_filtered
 
@@ -37,19 +79,21 @@ def parse_args():
         usage="filter_diamond_results.py --input DIAMOND_RESULT.TSV --output FILTERED_DIAMOND_RESULT.TSV",
         description="""Filters results after Diamond alignment.""",
     )
-    parser.add_argument("-i", "--input", nargs="?", help="diamond result file.tsv")
     parser.add_argument(
-        "-o", "--output", nargs="?", help="filtered diamond result file.tsv"
+        "-i", "--input", nargs="?", help="diamond result file.tsv (- for stdin)"
+    )
+    parser.add_argument(
+        "-o", "--output", nargs="?", help="filtered diamond result file.tsv or .arrow"
     )
 
     return parser.parse_args()
 
 
 if __name__ == "__main__":
-    diamond_result = parse_args().input
-    output_filename = parse_args().output
+    args = parse_args()
 
+    diamond_result = sys.stdin if args.input == "-" else args.input
     diamond_result_filtered = filter_diamond_results(diamond_result)
-    diamond_result_filtered.to_csv(output_filename, sep="\t")
+    write_table(diamond_result_filtered, args.output, "diamond_filtered")
 
     print("Diamond results were filtered successfully")
@@ -1,19 +1,33 @@
+from __future__ import annotations
+
 import argparse
 import json
-import pandas as pd
+import os
+from typing import TYPE_CHECKING, Tuple
+
+from taxid_index import (
+    get_accession,
+    is_in_string,
+    load_taxid_index,
+    lookup_taxids,
+    read_string_taxids,
+)
 
-from Bio import Entrez
+if TYPE_CHECKING:
+    import pandas as pd
 
 
-def accession_to_taxid(acc: str, db="assembly") -> int:
+def accession_to_taxid(acc: str, db="assembly") -> Tuple[int, int]:
     """
     Converts an accession number to a taxid from NCBI database.
     Additional function for obtain_taxid function.
 
     :param acc: accession number
     :param db: database to search
-    :return: taxid
+    :return: taxid, species taxid
     """
+    from Bio import Entrez
+
     handle = Entrez.esearch(db=db, term=acc)
     record = Entrez.read(handle)
     gb_id = record["IdList"][0]
@@ -21,18 +35,31 @@ def accession_to_taxid(acc: str, db="assembly") -> int:
     handle = Entrez.esummary(db=db, id=gb_id, retmode="json")
     result = json.load(handle)["result"]
 
-    taxid = result[gb_id]["taxid"]
+    taxid = int(result[gb_id]["taxid"])
+    species_taxid = int(result[gb_id]["speciestaxid"])
 
-    return taxid
+    return taxid, species_taxid
 
 
-def obtain_taxid(path_dist_df: str) -> (int, pd.DataFrame):
+def obtain_taxid(
+    path_dist_df: str,
+    path_taxid_index: str = "databases/mash/refseq_taxid_index",
+    use_entrez: bool = False,
+    path_species: str = "data/species.v12.0.txt",
+) -> (int, pd.DataFrame):
     """
-    Obtains taxid from NCBI database based on an input dataframe distances best hit.
-
-    :param df: dataframe with distances calculated with mash
-    :return: taxid
+    Obtains taxids of Mash hits from the offline taxid index (see taxid_index.py).
+    NCBI database is queried only on request, if the best hit is absent in the index.
+
+    :param path_dist_df: dataframe with distances calculated with mash
+    :param path_taxid_index: taxid index directory
+    :param use_entrez: query NCBI database for the best hit absent in the index
+    :param path_species: path to STRING species.txt
+    :return: taxid of the nearest hit covered by STRING, sorted dataframe with taxids
     """
+    import numpy as np
+    import pandas as pd
+
     dist_df = pd.read_csv(path_dist_df,
                           sep="\t",
                           names=["Reference-ID", "Query-ID", "Mash-distance", "P-value", "Matching-hashes"])
@@ -41,35 +68,81 @@ def obtain_taxid(path_dist_df: str) -> (int, pd.DataFrame):
     dist_df["Query-ID"] = dist_df["Query-ID"].str.replace("genomes/", "")
     dist_df["Reference-ID"] = dist_df["Reference-ID"].str.replace(".gz", "")
 
-    accession = "_".join(dist_df["Reference-ID"].iloc[0].split("_")[:2])
-    taxid = accession_to_taxid(accession)
-
-    return taxid, dist_df
+    if os.path.isdir(path_taxid_index):
+        taxids, string_taxids = lookup_taxids(
+            load_taxid_index(path_taxid_index),
+            [get_accession(reference_id) for reference_id in dist_df["Reference-ID"]],
+        )
+    else:
+        taxids, string_taxids = np.full((2, dist_df.shape[0]), -1, dtype=np.int64)
+
+    if use_entrez and taxids[0] < 0:
+        accession = "_".join(dist_df["Reference-ID"].iloc[0].split("_")[:2])
+        taxids[0], species_taxid = accession_to_taxid(accession)
+        # The species is used if the strain is absent in STRING, as in the taxid index
+        string_species = read_string_taxids(path_species)
+        candidates = np.array([taxids[0], species_taxid], dtype=np.int64)
+        covered_candidates = candidates[is_in_string(string_species, candidates)]
+        if covered_candidates.size:
+            string_taxids[0] = covered_candidates[0]
+
+    dist_df["Taxid"] = taxids
+    dist_df["STRING-taxid"] = string_taxids
+
+    covered = np.flatnonzero(string_taxids >= 0)
+    if covered.size == 0:
+        raise ValueError(
+            "Taxid of Mash hits covered by STRING was not found. Build the taxid index "
+            f"(snakemake --cores=all -p {path_taxid_index}) or use --entrez"
+        )
+
+    return int(string_taxids[covered[0]]), dist_df
 
 
 def parse_args():
     parser = argparse.ArgumentParser(
-        usage="obtain_taxid.py --genome GENOME.FNA --dist GENOME_DISTANCES.TAB --email EMAIL",
+        usage="obtain_taxid.py --genome GENOME.FNA --dist GENOME_DISTANCES.TAB [--taxid-index TAXID_INDEX] [--entrez --email EMAIL]",
         description="""
-        Obtains taxid from NCBI database based on Mash distances best hit.
-        Email is required due to the use of the Entrez library.
+        Obtains taxid based on Mash distances best hit from the offline taxid index.
+        Email is required only for the NCBI database (Entrez) queries.
         """,
     )
     parser.add_argument("--genome", nargs="?", help="genome.fna")
     parser.add_argument("--dist", nargs="?", help="mash_distances.tab")
+    parser.add_argument(
+        "--taxid-index",
+        nargs="?",
+        default="databases/mash/refseq_taxid_index",
+        help="taxid index directory",
+    )
+    parser.add_argument(
+        "--species",
+        nargs="?",
+        default="data/species.v12.0.txt",
+        help="STRING species.txt",
+    )
+    parser.add_argument(
+        "--entrez",
+        action="store_true",
+        help="query NCBI database if the best hit is absent in the taxid index",
+    )
     parser.add_argument("--email", nargs="?", help="email")
 
     return parser.parse_args()
 
 
 if __name__ == "__main__":
-    path_genome = parse_args().genome
-    path_dist_df = parse_args().dist
-    email = parse_args().email
+    args = parse_args()
+    path_dist_df = args.dist
 
-    Entrez.email = email
+    if args.entrez:
+        from Bio import Entrez
 
-    taxid, sorted_dist_df = obtain_taxid(path_dist_df)
+        Entrez.email = args.email
+
+    taxid, sorted_dist_df = obtain_taxid(
+        path_dist_df, args.taxid_index, args.entrez, args.species
+    )
 
     path_dist_df_sorted = path_dist_df.replace(".tab", "_sorted.tab")
     sorted_dist_df.to_csv(
@@ -77,4 +150,10 @@ if __name__ == "__main__":
         sep="\t",
     )
 
+    best_hit = sorted_dist_df.iloc[0]
+    if best_hit["Taxid"] >= 0 and best_hit["Taxid"] != taxid:
+        print(
+            f"TAXON ID of the best Mash hit is {best_hit['Taxid']}, "
+            f"the nearest one in STRING database is used"
+        )
     print(f"TAXON ID for provided genome is {taxid}")
@@ -1,16 +1,133 @@
+from __future__ import annotations
+
 import argparse
+import os
+import sys
+from array import array
+from typing import TYPE_CHECKING
+from urllib.parse import unquote
+
+if TYPE_CHECKING:
+    import pandas as pd
 
-import pandas as pd
-from BCBio import GFF
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from intermediate import write_table  # noqa: E402
 
 
 def parse_gff(path: str) -> pd.DataFrame:
     """
     Parses .gff3 file from given path.
+    Only CDS lines are read, the ##FASTA section is skipped.
 
     :param path: path to file
     :return: table with the columns necessary for subsequent analysis
     """
+    import numpy as np
+    import pandas as pd
+
+    contigs, gene_names, locus_names = [], [], []
+    starts, ends, strands = array("q"), array("q"), array("b")
+
+    with open(path, "r") as handle:
+        for line in handle:
+            if line.startswith("#"):
+                if line.startswith("##FASTA"):
+                    break
+                continue
+            if line.startswith(">"):
+                break
+
+            columns = line.rstrip("\n").split("\t")
+            if len(columns) != 9 or columns[2] != "CDS":
+                continue
+
+            qualifiers = dict(
+                qualifier.split("=", 1)
+                for qualifier in columns[8].split(";")
+                if "=" in qualifier
+            )
+
+            contigs.append(unquote(columns[0]))
+            starts.append(int(columns[3]))
+            ends.append(int(columns[4]))
+            strands.append(1 if columns[6] == "+" else 0)
+            gene_names.append(unquote(qualifiers.get("gene", "")))
+            locus_names.append(unquote(qualifiers["locus_tag"]))
+
+    parsed_gff = pd.DataFrame(
+        data={
+            "contig": contigs,
+            "start": np.frombuffer(starts, dtype=np.int64),
+            "end": np.frombuffer(ends, dtype=np.int64),
+            "strand": np.frombuffer(strands, dtype=np.int8).astype(np.int64),
+            "gene_name": gene_names,
+            "locus_name": locus_names,
+        }
+    )
+
+    return parsed_gff
+
+
+def parse_contigs(path: str) -> pd.DataFrame:
+    """
+    Reads lengths and topology of contigs from ##sequence-region lines
+    and region features of .gff3 file (bakta marks circular replicons with Is_circular=true).
+
+    :param path: path to file
+    :return: table indexed by contig with length and circular columns
+    """
+    import numpy as np
+    import pandas as pd
+
+    lengths, circular = {}, {}
+
+    with open(path, "r") as handle:
+        for line in handle:
+            if line.startswith("##sequence-region"):
+                _, contig, _, end = line.split()
+                lengths[unquote(contig)] = int(end)
+                continue
+            if line.startswith("#"):
+                if line.startswith("##FASTA"):
+                    break
+                continue
+            if line.startswith(">"):
+                break
+
+            columns = line.rstrip("\n").split("\t")
+            if len(columns) != 9 or columns[2] != "region":
+                continue
+
+            contig = unquote(columns[0])
+            lengths[contig] = int(columns[4])
+            circular[contig] = "Is_circular=true" in columns[8].split(";")
+
+    contigs = pd.DataFrame(
+        data={
+            "length": pd.Series(lengths, dtype=np.int64),
+            "circular": pd.Series(
+                {contig: circular.get(contig, False) for contig in lengths},
+                dtype=bool,
+            ),
+        }
+    )
+    contigs.index.name = "contig"
+
+    return contigs
+
+
+def parse_gff_bcbio(path: str) -> pd.DataFrame:
+    """
+    Parses .gff3 file from given path with BCBio.
+    Previous implementation of parse_gff, kept for comparison in benchmarks.
+
+    :param path: path to file
+    :return: table with the columns necessary for subsequent analysis
+    """
+    import pandas as pd
+    from BCBio import GFF
+
     info = []
     limit_info = dict(gff_type=["CDS"])
 
@@ -47,16 +164,19 @@ def parse_args():
         description="""Parses .gff3 file with annotation obtained by bakta.""",
     )
     parser.add_argument("-i", "--input-gff", nargs="?", help="gff file to parse.gff3")
-    parser.add_argument("-o", "--output-gff", nargs="?", help="parsed gff file.tsv")
+    parser.add_argument(
+        "-o", "--output-gff", nargs="?", help="parsed gff file.tsv or .arrow"
+    )
 
     return parser.parse_args()
 
 
 if __name__ == "__main__":
-    input_gff = parse_args().input_gff
-    output_gff = parse_args().output_gff
+    args = parse_args()
+    input_gff = args.input_gff
+    output_gff = args.output_gff
 
     parsed_gff = parse_gff(input_gff)
-    parsed_gff.to_csv(output_gff, sep="\t")
+    write_table(parsed_gff, output_gff, "parsed_gff")
 
     print("Bakta annotation file parsed successfully")
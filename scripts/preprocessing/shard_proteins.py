@@ -0,0 +1,85 @@
+import argparse
+import heapq
+from typing import List
+
+from annotation_cache import read_fasta, write_fasta
+
+
+def split_proteins(path_faa: str, shard_files: List[str]) -> None:
+    """
+    Splits proteins into shards with nearly equal total length, as the search time
+    of kofam_scan depends on the number of residues. Proteins keep their order within a shard.
+
+    :param path_faa: path to proteins.faa
+    :param shard_files: paths to shard .faa files
+    """
+    proteins = read_fasta(path_faa)
+
+    # The longest proteins go first, each to the shard with the least residues
+    shard_sizes = [(0, shard) for shard in range(len(shard_files))]
+    assignment = [0] * len(proteins)
+    for index in sorted(
+        range(len(proteins)), key=lambda index: -len(proteins[index][1])
+    ):
+        size, shard = heapq.heappop(shard_sizes)
+        assignment[index] = shard
+        heapq.heappush(shard_sizes, (size + len(proteins[index][1]), shard))
+
+    for shard, shard_file in enumerate(shard_files):
+        write_fasta(
+            shard_file,
+            [
+                protein
+                for protein, protein_shard in zip(proteins, assignment)
+                if protein_shard == shard
+            ],
+        )
+
+
+def merge_kofam_results(
+    path_faa: str, shard_results: List[str], output_filename: str
+) -> None:
+    """
+    Merges mapper-one-line results of shards in the order of proteins in the .faa file,
+    so the result does not depend on the number of shards.
+
+    :param path_faa: path to proteins.faa
+    :param shard_results: paths to kofam_scan results of shards
+    :param output_filename: path to merged hmm result.txt
+    """
+    lines = {}
+    for shard_result in shard_results:
+        with open(shard_result, "r") as result:
+            for line in result:
+                lines[line.rstrip("\n").split("\t")[0]] = line.rstrip("\n")
+
+    with open(output_filename, "w") as output:
+        for protein_id, _ in read_fasta(path_faa):
+            if protein_id in lines:
+                output.write(f"{lines[protein_id]}\n")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        usage="shard_proteins.py {split,merge} --faa PROTEINS.FAA --shards SHARD_0 SHARD_1 ... [--output MERGED.TXT]",
+        description="""Splits proteins into balanced shards and merges kofam_scan results of shards.""",
+    )
+    parser.add_argument("action", choices=["split", "merge"], help="action")
+    parser.add_argument("--faa", nargs="?", help="proteins.faa")
+    parser.add_argument(
+        "--shards", nargs="+", help="shard .faa files (split) or results (merge)"
+    )
+    parser.add_argument("-o", "--output", nargs="?", help="merged result file.txt")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    if args.action == "split":
+        split_proteins(args.faa, args.shards)
+        print("Proteins were split into shards successfully")
+    else:
+        merge_kofam_results(args.faa, args.shards, args.output)
+        print("kofam_scan results of shards were merged successfully")
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import argparse
+import os
+import subprocess
+from functools import lru_cache
+from typing import TYPE_CHECKING, Iterable, List, NamedTuple, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+
+class TaxidIndex(NamedTuple):
+    accessions: np.ndarray  # sorted unversioned accessions of Mash sketch
+    taxids: np.ndarray  # NCBI taxid of each assembly (-1 if unknown)
+    string_taxids: np.ndarray  # assembly or species taxid in STRING (-1 if none)
+
+
+def get_accession(reference_id: str) -> str:
+    """
+    Extracts assembly accession without version from Mash reference id.
+
+    :param reference_id: reference id (e.g. GCF_000005845.2_ASM584v2_genomic.fna.gz)
+    :return: assembly accession (e.g. GCF_000005845)
+    """
+    return "_".join(reference_id.split("_")[:2]).split(".")[0]
+
+
+def read_sketch_ids(path_sketch: str) -> List[str]:
+    """
+    Reads reference ids of Mash sketch.
+
+    :param path_sketch: path to Mash sketch.msh
+    :return: reference ids
+    """
+    info = subprocess.run(
+        ["mash", "info", "-t", path_sketch],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return [
+        line.split("\t")[2]
+        for line in info.splitlines()
+        if line and not line.startswith("#")
+    ]
+
+
+def read_assembly_summary(path: str) -> pd.DataFrame:
+    """
+    Reads accessions, taxids and species taxids from NCBI assembly_summary.txt.
+
+    :param path: path to assembly_summary.txt
+    :return: table with accession, taxid and species_taxid columns
+    """
+    import pandas as pd
+
+    accessions, taxids, species_taxids = [], [], []
+    with open(path, "r", encoding="utf-8") as summary:
+        for line in summary:
+            if line.startswith("#"):
+                continue
+            fields = line.split("\t", 7)
+            accessions.append(fields[0].split(".")[0])
+            taxids.append(int(fields[5]))
+            species_taxids.append(int(fields[6]))
+    return pd.DataFrame(
+        {"accession": accessions, "taxid": taxids, "species_taxid": species_taxids}
+    )
+
+
+def read_string_taxids(path_species: str = "data/species.v12.0.txt") -> np.ndarray:
+    """
+    :param path_species: path to STRING species.txt
+    :return: sorted taxids of STRING species
+    """
+    import numpy as np
+    import pandas as pd
+
+    species = pd.read_csv(path_species, sep="\t", usecols=[0])
+    return np.sort(species.iloc[:, 0].to_numpy(dtype=np.int64))
+
+
+def is_in_string(string_taxids: np.ndarray, taxids: np.ndarray) -> np.ndarray:
+    """
+    :param string_taxids: sorted taxids of STRING species
+    :param taxids: taxids
+    :return: mask of taxids present in STRING
+    """
+    import numpy as np
+
+    positions = np.searchsorted(string_taxids, taxids)
+    positions[positions == len(string_taxids)] = 0
+    return string_taxids[positions] == taxids
+
+
+def build_taxid_index(
+    output_dir: str,
+    reference_ids: Iterable[str],
+    assembly_summaries: List[str],
+    path_species: str = "data/species.v12.0.txt",
+) -> Tuple[int, int, int]:
+    """
+    Maps assemblies of Mash sketch to NCBI taxids and to taxids covered by STRING
+    (the taxid of the assembly or, if it is absent in STRING, its species taxid)
+    and saves the index which can be memory-mapped.
+
+    :param output_dir: directory for the index files
+    :param reference_ids: reference ids of Mash sketch
+    :param assembly_summaries: paths to NCBI assembly_summary.txt files
+    :param path_species: path to STRING species.txt
+    :return: numbers of assemblies, assemblies with taxid, assemblies covered by STRING
+    """
+    import numpy as np
+    import pandas as pd
+
+    accessions = np.unique(
+        np.array([get_accession(reference_id) for reference_id in reference_ids])
+    )
+
+    # Current assemblies take precedence over historical ones
+    summary = pd.concat(
+        [read_assembly_summary(path) for path in assembly_summaries]
+    ).drop_duplicates("accession")
+    summary = summary.set_index("accession").reindex(accessions)
+    taxids = summary.taxid.fillna(-1).to_numpy(dtype=np.int64)
+    species_taxids = summary.species_taxid.fillna(-1).to_numpy(dtype=np.int64)
+
+    string_species = read_string_taxids(path_species)
+    string_taxids = np.where(
+        is_in_string(string_species, taxids),
+        taxids,
+        np.where(is_in_string(string_species, species_taxids), species_taxids, -1),
+    )
+
+    os.makedirs(output_dir, exist_ok=True)
+    np.save(f"{output_dir}/accessions.npy", accessions.astype(np.bytes_))
+    np.save(f"{output_dir}/taxids.npy", taxids)
+    np.save(f"{output_dir}/string_taxids.npy", string_taxids)
+
+    return len(accessions), int((taxids >= 0).sum()), int((string_taxids >= 0).sum())
+
+
+@lru_cache(maxsize=None)
+def load_taxid_index(
+    path_taxid_index: str = "databases/mash/refseq_taxid_index",
+) -> TaxidIndex:
+    """
+    Memory-maps taxid index created by build_taxid_index.
+    The index is opened once per process.
+
+    :param path_taxid_index: directory with the index files
+    :return: taxid index
+    """
+    import numpy as np
+
+    return TaxidIndex(
+        *[
+            np.load(f"{path_taxid_index}/{name}.npy", mmap_mode="r")
+            for name in TaxidIndex._fields
+        ]
+    )
+
+
+def lookup_taxids(
+    taxid_index: TaxidIndex, accessions: Iterable[str]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Finds taxids of assemblies by binary search in the index.
+
+    :param taxid_index: taxid index
+    :param accessions: assembly accessions (version is ignored)
+    :return: taxids and taxids covered by STRING (-1 for unknown)
+    """
+    import numpy as np
+
+    accessions = np.asarray(
+        [accession.split(".")[0] for accession in accessions], dtype=np.bytes_
+    )
+    positions = np.searchsorted(taxid_index.accessions, accessions)
+    positions[positions == len(taxid_index.accessions)] = 0
+    found = taxid_index.accessions[positions] == accessions
+    taxids = np.where(found, taxid_index.taxids[positions], -1)
+    string_taxids = np.where(found, taxid_index.string_taxids[positions], -1)
+    return taxids, string_taxids
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        usage="taxid_index.py --sketch SKETCH.MSH --assembly-summary SUMMARY.TXT [SUMMARY.TXT ...] --output TAXID_INDEX",
+        description="""Builds offline index of taxids for assemblies of Mash sketch.""",
+    )
+    parser.add_argument("--sketch", nargs="?", help="Mash sketch.msh")
+    parser.add_argument(
+        "--assembly-summary",
+        nargs="+",
+        help="NCBI assembly_summary.txt files (current ones first)",
+    )
+    parser.add_argument(
+        "--species",
+        nargs="?",
+        default="data/species.v12.0.txt",
+        help="STRING species.txt",
+    )
+    parser.add_argument("-o", "--output", nargs="?", help="index directory")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    n_assemblies, n_taxids, n_string = build_taxid_index(
+        args.output,
+        read_sketch_ids(args.sketch),
+        args.assembly_summary,
+        args.species,
+    )
+
+    print(
+        f"Taxid index built successfully: {n_assemblies} assemblies, "
+        f"{n_taxids} with taxid, {n_string} covered by STRING"
+    )
@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import argparse
+import cProfile
+import glob
+import json
+import os
+import resource
+import runpy
+import sys
+import time
+from typing import TYPE_CHECKING, List, Optional
+
+from intermediate import is_arrow
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Columns of Snakemake benchmark files used in the report
+BENCHMARK_COLUMNS = {
+    "s": "wall_s",
+    "cpu_time": "cpu_s",
+    "max_rss": "max_rss_mb",
+    "io_in": "io_in_mb",
+    "io_out": "io_out_mb",
+}
+STAGE_COLUMNS = [
+    "rule",
+    "shard",
+    "python_wall_s",
+    "python_cpu_s",
+    "python_peak_rss_mb",
+    "rows",
+    "profile",
+]
+
+
+def get_peak_rss_mb() -> float:
+    """
+    :return: peak resident set size of the process in megabytes
+    """
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return max_rss / 1024**2 if sys.platform == "darwin" else max_rss / 1024
+
+
+def count_rows(paths: List[str]) -> int:
+    """
+    Counts data rows of tables with a header line or in Arrow format.
+
+    :param paths: paths to tables
+    :return: number of rows
+    """
+    rows = 0
+    for path in paths:
+        if is_arrow(path):
+            import pyarrow as pa
+
+            rows += pa.ipc.open_file(pa.memory_map(path, "r")).read_all().num_rows
+            continue
+        with open(path, "rb") as table:
+            rows += max(sum(1 for _ in table) - 1, 0)
+    return rows
+
+
+def run_stage(
+    command: List[str],
+    path_report: str,
+    row_files: Optional[List[str]] = None,
+    path_profile: Optional[str] = None,
+) -> dict:
+    """
+    Runs Python script of a stage in this process and records its wall time,
+    CPU time, peak memory and the number of processed rows.
+
+    :param command: path to script.py and its arguments
+    :param path_report: path to stage report.json
+    :param row_files: tables with a header whose rows are counted as processed
+    :param path_profile: path to cProfile dump (no profiling if None)
+    :return: stage report
+    """
+    script = command[0]
+    sys.argv = list(command)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    if path_profile:
+        profiler = cProfile.Profile()
+        try:
+            profiler.runcall(runpy.run_path, script, run_name="__main__")
+        finally:
+            os.makedirs(os.path.dirname(os.path.abspath(path_profile)), exist_ok=True)
+            profiler.dump_stats(path_profile)
+    else:
+        runpy.run_path(script, run_name="__main__")
+
+    report = {
+        "script": script,
+        "wall_s": time.perf_counter() - start_wall,
+        "cpu_s": time.process_time() - start_cpu,
+        "peak_rss_mb": get_peak_rss_mb(),
+        "rows": count_rows(row_files) if row_files else None,
+        "profile": path_profile,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path_report)), exist_ok=True)
+    with open(path_report, "w") as file:
+        json.dump(report, file, indent=2)
+    return report
+
+
+def read_benchmarks(directory: str) -> pd.DataFrame:
+    """
+    Reads Snakemake benchmark files ({rule}.tsv or {rule}.{shard}.tsv)
+    and reports of Python stages ({rule}.json) from the directory.
+    Repeated measurements are averaged.
+
+    :param directory: directory with benchmark files
+    :return: table with measurements of each rule (and shard)
+    """
+    import pandas as pd
+
+    rows = []
+    for path in sorted(glob.glob(f"{directory}/*.tsv")):
+        rule, _, shard = os.path.basename(path)[: -len(".tsv")].partition(".")
+        benchmark = pd.read_csv(path, sep="\t", na_values="-")
+        measurements = (
+            benchmark[[column for column in BENCHMARK_COLUMNS if column in benchmark]]
+            .astype(float)
+            .mean()
+            .rename(BENCHMARK_COLUMNS)
+        )
+        rows.append({"rule": rule, "shard": shard, **measurements.to_dict()})
+
+    stages = []
+    for path in sorted(glob.glob(f"{directory}/*.json")):
+        with open(path, "r") as file:
+            stage = json.load(file)
+        stages.append(
+            {
+                "rule": os.path.basename(path)[: -len(".json")],
+                "shard": "",
+                "python_wall_s": stage["wall_s"],
+                "python_cpu_s": stage["cpu_s"],
+                "python_peak_rss_mb": stage["peak_rss_mb"],
+                "rows": stage["rows"],
+                "profile": stage["profile"],
+            }
+        )
+
+    benchmarks = pd.DataFrame(
+        rows, columns=["rule", "shard", *BENCHMARK_COLUMNS.values()]
+    ).merge(
+        pd.DataFrame(stages, columns=STAGE_COLUMNS),
+        on=["rule", "shard"],
+        how="outer",
+    )
+    numeric_columns = [*BENCHMARK_COLUMNS.values(), *STAGE_COLUMNS[2:-1]]
+    benchmarks[numeric_columns] = benchmarks[numeric_columns].astype(float)
+    return benchmarks
+
+
+def build_run_report(taxon_id: int, genome: str) -> pd.DataFrame:
+    """
+    Combines Snakemake benchmarks and reports of Python stages of the genome into one table.
+    Rules shared by genomes of the taxon (e.g. STRING downloads) are included
+    with scope "taxon", as they were run once for all of them.
+
+    :param taxon_id: NCBI taxon id
+    :param genome: genome name
+    :return: table with one row per rule (and shard)
+    """
+    import pandas as pd
+
+    reports = [
+        read_benchmarks(f"results/benchmarks/{genome}").assign(scope="genome"),
+        read_benchmarks(f"results/{taxon_id}/benchmarks/{genome}").assign(
+            scope="genome"
+        ),
+        read_benchmarks(f"results/{taxon_id}/benchmarks").assign(scope="taxon"),
+    ]
+    run_report = pd.concat(
+        [report for report in reports if not report.empty] or reports,
+        ignore_index=True,
+    )
+    return run_report.sort_values(["scope", "rule", "shard"]).reset_index(drop=True)
+
+
+def write_run_report(run_report: pd.DataFrame, taxon_id: int, genome: str) -> None:
+    """
+    Writes the run report in .tsv and .json formats to results/{taxid}/predictions/.
+
+    :param run_report: table with one row per rule (and shard)
+    :param taxon_id: NCBI taxon id
+    :param genome: genome name
+    """
+    prefix = f"results/{taxon_id}/predictions/{genome}_run_report"
+    run_report.to_csv(f"{prefix}.tsv", sep="\t", index=False)
+
+    genome_rules = run_report[
+        (run_report.scope == "genome") & run_report.wall_s.notna()
+    ]
+    summary = {
+        "taxid": str(taxon_id),
+        "genome": genome,
+        "wall_s": float(genome_rules.wall_s.sum()),
+        "cpu_s": float(genome_rules.cpu_s.sum()),
+        "max_rss_mb": (
+            float(genome_rules.max_rss_mb.max()) if not genome_rules.empty else None
+        ),
+        "slowest_rule": (
+            genome_rules.rule[genome_rules.wall_s.idxmax()]
+            if not genome_rules.empty
+            else None
+        ),
+        "rules": json.loads(run_report.to_json(orient="records")),
+    }
+    with open(f"{prefix}.json", "w") as file:
+        json.dump(summary, file, indent=2)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        usage="""run_report.py stage --report STAGE.JSON [--rows TABLE.TSV] [--profile STAGE.PROF] SCRIPT.PY [ARGS ...]
+       run_report.py aggregate --genome GENOME --taxid TAXON_ID""",
+        description="""Records time and memory of Python stages and combines them with Snakemake benchmarks into a run report.""",
+    )
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    stage = subparsers.add_parser("stage", help="run Python stage and record it")
+    stage.add_argument("--report", nargs="?", required=True, help="stage report.json")
+    stage.add_argument(
+        "--rows",
+        action="append",
+        help="table with a header whose rows are counted (can be repeated)",
+    )
+    stage.add_argument("--profile", nargs="?", help="cProfile dump of the stage")
+    stage.add_argument(
+        "command", nargs=argparse.REMAINDER, help="stage script.py and its arguments"
+    )
+
+    aggregate = subparsers.add_parser("aggregate", help="write run report of genome")
+    aggregate.add_argument("--genome", nargs="?", required=True, help="genome name")
+    aggregate.add_argument("--taxid", nargs="?", required=True, help="ncbi taxon id")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    if args.action == "stage":
+        run_stage(args.command, args.report, args.rows, args.profile)
+    else:
+        run_report = build_run_report(args.taxid, args.genome)
+        write_run_report(run_report, args.taxid, args.genome)
+        print(
+            f"Run report is in results/{args.taxid}/predictions/{args.genome}_run_report.tsv"
+        )
@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+sys.path.extend(
+    [
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "preprocessing"),
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "metrics"),
+    ]
+)
+
+from compiled_model import load_compiled_model  # noqa: E402
+from filter_diamond_results import filter_diamond_results  # noqa: E402
+from intergenic_distances import load_emission_matrix  # noqa: E402
+from intermediate import read_table  # noqa: E402
+from kegg_index import load_kegg_index  # noqa: E402
+from pipeline import predict_from_tables  # noqa: E402
+from predict_operon import load_pickled_model  # noqa: E402
+from string_links import (  # noqa: E402
+    StringLinksIndex,
+    load_string_links_index,
+    select_string_links,
+)
+
+
+class StringIndexCache:
+    """
+    Keeps STRING link indexes of recently used taxa in memory.
+    """
+
+    def __init__(self, max_size: int = 4):
+        """
+        :param max_size: maximum number of taxa kept in memory
+        """
+        self.max_size = max_size
+        self.indexes = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, taxon_id: str) -> StringLinksIndex:
+        """
+        Returns index of protein links of the taxon, loading it if necessary.
+
+        :param taxon_id: NCBI taxon id
+        :return: index of protein links
+        """
+        with self.lock:
+            if taxon_id in self.indexes:
+                self.indexes.move_to_end(taxon_id)
+                return self.indexes[taxon_id]
+
+        path_cache = f"results/{taxon_id}/string/{taxon_id}.protein.links.v12.0.cache"
+        if not os.path.isdir(path_cache):
+            raise FileNotFoundError(
+                f"{path_cache} not found, run: snakemake --cores=all -p {path_cache}"
+            )
+        links_index = load_string_links_index(path_cache, mmap_mode=None)
+
+        with self.lock:
+            self.indexes[taxon_id] = links_index
+            while len(self.indexes) > self.max_size:
+                self.indexes.popitem(last=False)
+        return links_index
+
+    def taxa(self) -> list:
+        """
+        :return: taxon ids in memory, from the least recently used
+        """
+        with self.lock:
+            return list(self.indexes)
+
+
+def load_resources(
+    path_matrix_emission: str,
+    model_file: str,
+    path_to_ko_index: str = "data/ko_index",
+) -> None:
+    """
+    Loads resources shared by all genomes, so that the first request is not slower.
+
+    :param path_matrix_emission: path to emission matrix.npy
+    :param model_file: path to model.pkl or compiled model directory
+    :param path_to_ko_index: KEGG index directory (see kegg_index.py)
+    """
+    # The stages import pandas on first use
+    import pandas  # noqa: F401
+
+    load_emission_matrix(path_matrix_emission)
+    load_kegg_index(path_to_ko_index)
+    if os.path.isdir(model_file):
+        load_compiled_model(model_file)
+    else:
+        load_pickled_model(model_file)
+
+
+def predict_genome(
+    request: dict,
+    string_indexes: StringIndexCache,
+    path_matrix_emission: str,
+    model_file: str,
+) -> pd.DataFrame:
+    """
+    Predicts operons of one genome.
+
+    :param request: taxid and paths to parsed gff (parsed_gff), Diamond result (diamond)
+    and kofam_scan result (hmm)
+    :param string_indexes: STRING link indexes of recently used taxa
+    :param path_matrix_emission: path to emission matrix.npy
+    :param model_file: path to model.pkl or compiled model directory
+    :return: table with final results
+    """
+    parsed_gff = read_table(request["parsed_gff"], "parsed_gff")
+    diamond_result_filtered = filter_diamond_results(request["diamond"])
+    protein_links = select_string_links(
+        string_indexes.get(str(request["taxid"])),
+        diamond_result_filtered.target_accession,
+    )
+
+    results = predict_from_tables(
+        parsed_gff,
+        diamond_result_filtered,
+        protein_links,
+        request["hmm"],
+        path_matrix_emission,
+        model_file,
+    )
+    return results.final_table
+
+
+def check_output_path(path: str, output_dir: str) -> str:
+    """
+    Checks that the output file requested by a client lies within the results directory.
+
+    :param path: output file of the request
+    :param output_dir: directory for the files written by the service
+    :return: absolute path to the output file
+    """
+    # Symbolic links and ".." are resolved before the check
+    output, directory = os.path.realpath(path), os.path.realpath(output_dir)
+    if os.path.commonpath([output, directory]) != directory:
+        raise ValueError(f"output {path} is not in {output_dir}")
+    return output
+
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    """
+    POST /predict with json {"taxid", "parsed_gff", "diamond", "hmm"[, "output"]}
+    returns the final table in .tsv format (and writes it to "output" if given,
+    the file must be in the results directory of the service).
+    GET /status returns taxa with STRING links in memory.
+    """
+
+    def send_text(self, code: int, text: str, content_type: str) -> None:
+        body = text.encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, code: int, data: dict) -> None:
+        self.send_text(code, json.dumps(data), "application/json")
+
+    def do_GET(self):
+        if self.path != "/status":
+            self.send_json(404, {"error": f"unknown path {self.path}"})
+            return
+        self.send_json(
+            200,
+            {
+                "string_indexes": self.server.string_indexes.taxa(),
+                "model": self.server.model_file,
+            },
+        )
+
+    def do_POST(self):
+        if self.path != "/predict":
+            self.send_json(404, {"error": f"unknown path {self.path}"})
+            return
+
+        start = time.perf_counter()
+        try:
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            final_table = predict_genome(
+                request,
+                self.server.string_indexes,
+                self.server.path_matrix_emission,
+                self.server.model_file,
+            )
+            if request.get("output"):
+                final_table.to_csv(
+                    check_output_path(request["output"], self.server.output_dir),
+                    sep="\t",
+                )
+        except (KeyError, ValueError, OSError) as error:
+            self.send_json(400, {"error": f"{type(error).__name__}: {error}"})
+            return
+        except Exception as error:
+            self.send_json(500, {"error": f"{type(error).__name__}: {error}"})
+            return
+
+        self.send_text(200, final_table.to_csv(sep="\t"), "text/tab-separated-values")
+        self.log_message(
+            "predicted %d genes of taxid %s in %.3f s",
+            final_table.shape[0],
+            request["taxid"],
+            time.perf_counter() - start,
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        usage="server.py [--host 127.0.0.1] [--port 8765] [--model MODEL] [--string-cache-size 4] [--output-dir results]",
+        description="""Keeps model, KEGG index and STRING links in memory and predicts operons on request.""",
+    )
+    parser.add_argument("--host", nargs="?", default="127.0.0.1", help="host to bind")
+    parser.add_argument("--port", type=int, default=8765, help="port to listen")
+    parser.add_argument(
+        "--emission-matrix",
+        nargs="?",
+        default="data/matrix_emission_15.npy",
+        help="path to emission matrix.npy",
+    )
+    parser.add_argument(
+        "--model",
+        nargs="?",
+        default="models/model_compiled",
+        help="model for predictions.pkl or compiled model",
+    )
+    parser.add_argument(
+        "--string-cache-size",
+        type=int,
+        default=4,
+        help="number of taxa with STRING links kept in memory",
+    )
+    parser.add_argument(
+        "--output-dir",
+        nargs="?",
+        default="results",
+        help="directory for output files of requests",
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    load_resources(args.emission_matrix, args.model)
+
+    server = ThreadingHTTPServer((args.host, args.port), PredictionHandler)
+    server.string_indexes = StringIndexCache(args.string_cache_size)
+    server.path_matrix_emission = args.emission_matrix
+    server.model_file = args.model
+    server.output_dir = args.output_dir
+
+    print(f"Prediction service is listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
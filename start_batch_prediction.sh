@@ -0,0 +1,93 @@
+#!/bin/bash
+
+print_usage() {
+    printf "
+Welcome to the batch script for LOFI tool.
+This script starts pipeline to predict operons in many genomes with a single snakemake run.
+Files shared by genomes of the same taxon (STRING files, DIAMOND database) are prepared once.
+
+Usage %s:
+    -m  <manifest>
+        tab-separated file named <batch>.manifest.tsv with 'taxid' and 'genome' columns,
+        genome files must be in the LOFI/genomes directory (required if -d is not used).
+    -d  <directory>
+        directory with genome files in FASTA format with '.fna' extension,
+        files are linked to the LOFI/genomes directory (required if -m is not used).
+    -t  <taxon_id>
+        taxon ID for all genomes from the directory (required with -d).
+    -f  <force>
+        use if you want to rewrite results (optional).
+    -i  <in_process>
+        run Python stages after annotation in a single process without intermediate files (optional).
+    -h
+        help. Shows this message.
+
+Summary table with operon statistics for each genome is written next to the manifest: <batch>.summary.tsv
+
+Example usage:
+./start_batch_prediction.sh -m batches/ecoli.manifest.tsv
+./start_batch_prediction.sh -d ~/assemblies/ecoli -t 511145
+" "$0"
+}
+
+while getopts ':m:d:t:fih?' flag; do
+    case "${flag}" in
+        m)
+            manifest=$OPTARG
+            echo "Using manifest: $manifest" >&2
+            ;;
+        d)
+            genome_dir=$OPTARG
+            echo "Using genomes from directory: $genome_dir" >&2
+            ;;
+        t)
+            taxid=$OPTARG
+            echo "Using this Taxon ID: $taxid" >&2
+            ;;
+        f)
+            force_run=true
+            ;;
+        i)
+            in_process=true
+            ;;
+        \? | h | *)
+            print_usage
+            exit 1
+            ;;
+        esac
+    done
+
+if [ "$genome_dir" ] && [ "$taxid" ]
+then
+  mkdir -p batches genomes
+  manifest=batches/$(basename "$genome_dir").manifest.tsv
+  printf "taxid\tgenome\n" > "$manifest"
+  for genome in "$genome_dir"/*.fna; do
+    if [ ! -e genomes/"$(basename "$genome")" ]
+    then
+      ln -s "$(realpath "$genome")" genomes/"$(basename "$genome")"
+    fi
+    printf "%s\t%s\n" "$taxid" "$(basename "$genome")" >> "$manifest"
+  done
+  echo "Manifest is written to $manifest" >&2
+fi
+
+if [ "$manifest" ] && [[ "$manifest" == *.manifest.tsv ]]
+then
+  if [ "$in_process" ]
+    then
+      config="in_process=True"
+    else
+      config="in_process=False"
+  fi
+  summary=${manifest%.manifest.tsv}.summary.tsv
+  if [ "$force_run" ]
+    then
+      snakemake --cores=all -p "$summary" --config "$config" --forcerun main run_pipeline
+    else
+      snakemake --cores=all -p "$summary" --config "$config"
+  fi
+else
+  print_usage
+  exit 1
+fi
@@ -13,6 +13,11 @@ Usage %s:
         only '.fna' extension is supported, if you have '.fa' or another, please change in manually (required).
     -f  <force>
         use if you want to rewrite results (optional).
+    -i  <in_process>
+        run Python stages after annotation in a single process without intermediate files (optional).
+    -p  <provisional>
+        publish provisional results without KEGG annotation before kofam_scan finishes
+        (<genome>_predictions_provisional.tsv), they are removed when the final results are written (optional).
     -h
         help. Shows this message.
 
@@ -21,7 +26,7 @@ Example usage:
 " "$0"
 }
 
-while getopts ':t:g:fh?' flag; do
+while getopts ':t:g:fiph?' flag; do
     case "${flag}" in
         t)
             snake_taxid=true
@@ -36,6 +41,12 @@ while getopts ':t:g:fh?' flag; do
         f)
             force_run=true
             ;;
+        i)
+            in_process=true
+            ;;
+        p)
+            provisional=true
+            ;;
         \? | h | *)
             print_usage
             exit 1
@@ -46,11 +57,21 @@ while getopts ':t:g:fh?' flag; do
 if [ "$snake_taxid" ] && [ "$snake_genome" ] # avoiding positional arguments
 then
   genome=${genome%.*} # removes extension to work with snakemake rule
+  if [ "$in_process" ]
+    then
+      config="in_process=True"
+    else
+      config="in_process=False"
+  fi
+  if [ "$provisional" ]
+    then
+      config="$config provisional=True"
+  fi
   if [ "$force_run" ]
     then
-      snakemake --cores=all -p results/"${taxid}"/predictions/"${genome}"_predictions.tsv --force # TODO all pipeline?
+      snakemake --cores=all -p results/"${taxid}"/predictions/"${genome}"_predictions.tsv results/"${taxid}"/predictions/"${genome}"_run_report.tsv --config $config --force # TODO all pipeline?
     else
-      snakemake --cores=all -p results/"${taxid}"/predictions/"${genome}"_predictions.tsv
+      snakemake --cores=all -p results/"${taxid}"/predictions/"${genome}"_predictions.tsv results/"${taxid}"/predictions/"${genome}"_run_report.tsv --config $config
   fi
 else
   print_usage